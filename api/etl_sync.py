@@ -1,11 +1,573 @@
 import os
 import json
+import time
+import random
+import hashlib
 import gspread
+import httpx
+import numpy as np
 import pandas as pd
 from gspread.exceptions import WorksheetNotFound
+from gspread.utils import fill_gaps, numericise_all, rowcol_to_a1
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
 from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+MONEY_COLUMNS = ['valor_bruto_duplicata', 'valor_liquido_duplicata', 'desconto_contrato',
+                 'abatimento', 'desagio_reais', 'tarifa_reais', 'ad_valorem_reais',
+                 'iof_reais', 'total_taxas_reais', 'liquido_operacao', 'receita_cashforce']
+PERCENTAGE_COLUMNS = ['taxa_mes_percentual', 'ad_valorem_percentual', 'taxa_efetiva_mes_percentual']
+BOOLEAN_COLUMNS = ['termo_anexado', 'boleto_anexado', 'comprovante_deposito']
+INTEGER_COLUMNS = ['prazo', 'prazo_medio_operacao']
+
+TRUE_TOKENS = ['sim', 'yes', 'true', '1']
+
+
+# --- Conversores de células ---
+# Aplicados coluna a coluna em `_transform_records` via Series.apply.
+
+def clean_currency(value):
+    if pd.isna(value) or value == '' or value == '---':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = value.replace('R$', '').strip()
+        value = value.replace(' ', '')
+        # Se houver vírgula, assumimos formato brasileiro (1.234,56)
+        if ',' in value:
+            value = value.replace('.', '').replace(',', '.')
+        try:
+            return float(value)
+        except:
+            return None
+    return None
+
+
+def clean_percentage(value):
+    if pd.isna(value) or value == '' or value == '---':
+        return None
+    if isinstance(value, str):
+        value = value.replace('%', '').replace(' ', '').replace(',', '.')
+        try:
+            return float(value)
+        except:
+            return None
+    return value
+
+
+def clean_boolean(value):
+    if pd.isna(value) or value == '' or value == '---':
+        return None
+    if isinstance(value, str):
+        return value.lower() in TRUE_TOKENS
+    return bool(value)
+
+
+def clean_integer(value):
+    if pd.isna(value) or value == '' or value == '---':
+        return None
+    try:
+        return int(round(float(value)))
+    except:
+        return None
+
+
+def _hash_value(value):
+    """Forma canônica de um valor para o hash.
+
+    O dtype de uma coluna depende do bloco (int64 sem ausentes, float64 com
+    NaN), então a mesma célula chega como 30, 30.0 ou numpy.int64 conforme o
+    bloco. Para o PostgREST esses valores são o mesmo número; no hash também.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def _record_hash(record: dict) -> str:
+    """Hash estável do registro normalizado (ordem de chaves e dtype do bloco irrelevantes)."""
+    payload = {k: _hash_value(v) for k, v in record.items()}
+    serialized = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(serialized.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _load_sync_hashes(supabase: Client) -> dict:
+    """Mapa nfid -> hash gravado pela última execução bem-sucedida."""
+    response = supabase.rpc('propostas_sync_hashes').execute()
+    return response.data or {}
+
+
+# --- Serialização ---
+
+# Marcadores de vazio vindos da planilha ou de conversões para string
+NULL_TOKENS = ['', 'nan', 'NaN', 'None', '---']
+# Na carga original o texto "None" só virava nulo depois das conversões, e
+# clean_boolean o tratava como False; colunas booleanas mantêm essa saída.
+BOOLEAN_NULL_TOKENS = [token for token in NULL_TOKENS if token != 'None']
+
+
+def _normalize_nulls(df: pd.DataFrame) -> pd.DataFrame:
+    """Troca os marcadores de vazio por None, uma coluna de texto por vez.
+
+    Colunas numéricas mantêm NaN; a conversão para None acontece na
+    serialização de cada lote.
+    """
+    for col in df.columns:
+        series = df[col]
+        if series.dtype != object:
+            continue
+        mask = series.isin(BOOLEAN_NULL_TOKENS if col in BOOLEAN_COLUMNS else NULL_TOKENS)
+        if mask.any():
+            df[col] = series.mask(mask, None)
+    return df
+
+
+def _iter_record_batches(df: pd.DataFrame, batch_size: int):
+    """Gera lotes de dicionários prontos para JSON sem materializar a base inteira."""
+    for start in range(0, len(df), batch_size):
+        chunk = df.iloc[start:start + batch_size]
+        yield chunk.astype(object).where(chunk.notna(), None).to_dict('records')
+
+
+def _changed_batches(record_batches, previous_hashes: dict, full_sync: bool, batch_size):
+    """Reagrupa em lotes os pares (registro, hash) novos ou alterados.
+
+    `batch_size` é lido a cada registro (`batch_size.size`), então o tamanho
+    dos próximos lotes acompanha os ajustes feitos pelo executor de upserts.
+    Cada NFID chega uma única vez (a linha vencedora de `_winning_rows`); um
+    NFID repetido dentro do mesmo lote é descartado mesmo assim, porque o
+    Postgres rejeita o lote inteiro ("ON CONFLICT DO UPDATE command cannot
+    affect row a second time").
+    """
+    pending = []
+    pending_nfids = set()
+    for records in record_batches:
+        for record in records:
+            nfid = str(record['nfid'])
+            if nfid in pending_nfids:
+                continue
+            row_hash = _record_hash(record)
+            if full_sync or previous_hashes.get(nfid) != row_hash:
+                pending.append((record, row_hash))
+                pending_nfids.add(nfid)
+                if len(pending) >= batch_size.size:
+                    yield pending
+                    pending = []
+                    pending_nfids = set()
+    if pending:
+        yield pending
+
+
+# --- Upsert concorrente ---
+
+# Lotes enviados em paralelo (ETL_UPSERT_CONCURRENCY)
+UPSERT_CONCURRENCY = 4
+# Tamanho inicial e limites dos lotes (ETL_UPSERT_BATCH_SIZE)
+UPSERT_BATCH_SIZE = 5000
+UPSERT_MIN_BATCH_SIZE = 500
+UPSERT_MAX_BATCH_SIZE = 10000
+# Latência alvo por lote em segundos (ETL_UPSERT_TARGET_SECONDS)
+UPSERT_TARGET_SECONDS = 8.0
+# Novas tentativas por lote em erros transitórios (ETL_UPSERT_RETRIES)
+UPSERT_RETRIES = 3
+UPSERT_BACKOFF_SECONDS = 1.0
+
+# Códigos HTTP e SQLSTATE que valem nova tentativa: timeouts, limite de taxa,
+# gateway, cancelamento por statement_timeout, serialização e deadlock.
+TRANSIENT_ERROR_CODES = {
+    '408', '429', '500', '502', '503', '504', '520', '522', '524',
+    '57014', '40001', '40P01',
+}
+
+
+class _AdaptiveBatchSize:
+    """Ajusta o tamanho dos lotes pela latência observada dos upserts.
+
+    Lotes acima do alvo (ou que precisaram de nova tentativa) reduzem o
+    tamanho pela metade; lotes cheios bem abaixo do alvo o aumentam em 50%.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_seconds: float):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.size = min(max(initial, minimum), maximum)
+
+    def observe(self, rows: int, seconds: float, attempts: int):
+        if attempts > 1 or seconds > self.target_seconds:
+            self.size = max(self.minimum, self.size // 2)
+        elif seconds < self.target_seconds / 2 and rows >= self.size:
+            self.size = min(self.maximum, int(self.size * 1.5))
+
+
+def _is_transient_error(error: Exception) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, APIError):
+        return str(error.code) in TRANSIENT_ERROR_CODES
+    return False
+
+
+def _upsert_batch(supabase: Client, changed: list, synced_at: str, retries: int) -> dict:
+    """Envia um lote para `propostas` com nova tentativa e backoff exponencial.
+
+    Não levanta exceção: devolve o resultado do lote (linhas, tentativas,
+    tempo e status) para o relatório da execução.
+    """
+    batch = [record for record, _ in changed]
+    started = time.perf_counter()
+    attempts = 0
+    while True:
+        attempts += 1
+        attempt_started = time.perf_counter()
+        try:
+            supabase.table('propostas').upsert(
+                batch,
+                on_conflict='nfid'
+            ).execute()
+            break
+        except Exception as error:
+            if attempts > retries or not _is_transient_error(error):
+                return {
+                    'rows': len(batch),
+                    'attempts': attempts,
+                    'seconds': round(time.perf_counter() - started, 3),
+                    'status': 'error',
+                    'error': str(error),
+                }
+            delay = UPSERT_BACKOFF_SECONDS * 2 ** (attempts - 1)
+            delay += random.uniform(0, UPSERT_BACKOFF_SECONDS)
+            print(f"[WARN] Erro transitório no upsert ({error}); nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+    upsert_seconds = time.perf_counter() - attempt_started
+
+    # Grava o hash só depois do lote confirmado, para que uma falha
+    # faça o próximo run reenviar os mesmos registros.
+    state_batch = [
+        {'nfid': str(record['nfid']), 'row_hash': row_hash, 'synced_at': synced_at}
+        for record, row_hash in changed
+    ]
+    try:
+        supabase.table('propostas_sync_state').upsert(
+            state_batch,
+            on_conflict='nfid'
+        ).execute()
+    except Exception as state_error:
+        print(f"[WARN] Falha ao gravar estado de sincronização: {state_error}")
+
+    return {
+        'rows': len(batch),
+        'attempts': attempts,
+        'seconds': round(time.perf_counter() - started, 3),
+        'upsert_seconds': round(upsert_seconds, 3),
+        'status': 'ok',
+    }
+
+
+def _run_upserts(supabase: Client, changed_batches, batch_size: _AdaptiveBatchSize,
+                 synced_at: str, concurrency: int, retries: int) -> list:
+    """Despacha os lotes em um pool de threads e devolve os resultados por lote.
+
+    No máximo `concurrency` lotes ficam em voo, o que também limita quantos
+    blocos da planilha estão em memória.
+    """
+    results = []
+    in_flight = {}
+
+    def collect(done):
+        for future in done:
+            batch_number = in_flight.pop(future)
+            result = future.result()
+            result['batch'] = batch_number
+            results.append(result)
+            if result['status'] == 'ok':
+                batch_size.observe(result['rows'], result['upsert_seconds'], result['attempts'])
+                print(
+                    f"[INFO] Lote {batch_number} concluído: {result['rows']} registros em "
+                    f"{result['seconds']:.2f}s ({result['attempts']} tentativa(s)); próximo lote: {batch_size.size}"
+                )
+            else:
+                print(f"[WARN] Lote {batch_number} falhou após {result['attempts']} tentativa(s): {result['error']}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch_number, changed in enumerate(changed_batches, start=1):
+            while len(in_flight) >= concurrency:
+                collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+
+            print(f"[INFO] Processando lote {batch_number} ({len(changed)} registros)...")
+            future = executor.submit(_upsert_batch, supabase, changed, synced_at, retries)
+            in_flight[future] = batch_number
+
+        collect(wait(in_flight).done)
+
+    return sorted(results, key=lambda result: result['batch'])
+
+
+# --- Leitura da planilha em blocos ---
+
+# Cabeçalho está na linha 4 (as 3 primeiras linhas são títulos)
+SHEET_HEADER_ROW = 4
+# Linhas lidas, transformadas e enviadas por vez; limita a memória da função
+SHEET_CHUNK_ROWS = 5000
+
+COLUMN_MAPPING = {
+    # Informações da Proposta
+    "Numero da Proposta": "numero_proposta",
+    "Status da Proposta": "status_proposta",
+    "Data da operação": "data_operacao",
+    "Data do Aceite da Proposta": "data_aceite_proposta",
+
+    # Grupo Econômico e Comprador
+    "Grupo Econômico": "grupo_economico",
+    "Razão Social Comprador": "razao_social_comprador",
+    "CNPJ do Comprador": "cnpj_comprador",
+    "Status comprador": "status_comprador",
+
+    # Nota Fiscal e Duplicata
+    "NFID": "nfid",
+    "Nº da Nota Fiscal": "numero_nota_fiscal",
+    "Tipo da nota": "tipo_nota",
+    "Nº da Duplicata": "numero_duplicata",
+    "Data de Inclusão da NF": "data_inclusao_nf",
+    "Data de Emissão da NF": "data_emissao_nf",
+    "Descrição": "descricao",
+
+    # Fornecedor
+    "Razão Social do Fornecedor": "razao_social_fornecedor",
+    "CNPJ do Fornecedor": "cnpj_fornecedor",
+    "Status fornecedor": "status_fornecedor",
+
+    # Financiador
+    "Razão Social do Financiador": "razao_social_financiador",
+    "CNPJ Financiador": "cnpj_financiador",
+    "Parceiro": "parceiro",
+
+    # Valores e Taxas
+    "Valor Bruto da Duplicata": "valor_bruto_duplicata",
+    "Valor Líquido da Duplicata": "valor_liquido_duplicata",
+    "Desconto contrato": "desconto_contrato",
+    "Abatimento": "abatimento",
+    "Deságio R$": "desagio_reais",
+    "Tarifa R$": "tarifa_reais",
+    "Ad Valorem R$": "ad_valorem_reais",
+    "IOF R$": "iof_reais",
+    "Total de taxas R$": "total_taxas_reais",
+    "Liquido da Operação": "liquido_operacao",  # Sem acento!
+
+    # Taxas Percentuais
+    "Taxa ao mês %": "taxa_mes_percentual",
+    "Ad Valorem &": "ad_valorem_percentual",  # Atenção: & não %
+    "Taxa efetiva ao mês %": "taxa_efetiva_mes_percentual",
+    "Faixa de Taxa Cashforce": "faixa_taxa_cashforce",
+
+    # Pagamento
+    "Forma de pagamento": "forma_pagamento",
+    "Vencimento": "vencimento",
+    "Data de pagamento": "data_pagamento",
+    "Status de Pagamento": "status_pagamento",
+    "Data do Pagamento da Operação": "data_pagamento_operacao",
+    "Data da Confirmação do Pagamento da Operação": "data_confirmacao_pagamento_operacao",
+
+    # Antecipação
+    "Status da Antecipação": "status_antecipacao",
+
+    # Prazos
+    "Prazo": "prazo",
+    "Prazo Médio da operação": "prazo_medio_operacao",
+
+    # Receita
+    "Receita Cashforce": "receita_cashforce",
+
+    # Anexos
+    "Termo anexado?": "termo_anexado",
+    "Boleto anexado?": "boleto_anexado",
+    "Comprovante de depósito?": "comprovante_deposito",
+}
+
+# Colunas da planilha que não vão para o Supabase.
+# "Dia atual" é a fórmula de data corrente: gravada, mudaria todos os dias em
+# todas as linhas. Quem precisar da data de hoje usa current_date na consulta.
+SHEET_ONLY_COLUMNS = ['Dia atual']
+
+# Padroniza colunas de texto para evitar inconsistências
+# Converte "pendente ", "PENDENTE", "Pendente" -> "Pendente"
+TEXT_COLUMNS_TO_SANITIZE = [
+    'status_proposta',
+    'grupo_economico',
+    'razao_social_comprador',
+    'status_comprador',
+    'tipo_nota',
+    'razao_social_fornecedor',
+    'status_fornecedor',
+    'razao_social_financiador',
+    'parceiro',
+    'faixa_taxa_cashforce',
+    'forma_pagamento',
+    'status_pagamento',
+    'status_antecipacao'
+]
+
+DATE_COLUMNS = ['data_operacao', 'data_aceite_proposta', 'data_inclusao_nf',
+                'data_emissao_nf', 'vencimento', 'data_pagamento',
+                'data_pagamento_operacao', 'data_confirmacao_pagamento_operacao']
+
+# Datas da planilha vêm como dd/mm/aaaa
+SHEET_DATE_FORMAT = '%d/%m/%Y'
+
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """Converte células de data da planilha em datetime (inválidas viram NaT).
+
+    Formato explícito em vez da inferência do pandas, que decide pelo primeiro
+    valor de cada chamada: com blocos e a leitura de `_winning_rows` separadas,
+    '01/02/2024' podia ser 2 de janeiro num bloco e 1º de fevereiro em outro.
+    Células já em ISO (aaaa-mm-dd) também são aceitas.
+    """
+    text = values.astype('string').str.strip()
+    dates = pd.to_datetime(text, format=SHEET_DATE_FORMAT, exact=False, errors='coerce')
+    iso = dates.isna() & text.notna()
+    if iso.any():
+        dates[iso] = pd.to_datetime(text[iso], format='ISO8601', errors='coerce')
+    return dates
+
+
+def _env_number(name: str, default, cast=int, minimum=1):
+    """Lê um ajuste numérico do ambiente, caindo para o padrão se inválido."""
+    value = os.environ.get(name, '')
+    if not value:
+        return default
+    try:
+        return max(cast(value), minimum)
+    except ValueError:
+        print(f"[WARN] {name} inválido ({value!r}), usando {default}")
+        return default
+
+
+def _sheet_header(worksheet, head: int) -> list:
+    keys = worksheet.row_values(head)
+    if len(set(keys)) != len(keys):
+        raise ValueError(f"Cabeçalho da linha {head} contém colunas repetidas")
+    return keys
+
+
+def _sheet_column(worksheet, keys: list, title: str, head: int, last_row: int) -> pd.Series:
+    """Valores de uma coluna abaixo do cabeçalho, indexados pelo número da linha."""
+    rows = pd.RangeIndex(head + 1, last_row + 1)
+    if title not in keys or last_row <= head:
+        return pd.Series('', index=rows, dtype=object)
+    col = keys.index(title) + 1
+    values = worksheet.batch_get([f"{rowcol_to_a1(head + 1, col)}:{rowcol_to_a1(last_row, col)}"])[0]
+    cells = [row[0] if row else '' for row in values]
+    cells += [''] * (len(rows) - len(cells))
+    return pd.Series(numericise_all(cells), index=rows, dtype=object)
+
+
+def _winning_rows(worksheet, keys: list, head: int) -> dict:
+    """Mapa NFID -> número da linha da planilha com a versão vencedora.
+
+    Lê só as colunas NFID e data da operação, antes dos blocos, para que a
+    escolha valha para a planilha inteira: um NFID repetido em dois blocos é
+    enviado uma única vez. Como no sort da carga inteira, vale a maior data
+    de operação (linhas sem data perdem); em empate fica a primeira linha.
+    """
+    if 'NFID' not in keys:
+        raise ValueError(f"Coluna NFID não encontrada no cabeçalho da linha {head}")
+    last_row = worksheet.row_count
+    nfids = _sheet_column(worksheet, keys, 'NFID', head, last_row)
+    dates = _parse_dates(_sheet_column(worksheet, keys, 'Data da operação', head, last_row))
+
+    present = nfids.notna() & ~nfids.isin(NULL_TOKENS)
+    candidates = pd.DataFrame({'nfid': nfids[present], 'data': dates[present]})
+    candidates = candidates.sort_values('data', ascending=False, kind='stable')
+    winners = candidates.drop_duplicates(subset=['nfid'], keep='first')
+    return dict(zip(winners['nfid'], winners.index))
+
+
+def _iter_sheet_chunks(worksheet, keys: list, head: int, chunk_rows: int):
+    """Lê as linhas abaixo do cabeçalho em blocos de até `chunk_rows` registros.
+
+    Reproduz o resultado de `get_all_records(head=...)` — células numéricas
+    convertidas e linhas curtas completadas com '' — sem carregar a aba
+    inteira: cada bloco é uma chamada `get_values` a um intervalo de linhas.
+    Gera pares (número da primeira linha, registros do bloco).
+    """
+    if not keys:
+        return
+
+    last_row = worksheet.row_count
+    for first in range(head + 1, last_row + 1, chunk_rows):
+        last = min(first + chunk_rows - 1, last_row)
+        values = worksheet.get_values(f"{first}:{last}")
+        if not values:
+            continue
+        rows = fill_gaps(values, cols=len(keys))
+        yield first, [dict(zip(keys, numericise_all(row[:len(keys)]))) for row in rows]
+
+
+def _transform_records(records: list) -> pd.DataFrame:
+    """Limpa e mapeia um bloco de registros da planilha para o schema de `propostas`.
+
+    Os registros já vêm filtrados por `_winning_rows` (um por NFID).
+    """
+    df = pd.DataFrame(records)
+
+    df = df.drop(columns=SHEET_ONLY_COLUMNS, errors='ignore')
+    df = df.rename(columns=COLUMN_MAPPING)
+
+    for col in TEXT_COLUMNS_TO_SANITIZE:
+        if col in df.columns:
+            # Garante que é string antes de aplicar métodos .str
+            df[col] = df[col].astype(str).str.strip().str.title()
+            # Substitui strings vazias ou 'None' (que virou "None") por valor Nulo real
+            df[col] = df[col].replace({'': None, 'None': None, 'Nan': None})
+
+    # Marcadores de vazio ('', 'nan', '---', ...) viram None numa única passada por coluna
+    df = _normalize_nulls(df)
+
+    # Remover linhas onde nfid está vazio (obrigatório)
+    df = df[df['nfid'].notna()]
+
+    # Converter campos monetários e percentuais
+    for col in MONEY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_currency)
+
+    for col in PERCENTAGE_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_percentage)
+
+    # Converter campos de data para string (formato ISO)
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = _parse_dates(df[col])
+            df[col] = df[col].dt.strftime('%Y-%m-%d').replace('NaT', None)
+
+    for col in BOOLEAN_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_boolean)
+
+    for col in INTEGER_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_integer)
+
+    return df
+
+
+def _is_full_sync_requested(path: str) -> bool:
+    params = parse_qs(urlparse(path).query)
+    full_param = params.get('full', [''])[0]
+    full_env = os.environ.get('ETL_FULL_SYNC', '')
+    return full_param.lower() in ('1', 'true', 'sim') or full_env.lower() in ('1', 'true', 'sim')
 
 
 class handler(BaseHTTPRequestHandler):
@@ -19,255 +581,15 @@ class handler(BaseHTTPRequestHandler):
             credentials_dict = json.loads(credentials_json)
             gc = gspread.service_account_from_dict(credentials_dict)
 
-            # Passo 2: Ler a Planilha
+            # Passo 2: Abrir a Planilha
             sheet_name = os.environ.get('GOOGLE_SHEET_NAME')
             if not sheet_name:
                 raise ValueError("GOOGLE_SHEET_NAME não configurado")
 
             spreadsheet = gc.open(sheet_name)
             worksheet = spreadsheet.get_worksheet(0)
-            # Cabeçalho está na linha 4, então pular as 3 primeiras linhas
-            records = worksheet.get_all_records(head=4)
-
-            if not records:
-                raise ValueError("Nenhum registro encontrado na planilha")
-
-            # Passo 3: Transformar com Pandas
-            df = pd.DataFrame(records)
-
-            if df.empty:
-                raise ValueError("DataFrame está vazio após conversão")
-
-            # Ordenar por data de operação (mais recente primeiro)
-            if 'Data da operação' in df.columns:
-                df['Data da operação'] = pd.to_datetime(df['Data da operação'], errors='coerce')
-                df = df.sort_values('Data da operação', ascending=False)
-
-            # Passo 4: Limpeza e Mapeamento
-            column_mapping = {
-                # Informações da Proposta
-                "Numero da Proposta": "numero_proposta",
-                "Status da Proposta": "status_proposta",
-                "Data da operação": "data_operacao",
-                "Data do Aceite da Proposta": "data_aceite_proposta",
-
-                # Grupo Econômico e Comprador
-                "Grupo Econômico": "grupo_economico",
-                "Razão Social Comprador": "razao_social_comprador",
-                "CNPJ do Comprador": "cnpj_comprador",
-                "Status comprador": "status_comprador",
-
-                # Nota Fiscal e Duplicata
-                "NFID": "nfid",
-                "Nº da Nota Fiscal": "numero_nota_fiscal",
-                "Tipo da nota": "tipo_nota",
-                "Nº da Duplicata": "numero_duplicata",
-                "Data de Inclusão da NF": "data_inclusao_nf",
-                "Data de Emissão da NF": "data_emissao_nf",
-                "Descrição": "descricao",
-
-                # Fornecedor
-                "Razão Social do Fornecedor": "razao_social_fornecedor",
-                "CNPJ do Fornecedor": "cnpj_fornecedor",
-                "Status fornecedor": "status_fornecedor",
-
-                # Financiador
-                "Razão Social do Financiador": "razao_social_financiador",
-                "CNPJ Financiador": "cnpj_financiador",
-                "Parceiro": "parceiro",
-
-                # Valores e Taxas
-                "Valor Bruto da Duplicata": "valor_bruto_duplicata",
-                "Valor Líquido da Duplicata": "valor_liquido_duplicata",
-                "Desconto contrato": "desconto_contrato",
-                "Abatimento": "abatimento",
-                "Deságio R$": "desagio_reais",
-                "Tarifa R$": "tarifa_reais",
-                "Ad Valorem R$": "ad_valorem_reais",
-                "IOF R$": "iof_reais",
-                "Total de taxas R$": "total_taxas_reais",
-                "Liquido da Operação": "liquido_operacao",  # Sem acento!
-
-                # Taxas Percentuais
-                "Taxa ao mês %": "taxa_mes_percentual",
-                "Ad Valorem &": "ad_valorem_percentual",  # Atenção: & não %
-                "Taxa efetiva ao mês %": "taxa_efetiva_mes_percentual",
-                "Faixa de Taxa Cashforce": "faixa_taxa_cashforce",
-
-                # Pagamento
-                "Forma de pagamento": "forma_pagamento",
-                "Vencimento": "vencimento",
-                "Data de pagamento": "data_pagamento",
-                "Status de Pagamento": "status_pagamento",
-                "Data do Pagamento da Operação": "data_pagamento_operacao",
-                "Data da Confirmação do Pagamento da Operação": "data_confirmacao_pagamento_operacao",
-
-                # Antecipação
-                "Status da Antecipação": "status_antecipacao",
-
-                # Prazos
-                "Prazo": "prazo",
-                "Prazo Médio da operação": "prazo_medio_operacao",
-
-                # Receita
-                "Receita Cashforce": "receita_cashforce",
-
-                # Anexos
-                "Termo anexado?": "termo_anexado",
-                "Boleto anexado?": "boleto_anexado",
-                "Comprovante de depósito?": "comprovante_deposito",
-
-                # Controle
-                "Dia atual": "dia_atual"
-            }
 
-            df = df.rename(columns=column_mapping)
-
-            # --- NOVO BLOCO DE SANITIZAÇÃO DE TEXTO ---
-            # Padroniza colunas de texto para evitar inconsistências
-            # Converte "pendente ", "PENDENTE", "Pendente" -> "Pendente"
-            print("[INFO] Sanitizando colunas de texto (status, parceiro, etc.)...")
-            text_columns_to_sanitize = [
-                'status_proposta',
-                'grupo_economico',
-                'razao_social_comprador',
-                'status_comprador',
-                'tipo_nota',
-                'razao_social_fornecedor',
-                'status_fornecedor',
-                'razao_social_financiador',
-                'parceiro',
-                'faixa_taxa_cashforce',
-                'forma_pagamento',
-                'status_pagamento',
-                'status_antecipacao'
-            ]
-
-            for col in text_columns_to_sanitize:
-                if col in df.columns:
-                    # Garante que é string antes de aplicar métodos .str
-                    df[col] = df[col].astype(str).str.strip().str.title()
-                    # Substitui strings vazias ou 'None' (que virou "None") por valor Nulo real
-                    df[col] = df[col].replace({'': None, 'None': None, 'Nan': None})
-
-            # --- FIM DO NOVO BLOCO ---
-
-            # Remover linhas onde nfid está vazio (obrigatório)
-            df = df[df['nfid'].notna() & (df['nfid'] != '')]
-
-            if df.empty:
-                raise ValueError("Nenhum registro válido encontrado (NFID obrigatório)")
-
-            # Remover duplicatas por NFID (manter o mais recente)
-            df = df.drop_duplicates(subset=['nfid'], keep='first')
-
-            # Substituir valores vazios por None para campos numéricos e booleanos
-            df = df.replace('', None)
-            df = df.replace('nan', None)
-            df = df.replace('NaN', None)
-            df = df.replace('---', None)
-
-            # Substituir NaN do pandas por None
-            df = df.where(pd.notna(df), None)
-
-            # Converter campos monetários (remover R$ e converter para número)
-            def clean_currency(value):
-                if pd.isna(value) or value == '' or value == '---':
-                    return None
-                if isinstance(value, (int, float)):
-                    return float(value)
-                if isinstance(value, str):
-                    value = value.replace('R$', '').strip()
-                    value = value.replace(' ', '')
-                    # Se houver vírgula, assumimos formato brasileiro (1.234,56)
-                    if ',' in value:
-                        value = value.replace('.', '').replace(',', '.')
-                    try:
-                        return float(value)
-                    except:
-                        return None
-                return None
-
-            money_columns = ['valor_bruto_duplicata', 'valor_liquido_duplicata', 'desconto_contrato',
-                           'abatimento', 'desagio_reais', 'tarifa_reais', 'ad_valorem_reais',
-                           'iof_reais', 'total_taxas_reais', 'liquido_operacao', 'receita_cashforce']
-
-            for col in money_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(clean_currency)
-
-            # Converter campos percentuais (remover % e converter para número)
-            def clean_percentage(value):
-                if pd.isna(value) or value == '' or value == '---':
-                    return None
-                if isinstance(value, str):
-                    value = value.replace('%', '').replace(' ', '').replace(',', '.')
-                    try:
-                        return float(value)
-                    except:
-                        return None
-                return value
-
-            percentage_columns = ['taxa_mes_percentual', 'ad_valorem_percentual', 'taxa_efetiva_mes_percentual']
-
-            for col in percentage_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(clean_percentage)
-
-            # Converter campos de data para string (formato ISO)
-            date_columns = ['data_operacao', 'data_aceite_proposta', 'data_inclusao_nf',
-                           'data_emissao_nf', 'vencimento', 'data_pagamento',
-                           'data_pagamento_operacao', 'data_confirmacao_pagamento_operacao', 'dia_atual']
-
-            for col in date_columns:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                    df[col] = df[col].dt.strftime('%Y-%m-%d').replace('NaT', None)
-
-            # Converter campos booleanos
-            def clean_boolean(value):
-                if pd.isna(value) or value == '' or value == '---':
-                    return None
-                if isinstance(value, str):
-                    return value.lower() in ['sim', 'yes', 'true', '1']
-                return bool(value)
-
-            boolean_columns = ['termo_anexado', 'boleto_anexado', 'comprovante_deposito']
-
-            for col in boolean_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(clean_boolean)
-
-            # Converter campos inteiros (arredondar)
-            def clean_integer(value):
-                if pd.isna(value) or value == '' or value == '---':
-                    return None
-                try:
-                    return int(round(float(value)))
-                except:
-                    return None
-
-            integer_columns = ['prazo', 'prazo_medio_operacao']
-
-            for col in integer_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(clean_integer)
-
-            # Converter DataFrame para lista de dicionários e limpar valores inválidos
-            data_to_upsert = []
-            for record in df.to_dict('records'):
-                clean_record = {}
-                for key, value in record.items():
-                    # Limpar valores inválidos
-                    if value in ['NaN', 'nan', 'None', '---', '']:
-                        clean_record[key] = None
-                    elif isinstance(value, float) and pd.isna(value):
-                        clean_record[key] = None
-                    else:
-                        clean_record[key] = value
-                data_to_upsert.append(clean_record)
-
-            # Passo 5: Autenticar no Supabase
+            # Passo 3: Autenticar no Supabase
             supabase_url = os.environ.get('SUPABASE_URL')
             supabase_key = os.environ.get('SUPABASE_KEY')
 
@@ -276,21 +598,81 @@ class handler(BaseHTTPRequestHandler):
 
             supabase: Client = create_client(supabase_url, supabase_key)
 
-            # Passo 6: Fazer o UPSERT em lotes para evitar timeouts
-            total_rows = len(data_to_upsert)
-            batch_size = 5000
-
-            print(f"[INFO] Iniciando UPSERT de {total_rows} registros em lotes de {batch_size}...")
+            # Passo 3.1: Detecção de mudanças (compara com o hash da última execução)
+            full_sync = _is_full_sync_requested(self.path)
+            previous_hashes = {}
+            if not full_sync:
+                try:
+                    previous_hashes = _load_sync_hashes(supabase)
+                except Exception as state_error:
+                    # Sem estado anterior: cai para carga completa
+                    print(f"[WARN] Falha ao ler estado de sincronização, executando carga completa: {state_error}")
+                    full_sync = True
+
+            # Passo 4: Ler, transformar e fazer o UPSERT bloco a bloco
+            # Cada bloco de linhas da planilha é limpo e enviado antes do próximo
+            # ser lido, então a memória fica limitada ao tamanho do bloco.
+            # Só os registros novos ou alterados seguem para o Supabase.
+            chunk_rows = _env_number('ETL_SHEET_CHUNK_ROWS', SHEET_CHUNK_ROWS)
+            concurrency = _env_number('ETL_UPSERT_CONCURRENCY', UPSERT_CONCURRENCY)
+            retries = _env_number('ETL_UPSERT_RETRIES', UPSERT_RETRIES, minimum=0)
+            batch_size = _AdaptiveBatchSize(
+                _env_number('ETL_UPSERT_BATCH_SIZE', UPSERT_BATCH_SIZE),
+                UPSERT_MIN_BATCH_SIZE,
+                UPSERT_MAX_BATCH_SIZE,
+                _env_number('ETL_UPSERT_TARGET_SECONDS', UPSERT_TARGET_SECONDS, cast=float, minimum=0.1),
+            )
+            synced_at = datetime.utcnow().isoformat()
+            rows_read = 0
+
+            # Uma linha por NFID, escolhida na planilha inteira antes dos blocos
+            keys = _sheet_header(worksheet, SHEET_HEADER_ROW)
+            if not keys or worksheet.row_count <= SHEET_HEADER_ROW:
+                raise ValueError("Nenhum registro encontrado na planilha")
 
-            for start in range(0, total_rows, batch_size):
-                end = start + batch_size
-                batch = data_to_upsert[start:end]
-                print(f"[INFO] Processando lote {start // batch_size + 1} ({len(batch)} registros)...")
-                supabase.table('propostas').upsert(
-                    batch,
-                    on_conflict='nfid'
-                ).execute()
+            winners = _winning_rows(worksheet, keys, SHEET_HEADER_ROW)
+            total_records = len(winners)
+            if not total_records:
+                raise ValueError("Nenhum registro válido encontrado (NFID obrigatório)")
 
+            def transformed_batches():
+                nonlocal rows_read
+                for chunk_number, (first, records) in enumerate(
+                    _iter_sheet_chunks(worksheet, keys, SHEET_HEADER_ROW, chunk_rows), start=1
+                ):
+                    rows_read += len(records)
+                    print(f"[INFO] Bloco {chunk_number} da planilha: {len(records)} linhas (total lido: {rows_read})")
+                    # Compara o NFID da linha com a linha vencedora dele: se a
+                    # planilha mudou entre as duas leituras e as linhas se
+                    # deslocaram, um NFID ainda passa no máximo uma vez.
+                    records = [
+                        record for offset, record in enumerate(records)
+                        if winners.get(record.get('NFID')) == first + offset
+                    ]
+                    if records:
+                        yield from _iter_record_batches(_transform_records(records), chunk_rows)
+
+            print(
+                f"[INFO] Iniciando leitura em blocos de {chunk_rows} linhas e UPSERT incremental "
+                f"em lotes de {batch_size.size} ({concurrency} em paralelo)..."
+            )
+
+            changed_batches = _changed_batches(
+                transformed_batches(),
+                previous_hashes,
+                full_sync,
+                batch_size,
+            )
+            batch_results = _run_upserts(supabase, changed_batches, batch_size, synced_at, concurrency, retries)
+            rows_upserted = sum(result['rows'] for result in batch_results if result['status'] == 'ok')
+            failed_batches = [result for result in batch_results if result['status'] != 'ok']
+
+            print(
+                f"[INFO] Detecção de mudanças ({'completa' if full_sync else 'incremental'}): "
+                f"{rows_upserted} de {total_records} registros novos ou alterados."
+            )
+            if failed_batches:
+                print(f"[WARN] {len(failed_batches)} de {len(batch_results)} lotes falharam; serão reenviados na próxima execução.")
             print("[INFO] UPSERT em lotes concluído.")
 
             # --- INÍCIO DA MELHORIA: BUSCAR KPI DE RITMO ---
@@ -331,27 +713,60 @@ class handler(BaseHTTPRequestHandler):
                 print(f"[WARN] Falha ao buscar KPIs de Ritmo: {kpi_error}")
             # --- FIM DA MELHORIA ---
 
-            # Passo 6.1: Atualizar agregados (materialized view)
+            # Passo 5: Atualizar agregados (consolidado mensal)
+            # Os triggers de `propostas` anotam as competências tocadas pelos
+            # upserts; o refresh recalcula só esses meses e não faz nada com a
+            # fila vazia. Roda em toda execução, para que meses deixados na
+            # fila por um refresh que falhou (ou por alterações feitas fora do
+            # ETL) não esperem a próxima mudança na planilha.
             try:
-                supabase.rpc('refresh_propostas_resumo_mensal').execute()
+                refresh = supabase.rpc('refresh_propostas_resumo_mensal').execute().data or {}
+                competencias = refresh.get('competencias') or []
+                print(f"[INFO] Resumo mensal recalculado para {len(competencias)} competência(s): {', '.join(competencias)}")
             except Exception as refresh_error:
                 # Não interromper o fluxo principal se a atualização falhar,
                 # mas registrar para inspeção nos logs da função.
+                competencias = []
                 print(f"[WARN] Falha ao atualizar resumo mensal: {refresh_error}")
 
-            # Passo 7: Responder ao Cron
-            self.send_response(200)
+            # Consolidado diário (KPIs por intervalo de datas): tem fila própria,
+            # alimentada pelos mesmos triggers; uma falha aqui deixa os meses
+            # na fila dele, independente do resumo mensal.
+            try:
+                daily = supabase.rpc('refresh_propostas_resumo_diario').execute().data or {}
+                print(f"[INFO] Resumo diário recalculado para {len(daily.get('competencias') or [])} competência(s)")
+            except Exception as daily_error:
+                print(f"[WARN] Falha ao atualizar resumo diário: {daily_error}")
+
+            if competencias:
+                # Dimensões da sidebar (parceiros, financiadores, grupos, status)
+                # derivam do consolidado; por isso rodam depois do refresh acima.
+                try:
+                    supabase.rpc('refresh_dimensoes').execute()
+                except Exception as dimension_error:
+                    print(f"[WARN] Falha ao atualizar dimensões: {dimension_error}")
+
+            # Passo 6: Responder ao Cron
+            # Lotes com falha não interrompem os demais, mas a execução
+            # responde 500 para que o cron sinalize a carga parcial.
+            rows_failed = sum(result['rows'] for result in failed_batches)
+            self.send_response(500 if failed_batches else 200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
 
             response_data = {
-                "status": "success",
-                "rows_processed": len(data_to_upsert)
+                "status": "partial" if failed_batches else "success",
+                "rows_processed": total_records,
+                "rows_upserted": rows_upserted,
+                "rows_failed": rows_failed,
+                "rows_unchanged": max(total_records - rows_upserted - rows_failed, 0),
+                "sync_mode": "full" if full_sync else "incremental",
+                "batches": batch_results
             }
             self.wfile.write(json.dumps(response_data).encode())
 
         except Exception as e:
-            # Passo 8: Tratamento de Erros
+            # Passo 7: Tratamento de Erros
             self.send_response(500)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
@@ -1,4 +1,8 @@
+import io
 import os
+import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import numpy as np
@@ -10,6 +14,14 @@ from streamlit.components.v1 import html
 from dotenv import load_dotenv
 from supabase import create_client
 
+from scripts.export_propostas import EXPORT_COLUMNS, export_params, export_propostas
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # cache local em Parquet é opcional
+    pa = pq = None
+
 load_dotenv()
 
 # --- 1. CONFIGURAÇÃO DA PÁGINA ---
@@ -220,29 +232,157 @@ supabase = get_supabase_client()
 
 
 # --- 5. FUNÇÕES DE CARREGAMENTO DE DADOS ---
-def _fetch_paginated(table_name: str, select: str, apply_filters=None, page_size: int = 1000):
+# Páginas buscadas em paralelo quando a consulta tem ordem determinística
+FETCH_CONCURRENCY = int(os.getenv("DASHBOARD_FETCH_CONCURRENCY", "6"))
+
+# Chave única de cada linha da view mensal (mesmas colunas do índice único da MV)
+VIEW_KEY_COLUMNS = [
+    "competencia_id",
+    "grupo_economico",
+    "razao_social_comprador",
+    "parceiro",
+    "razao_social_financiador",
+]
+
+
+def _fetch_page(table_name: str, select: str, apply_filters, order, start: int, page_size: int, count=None):
+    query = supabase.table(table_name).select(select, count=count)
+    if apply_filters:
+        query = apply_filters(query)
+    for col in order or []:
+        query = query.order(col)
+    return query.range(start, start + page_size - 1).execute()
+
+
+def _fetch_paginated(
+    table_name: str,
+    select: str,
+    apply_filters=None,
+    page_size: int = 1000,
+    order: list[str] | None = None,
+    concurrency: int = FETCH_CONCURRENCY,
+):
+    """Busca todas as linhas da consulta em páginas de `page_size`.
+
+    Com `order` (colunas que definem uma ordem total) e `concurrency` > 1, a
+    primeira página traz também o total exato (`count='exact'`) e as demais
+    são buscadas em paralelo e remontadas na ordem original. Sem ordem
+    determinística as páginas por OFFSET poderiam se sobrepor, então o
+    caminho sequencial é mantido.
+    """
+    if order and concurrency > 1:
+        first = _fetch_page(table_name, select, apply_filters, order, 0, page_size, count="exact")
+        rows = list(first.data or [])
+        total = first.count
+        if total is not None and len(rows) == page_size and total > page_size:
+            starts = range(page_size, total, page_size)
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(starts))) as executor:
+                pages = executor.map(
+                    lambda start: _fetch_page(table_name, select, apply_filters, order, start, page_size).data or [],
+                    starts,
+                )
+                for batch in pages:
+                    rows.extend(batch)
+            # Linhas inseridas entre a contagem e as páginas ficam para a próxima carga
+            return rows
+        if total is not None or len(rows) < page_size:
+            return rows
+
     rows = []
     start = 0
 
+    while True:
+        response = _fetch_page(table_name, select, apply_filters, order, start, page_size)
+        batch = response.data or []
+        rows.extend(batch)
+        if len(batch) < page_size:
+            break
+        start += page_size
+
+    return rows
+
+
+# Paginação das leituras: "keyset" (padrão) ou "offset" (páginas em paralelo)
+PAGINATION_MODE = os.getenv("DASHBOARD_PAGINATION", "keyset").lower()
+
+# Ordem total das leituras de `propostas`: data de operação, com id como desempate
+BASE_KEY_COLUMNS = ["data_operacao", "id"]
+
+
+def _postgrest_literal(value) -> str:
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _seek_filter(key_columns: list[str], last_row: dict) -> str:
+    """Expande `(c1, c2, ...) > (v1, v2, ...)` na árvore lógica do PostgREST."""
+    branches = []
+    for i, col in enumerate(key_columns):
+        conditions = [f"{prev}.eq.{_postgrest_literal(last_row[prev])}" for prev in key_columns[:i]]
+        conditions.append(f"{col}.gt.{_postgrest_literal(last_row[col])}")
+        branches.append(f"and({','.join(conditions)})" if len(conditions) > 1 else conditions[0])
+    return ",".join(branches)
+
+
+def _fetch_keyset(table_name: str, select: str, key_columns: list[str], apply_filters=None, page_size: int = 1000):
+    """Busca todas as linhas ordenadas por `key_columns`, continuando da última chave vista.
+
+    Diferente do OFFSET, cada página começa direto na chave seguinte (o
+    `gte` na primeira coluna deixa o índice posicionar o início), então o
+    custo total cresce linearmente com o resultado. As colunas da chave não
+    podem ser nulas: linhas com chave nula ficam de fora.
+    """
+    selected = select.split(",")
+    extra_keys = [col for col in key_columns if select != "*" and col not in selected]
+    if extra_keys:
+        select = ",".join(selected + extra_keys)
+
+    rows = []
+    last_row = None
     while True:
         query = supabase.table(table_name).select(select)
         if apply_filters:
             query = apply_filters(query)
-        query = query.range(start, start + page_size - 1)
-        response = query.execute()
-        batch = response.data or []
+        for col in key_columns:
+            query = query.not_.is_(col, "null")
+        if last_row is not None:
+            query = query.gte(key_columns[0], last_row[key_columns[0]])
+            query = query.or_(_seek_filter(key_columns, last_row))
+        for col in key_columns:
+            query = query.order(col)
+        batch = query.limit(page_size).execute().data or []
         rows.extend(batch)
         if len(batch) < page_size:
             break
-        start += page_size
+        last_row = batch[-1]
 
+    if extra_keys:
+        for row in rows:
+            for col in extra_keys:
+                row.pop(col, None)
     return rows
 
 
+def _fetch_rows(table_name: str, select: str, key_columns: list[str], apply_filters=None):
+    """Lê a consulta inteira pelo modo de paginação configurado."""
+    if PAGINATION_MODE == "offset":
+        return _fetch_paginated(table_name, select, apply_filters=apply_filters, order=key_columns)
+    return _fetch_keyset(table_name, select, key_columns, apply_filters=apply_filters)
+
+
 @st.cache_data(ttl=3600)
-def load_view_data() -> pd.DataFrame:
+def load_view_data(start_month: datetime | None = None, end_month: datetime | None = None) -> pd.DataFrame:
+    """Linhas da view mensal, opcionalmente limitadas ao intervalo de competências."""
+
+    def apply_filters(query):
+        if start_month is not None:
+            query = query.gte("competencia", start_month.date().isoformat())
+        if end_month is not None:
+            query = query.lte("competencia", end_month.date().isoformat())
+        return query
+
     try:
-        data = _fetch_paginated("propostas_resumo_mensal", "*")
+        data = _fetch_rows("propostas_resumo_mensal", "*", VIEW_KEY_COLUMNS, apply_filters=apply_filters)
         df_view = pd.DataFrame(data)
         if df_view.empty:
             return df_view
@@ -258,6 +398,10 @@ def load_view_data() -> pd.DataFrame:
             "total_receita_cashforce",
             "taxa_efetiva_media",
             "prazo_medio",
+            "taxa_x_bruto",
+            "peso_taxa",
+            "prazo_x_bruto",
+            "peso_prazo",
         ]
         for col in numeric_cols:
             if col in df_view.columns:
@@ -268,6 +412,139 @@ def load_view_data() -> pd.DataFrame:
         return pd.DataFrame()
 
 
+# Consolidado diário mantido pelo ETL (supabase/propostas_resumo_diario.sql):
+# KPIs de qualquer intervalo de datas a partir de linhas já agregadas.
+DAILY_KEY_COLUMNS = ["dia", *VIEW_KEY_COLUMNS[1:]]
+DAILY_NUMERIC_COLUMNS = [
+    "quantidade_operacoes",
+    "total_bruto_duplicata",
+    "total_liquido_duplicata",
+    "total_receita_cashforce",
+    "taxa_x_bruto",
+    "peso_taxa",
+    "prazo_x_bruto",
+    "peso_prazo",
+]
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_daily_summary(start_date, end_date, parceiros: tuple, financiadores: tuple) -> pd.DataFrame | None:
+    """Linhas do consolidado diário no intervalo; None se a tabela não estiver disponível."""
+
+    def apply_filters(query):
+        query = query.gte("dia", start_date.date().isoformat()).lte("dia", end_date.date().isoformat())
+        if parceiros:
+            query = query.in_("parceiro", list(parceiros))
+        if financiadores:
+            query = query.in_("razao_social_financiador", list(financiadores))
+        return query
+
+    select = ",".join([*DAILY_KEY_COLUMNS, *DAILY_NUMERIC_COLUMNS])
+    try:
+        data = _fetch_rows("propostas_resumo_diario", select, DAILY_KEY_COLUMNS, apply_filters=apply_filters)
+    except Exception as exc:
+        print(f"Consolidado diário indisponível, usando a view mensal: {exc}")
+        return None
+    df_daily = pd.DataFrame(data, columns=[*DAILY_KEY_COLUMNS, *DAILY_NUMERIC_COLUMNS])
+    df_daily["dia"] = pd.to_datetime(df_daily["dia"], errors="coerce")
+    for col in DAILY_NUMERIC_COLUMNS:
+        df_daily[col] = pd.to_numeric(df_daily[col], errors="coerce")
+    return df_daily
+
+
+# Tabelas de dimensão mantidas pelo ETL (supabase/dimensoes.sql): valores
+# distintos com a primeira e a última competência em que aparecem.
+DIMENSION_KEY_COLUMNS = {
+    "dim_parceiros": ["nome"],
+    "dim_financiadores": ["nome"],
+    "dim_grupos_economicos": ["nome"],
+    "dim_status": ["campo", "nome"],
+}
+DIMENSION_DATE_COLUMNS = ["primeira_competencia", "ultima_competencia"]
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_dimension(table_name: str) -> pd.DataFrame | None:
+    """Lê uma tabela de dimensão (uma requisição; pagina só acima do limite do PostgREST).
+
+    Retorna None se a tabela não existir ou estiver vazia, para o chamador
+    recorrer à view mensal.
+    """
+    try:
+        data = _fetch_rows(table_name, "*", DIMENSION_KEY_COLUMNS[table_name])
+    except Exception as exc:
+        print(f"Dimensão {table_name} indisponível: {exc}")
+        return None
+    df_dimension = pd.DataFrame(data)
+    if df_dimension.empty:
+        return None
+    for col in DIMENSION_DATE_COLUMNS:
+        df_dimension[col] = pd.to_datetime(df_dimension[col], errors="coerce")
+    return df_dimension
+
+
+def _dimension_from_view(df_view: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Mesma forma das tabelas de dimensão, derivada da view mensal (fallback)."""
+    return (
+        df_view.dropna(subset=[column])
+        .groupby(column)["competencia"]
+        .agg(primeira_competencia="min", ultima_competencia="max")
+        .reset_index()
+        .rename(columns={column: "nome"})
+    )
+
+
+def load_sidebar_dimensions() -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Parceiros e financiadores da sidebar; sem as tabelas de dimensão, usa a view inteira."""
+    parceiros = load_dimension("dim_parceiros")
+    financiadores = load_dimension("dim_financiadores")
+    if parceiros is None or financiadores is None:
+        df_view_all = load_view_data()
+        if df_view_all.empty:
+            return pd.DataFrame(), pd.DataFrame()
+        parceiros = _dimension_from_view(df_view_all, "parceiro")
+        financiadores = _dimension_from_view(df_view_all, "razao_social_financiador")
+    return parceiros, financiadores
+
+
+def dimension_options(df_dimension: pd.DataFrame | None, start_month=None, end_month=None) -> list[str]:
+    """Valores ordenados da dimensão, opcionalmente só os ativos no intervalo de competências."""
+    if df_dimension is None or df_dimension.empty:
+        return []
+    mask = pd.Series(True, index=df_dimension.index)
+    if start_month is not None:
+        mask &= df_dimension["ultima_competencia"] >= pd.Timestamp(start_month)
+    if end_month is not None:
+        mask &= df_dimension["primeira_competencia"] <= pd.Timestamp(end_month)
+    return sorted(df_dimension.loc[mask, "nome"].dropna().unique().tolist())
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_scope_period(parceiros: tuple, financiadores: tuple) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    """Primeira e última competência com dados para o recorte de parceiros/financiadores.
+
+    Duas consultas de uma linha (ordem crescente e decrescente) na view mensal.
+    Tuplas vazias significam "todos".
+    """
+    supabase = get_supabase_client()
+    bounds = []
+    try:
+        for desc in (False, True):
+            query = supabase.table("propostas_resumo_mensal").select("competencia")
+            if parceiros:
+                query = query.in_("parceiro", list(parceiros))
+            if financiadores:
+                query = query.in_("razao_social_financiador", list(financiadores))
+            data = query.order("competencia", desc=desc).limit(1).execute().data
+            if not data:
+                return None
+            bounds.append(pd.to_datetime(data[0]["competencia"]).tz_localize(None))
+    except Exception as exc:
+        print(f"Erro ao consultar período do recorte: {exc}")
+        return None
+    return bounds[0], bounds[1]
+
+
 BASE_COLUMNS = [
     "nfid",
     "numero_proposta",
@@ -289,50 +566,252 @@ BASE_COLUMNS = [
 ]
 
 
-@st.cache_data(ttl=3600)
+BASE_NUMERIC_COLUMNS = [
+    "valor_bruto_duplicata",
+    "valor_liquido_duplicata",
+    "receita_cashforce",
+    "prazo_medio_operacao",
+    "taxa_efetiva_mes_percentual",
+]
+
+# Tipos compactos de df_base (aplicados por _compact_base_frame).
+# Texto de baixa cardinalidade vira category; NFID e proposta são quase únicos
+# e ficam como object. Valores em R$ continuam float64: float32 tem ~7 dígitos
+# significativos e perde centavos a partir de R$ 100 mil.
+BASE_SCHEMA = {
+    "nfid": "object",
+    "numero_proposta": "object",
+    "data_operacao": "datetime64[s]",
+    "grupo_economico": "category",
+    "razao_social_comprador": "category",
+    "cnpj_comprador": "category",
+    "razao_social_fornecedor": "category",
+    "cnpj_fornecedor": "category",
+    "parceiro": "category",
+    "razao_social_financiador": "category",
+    "valor_bruto_duplicata": "float64",
+    "valor_liquido_duplicata": "float64",
+    "status_pagamento": "category",
+    "status_proposta": "category",
+    "receita_cashforce": "float64",
+    "prazo_medio_operacao": "float32",
+    "taxa_efetiva_mes_percentual": "float32",
+}
+
+
+def _normalize_base_frame(df_base: pd.DataFrame) -> pd.DataFrame:
+    missing_cols = [col for col in BASE_COLUMNS if col not in df_base.columns]
+    for col in missing_cols:
+        df_base[col] = pd.NA
+    df_base["data_operacao"] = pd.to_datetime(df_base["data_operacao"], errors="coerce")
+    if is_datetime64tz_dtype(df_base["data_operacao"]):
+        df_base["data_operacao"] = df_base["data_operacao"].dt.tz_convert(None)
+    for col in BASE_NUMERIC_COLUMNS:
+        if col in df_base.columns:
+            df_base[col] = pd.to_numeric(df_base[col], errors="coerce")
+    return df_base
+
+
+def _compact_base_frame(df_base: pd.DataFrame) -> pd.DataFrame:
+    """Aplica BASE_SCHEMA (categorias e tipos numéricos compactos)."""
+    for col, dtype in BASE_SCHEMA.items():
+        if col in df_base.columns and df_base[col].dtype != dtype:
+            df_base[col] = df_base[col].astype(dtype)
+    return df_base
+
+
+def _prepare_base_superset(df_base: pd.DataFrame) -> pd.DataFrame:
+    """Compacta e ordena por data de operação (sem datas nulas) para fatiar por busca binária."""
+    df_base = _compact_base_frame(df_base)
+    df_base = df_base.dropna(subset=["data_operacao"])
+    return df_base.sort_values("data_operacao", kind="stable").reset_index(drop=True)
+
+
+@st.cache_resource(ttl=3600, max_entries=4, show_spinner=False)
+def _load_base_superset_remote(envelope_start, envelope_end) -> pd.DataFrame:
+    """Todas as operações do envelope de datas, sem filtros de parceiro/financiador."""
+    start_iso = envelope_start.isoformat()
+    end_iso = envelope_end.isoformat()
+
+    def apply_filters_to_query(query):
+        query = query.gte("data_operacao", start_iso)
+        return query.lte("data_operacao", end_iso)
+
+    data = _fetch_rows(
+        "propostas",
+        ",".join(BASE_COLUMNS),
+        BASE_KEY_COLUMNS,
+        apply_filters=apply_filters_to_query,
+    )
+    df_base = pd.DataFrame(data, columns=BASE_COLUMNS)
+    return _prepare_base_superset(_normalize_base_frame(df_base))
+
+
+# --- 5.1 CACHE COLUNAR LOCAL (PARQUET) ---
+# A projeção BASE_COLUMNS de `propostas` fica em disco, ordenada por data de
+# operação, e é atualizada de forma incremental por `updated_at`. Trocar o
+# período ou os filtros vira uma leitura local com predicate pushdown.
+BASE_CACHE_DIR = os.getenv("DASHBOARD_CACHE_DIR", ".cache")
+BASE_CACHE_PATH = os.path.join(BASE_CACHE_DIR, "propostas_base.parquet")
+BASE_CACHE_SYNC_TTL = 300  # segundos entre consultas incrementais ao Supabase
+BASE_CACHE_OVERLAP = timedelta(minutes=10)  # folga para transações do ETL ainda abertas
+BASE_CACHE_FULL_REFRESH = timedelta(hours=24)  # recarga completa (captura exclusões)
+BASE_CACHE_ROW_GROUP_SIZE = 50_000
+
+
+@st.cache_resource
+def _base_cache_lock() -> threading.Lock:
+    return threading.Lock()
+
+
+def _read_base_cache_metadata() -> dict:
+    metadata = pq.read_schema(BASE_CACHE_PATH).metadata or {}
+    return {key.decode(): value.decode() for key, value in metadata.items() if not key.startswith(b"pandas")}
+
+
+def _write_base_cache(df_cache: pd.DataFrame, full_synced_at: str):
+    os.makedirs(BASE_CACHE_DIR, exist_ok=True)
+    df_cache = df_cache.sort_values(["data_operacao", "nfid"], na_position="first", kind="stable")
+    table = pa.Table.from_pandas(df_cache, preserve_index=False)
+    watermark = df_cache["updated_at"].max()
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            b"full_synced_at": full_synced_at.encode(),
+            b"watermark": (watermark.isoformat() if not pd.isna(watermark) else "").encode(),
+        }
+    )
+    # Escrita atômica: leitores nunca veem um arquivo pela metade
+    tmp_path = f"{BASE_CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=BASE_CACHE_ROW_GROUP_SIZE)
+    os.replace(tmp_path, BASE_CACHE_PATH)
+
+
+def _fetch_base_changes(since: str | None) -> pd.DataFrame:
+    def apply_filters_to_query(query):
+        return query.gte("updated_at", since) if since else query
+
+    # Chave só por id: a carga completa inclui linhas sem data de operação
+    data = _fetch_rows(
+        "propostas",
+        ",".join(BASE_COLUMNS + ["updated_at"]),
+        ["id"],
+        apply_filters=apply_filters_to_query if since else None,
+    )
+    df_changes = pd.DataFrame(data, columns=BASE_COLUMNS + ["updated_at"])
+    df_changes = _normalize_base_frame(df_changes)
+    df_changes["nfid"] = df_changes["nfid"].astype("string")
+    df_changes["updated_at"] = pd.to_datetime(df_changes["updated_at"], errors="coerce", utc=True, format="ISO8601")
+    return df_changes
+
+
+@st.cache_data(ttl=BASE_CACHE_SYNC_TTL, show_spinner=False)
+def sync_base_cache() -> str | None:
+    """Atualiza o Parquet local com as linhas alteradas desde a última sincronização.
+
+    Retorna a marca d'água da versão gravada, ou None se o cache não puder ser
+    usado (pyarrow ausente, disco somente leitura, falha de rede).
+    """
+    if pq is None:
+        return None
+    with _base_cache_lock():
+        try:
+            now = datetime.utcnow()
+            metadata = _read_base_cache_metadata() if os.path.exists(BASE_CACHE_PATH) else {}
+            full_synced_at = metadata.get("full_synced_at")
+            watermark = metadata.get("watermark")
+            needs_full = (
+                not full_synced_at
+                or not watermark
+                or now - datetime.fromisoformat(full_synced_at) > BASE_CACHE_FULL_REFRESH
+            )
+
+            if needs_full:
+                df_cache = _fetch_base_changes(None)
+                _write_base_cache(df_cache, now.isoformat())
+                return _read_base_cache_metadata()["watermark"]
+
+            since = (pd.Timestamp(watermark) - BASE_CACHE_OVERLAP).tz_convert(None).isoformat()
+            df_changes = _fetch_base_changes(since)
+            if df_changes.empty:
+                return watermark
+
+            df_cache = pd.read_parquet(BASE_CACHE_PATH)
+            df_cache = df_cache[~df_cache["nfid"].isin(df_changes["nfid"])]
+            _write_base_cache(pd.concat([df_cache, df_changes], ignore_index=True), full_synced_at)
+            return _read_base_cache_metadata()["watermark"]
+        except Exception as exc:
+            print(f"Cache local de operações indisponível, usando Supabase: {exc}")
+            return None
+
+
+@st.cache_resource(ttl=3600, max_entries=2, show_spinner=False)
+def _load_base_superset_cached(version: str) -> pd.DataFrame:
+    """Histórico completo do Parquet local; `version` (marca d'água) invalida a entrada."""
+    df_base = pd.read_parquet(BASE_CACHE_PATH, columns=BASE_COLUMNS)
+    return _prepare_base_superset(df_base)
+
+
+def _month_envelope(start_date, end_date) -> tuple[datetime, datetime]:
+    """Expande o período para meses inteiros, para que períodos próximos reutilizem o mesmo superconjunto."""
+    envelope_start = datetime(start_date.year, start_date.month, 1)
+    envelope_end = (pd.Timestamp(end_date) + pd.offsets.MonthEnd(0)).to_pydatetime()
+    return envelope_start, datetime.combine(envelope_end.date(), datetime.min.time())
+
+
+# Rótulos dos consolidados (e das opções da sidebar) para parceiro e
+# financiador nulos; as RPCs aplicam a mesma regra no filtro
+NULL_DIMENSION_LABELS = {"parceiro": "Sem parceiro", "razao_social_financiador": "Sem financiador"}
+
+
+def _dimension_mask(series: pd.Series, selected) -> np.ndarray:
+    """`isin` em que o rótulo "Sem ..." seleciona as operações com o campo nulo."""
+    mask = series.isin(selected).to_numpy()
+    if NULL_DIMENSION_LABELS[series.name] in selected:
+        mask |= series.isna().to_numpy()
+    return mask
+
+
+def slice_base_frame(
+    df_base: pd.DataFrame, start_date, end_date, selected_parceiros, selected_financiadores
+) -> pd.DataFrame:
+    """Recorte do superconjunto em memória: busca binária na data e máscaras de parceiro/financiador."""
+    if df_base.empty:
+        return df_base.copy()
+    dates = df_base["data_operacao"].to_numpy()
+    lower = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date), "s"), side="left")
+    upper = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date), "s"), side="right")
+    df_slice = df_base.iloc[lower:upper]
+
+    mask = np.ones(len(df_slice), dtype=bool)
+    if selected_parceiros:
+        mask &= _dimension_mask(df_slice["parceiro"], selected_parceiros)
+    if selected_financiadores:
+        mask &= _dimension_mask(df_slice["razao_social_financiador"], selected_financiadores)
+    return df_slice[mask].reset_index(drop=True)
+
+
 def load_base_data(
     start_date, end_date, selected_parceiros: tuple[str, ...], selected_financiadores: tuple[str, ...]
 ) -> pd.DataFrame:
+    """Operações do recorte, fatiadas de um superconjunto em cache.
+
+    O cache não depende dos filtros: com o Parquet local é o histórico
+    inteiro (uma entrada por versão), sem ele é o envelope de meses do
+    período buscado no Supabase. Trocar parceiros, financiadores ou o período
+    dentro do envelope custa só as máscaras em memória.
+    """
     try:
-        start_iso = start_date.isoformat()
-        end_iso = end_date.isoformat()
-
-        parceiros_tuple = tuple(selected_parceiros)
-        financiadores_tuple = tuple(selected_financiadores)
-
-        def apply_filters_to_query(query):
-            query = query.gte("data_operacao", start_iso)
-            query = query.lte("data_operacao", end_iso)
-            if parceiros_tuple:
-                query = query.in_("parceiro", list(parceiros_tuple))
-            if financiadores_tuple:
-                query = query.in_("razao_social_financiador", list(financiadores_tuple))
-            return query
-
-        data = _fetch_paginated(
-            "propostas",
-            ",".join(BASE_COLUMNS),
-            apply_filters=apply_filters_to_query,
-        )
-        df_base = pd.DataFrame(data)
-        if df_base.empty:
-            return pd.DataFrame(columns=BASE_COLUMNS)
-        missing_cols = [col for col in BASE_COLUMNS if col not in df_base.columns]
-        for col in missing_cols:
-            df_base[col] = pd.NA
-        df_base["data_operacao"] = pd.to_datetime(df_base["data_operacao"], errors="coerce")
-        if is_datetime64tz_dtype(df_base["data_operacao"]):
-            df_base["data_operacao"] = df_base["data_operacao"].dt.tz_convert(None)
-        for col in [
-            "valor_bruto_duplicata",
-            "valor_liquido_duplicata",
-            "receita_cashforce",
-            "prazo_medio_operacao",
-            "taxa_efetiva_mes_percentual",
-        ]:
-            if col in df_base.columns:
-                df_base[col] = pd.to_numeric(df_base[col], errors="coerce")
-        return df_base
+        superset = None
+        version = sync_base_cache()
+        if version:
+            try:
+                superset = _load_base_superset_cached(version)
+            except Exception as exc:
+                print(f"Falha ao ler cache local de operações, usando Supabase: {exc}")
+        if superset is None:
+            superset = _load_base_superset_remote(*_month_envelope(start_date, end_date))
+        return slice_base_frame(superset, start_date, end_date, selected_parceiros, selected_financiadores)
     except Exception as exc:
         st.error(f"Erro ao carregar tabela de operações: {exc}")
         return pd.DataFrame()
@@ -349,6 +828,113 @@ def load_kpi_data() -> dict:
         return {}
 
 
+# --- 5.2 AGREGAÇÕES SERVER-SIDE (RPC) ---
+# Funções de `supabase/dashboard_rpc.sql`: devolvem só as linhas agregadas do
+# recorte, em vez de trazer todas as operações para agrupar no pandas.
+RPC_COLUMNS = {
+    "ranking_grupos": ["grupo_economico", "volume", "duplicatas", "propostas", "ultima_operacao"],
+    "parceiros_metrics": [
+        "parceiro",
+        "volume_bruto",
+        "n_compradores",
+        "n_propostas",
+        "n_duplicatas",
+        "prazo_medio_pond",
+        "taxa_media_pond",
+    ],
+    "funding_metrics": [
+        "razao_social_financiador",
+        "volume",
+        "duplicatas",
+        "taxa_media_ponderada",
+        "peso_taxa",
+        "prazo_medio_ponderado",
+        "peso_prazo",
+    ],
+    "clientes_resumo": ["grupos", "sacados", "fornecedores", "financiadores"],
+    "resumo_diario_distintos": ["grupos", "sacados", "fornecedores", "financiadores", "propostas"],
+}
+RPC_TEXT_COLUMNS = {"grupo_economico", "parceiro", "razao_social_financiador"}
+RPC_DATE_COLUMNS = {"ultima_operacao"}
+
+
+@st.cache_data(ttl=3600)
+def load_rpc_aggregate(
+    function_name: str,
+    start_date,
+    end_date,
+    selected_parceiros: tuple[str, ...],
+    selected_financiadores: tuple[str, ...],
+) -> pd.DataFrame | None:
+    """Executa uma agregação via `supabase.rpc`; None se a função não estiver disponível."""
+    params = {
+        "p_start": start_date.date().isoformat(),
+        "p_end": end_date.date().isoformat(),
+        # Lista vazia = sem filtro, como em load_base_data
+        "p_parceiros": list(selected_parceiros) or None,
+        "p_financiadores": list(selected_financiadores) or None,
+    }
+    try:
+        response = supabase.rpc(function_name, params).execute()
+    except Exception as exc:
+        print(f"RPC {function_name} indisponível, agregando localmente: {exc}")
+        return None
+
+    df_rpc = pd.DataFrame(response.data or [], columns=RPC_COLUMNS[function_name])
+    for col in df_rpc.columns:
+        if col in RPC_DATE_COLUMNS:
+            df_rpc[col] = pd.to_datetime(df_rpc[col], errors="coerce")
+        elif col not in RPC_TEXT_COLUMNS:
+            df_rpc[col] = pd.to_numeric(df_rpc[col], errors="coerce")
+    return df_rpc
+
+
+# Explorador server-side (`supabase/explorer_rpc.sql`): uma página de linhas
+# por chamada, continuando após a última (data_operacao, id) recebida.
+# A tupla de filtros segue a ordem de `export_params`: período local,
+# parceiros, financiadores, status de pagamento, status de proposta e busca.
+EXPLORER_PAGE_SIZE = 500
+EXPLORER_COLUMNS = EXPORT_COLUMNS
+
+
+def _explorer_params(filtros: tuple) -> dict:
+    """Parâmetros comuns das RPCs do Explorador a partir da tupla de filtros."""
+    return export_params(*filtros)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_explorer_page(filtros: tuple, cursor: tuple | None) -> pd.DataFrame | None:
+    """Página do Explorador após `cursor` (data ISO, id); None se a RPC não estiver disponível."""
+    params = _explorer_params(filtros)
+    params["p_apos_data"], params["p_apos_id"] = cursor if cursor else (None, None)
+    params["p_limite"] = EXPLORER_PAGE_SIZE
+    try:
+        response = supabase.rpc("explorer_operacoes", params).execute()
+    except Exception as exc:
+        print(f"RPC explorer_operacoes indisponível, filtrando localmente: {exc}")
+        return None
+    df_page = pd.DataFrame(response.data or [], columns=EXPLORER_COLUMNS)
+    df_page["data_operacao"] = pd.to_datetime(df_page["data_operacao"], errors="coerce")
+    df_page["valor_bruto_duplicata"] = pd.to_numeric(df_page["valor_bruto_duplicata"], errors="coerce")
+    return df_page
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_explorer_totals(filtros: tuple) -> dict | None:
+    """Volume bruto, linhas e propostas distintas do recorte do Explorador."""
+    try:
+        data = supabase.rpc("explorer_totais", _explorer_params(filtros)).execute().data
+    except Exception as exc:
+        print(f"RPC explorer_totais indisponível, filtrando localmente: {exc}")
+        return None
+    row = data[0] if data else {}
+    return {
+        "volume_bruto": float(row.get("volume_bruto") or 0),
+        "linhas": int(row.get("linhas") or 0),
+        "propostas": int(row.get("propostas") or 0),
+    }
+
+
 # --- 6. FUNÇÕES HELPER DE FORMATAÇÃO ---
 def format_currency(value: float | None) -> str:
     if value is None or pd.isna(value):
@@ -372,6 +958,37 @@ def weighted_average(values: pd.Series, weights: pd.Series) -> float | None:
     return float(result)
 
 
+def weighted_average_from_sums(sum_vw: pd.Series, sum_w: pd.Series) -> float | None:
+    """Média ponderada a partir dos componentes já somados (sum(v*w), sum(w))."""
+    total_weight = sum_w.sum()
+    if not total_weight:
+        return None
+    return float(sum_vw.sum() / total_weight)
+
+
+def _weighted_sums(df: pd.DataFrame, by, value_col: str, weight_col: str) -> pd.DataFrame:
+    """Soma de valor×peso (`sum_vw`) e de peso (`sum_w`) por grupo, numa única passada.
+
+    Como em `weighted_average`, só entram linhas com valor e peso preenchidos;
+    grupos sem nenhuma linha válida ficam com somas nulas.
+    """
+    values = df[value_col]
+    weights = df[weight_col]
+    mask = values.notna() & weights.notna()
+    keys = [df[col] for col in by] if isinstance(by, list) else df[by]
+    components = pd.DataFrame(
+        {"sum_vw": (values * weights).where(mask), "sum_w": weights.where(mask)},
+        index=df.index,
+    )
+    return components.groupby(keys, observed=True).sum(min_count=1)
+
+
+def grouped_weighted_average(df: pd.DataFrame, by, value_col: str, weight_col: str) -> pd.Series:
+    """`weighted_average` por grupo, vetorizado: sum(v*w) / sum(w)."""
+    sums = _weighted_sums(df, by, value_col, weight_col)
+    return sums["sum_vw"] / sums["sum_w"].replace(0, np.nan)
+
+
 def format_percent(value: float | None) -> str:
     if value is None or pd.isna(value):
         return "—"
@@ -384,15 +1001,376 @@ def format_duration(value: float | None) -> str:
     return f"{value:.1f} dias"
 
 
+# Formatos de coluna para st.dataframe: os valores continuam numéricos (a
+# tabela ordena por número) e só a exibição é formatada no navegador.
+# "localized" segue o idioma do navegador; `step` fixa as casas decimais.
+def currency_column(label: str) -> st.column_config.NumberColumn:
+    return st.column_config.NumberColumn(label, format="localized", step=0.01)
+
+
+def integer_column(label: str) -> st.column_config.NumberColumn:
+    return st.column_config.NumberColumn(label, format="localized", step=1)
+
+
+def percent_column(label: str) -> st.column_config.NumberColumn:
+    return st.column_config.NumberColumn(label, format="%.2f%%")
+
+
+def duration_column(label: str) -> st.column_config.NumberColumn:
+    return st.column_config.NumberColumn(label, format="%.1f dias")
+
+
+def date_column(label: str) -> st.column_config.DateColumn:
+    return st.column_config.DateColumn(label, format="DD/MM/YYYY")
+
+
+# --- 6.1 AGREGAÇÕES LOCAIS (FALLBACK DAS RPCs) ---
+# Mesmo resultado das funções de `supabase/dashboard_rpc.sql`, calculado sobre
+# df_base quando a RPC não está disponível no banco.
+def _ranking_grupos_local(df: pd.DataFrame) -> pd.DataFrame:
+    com_grupo = df.dropna(subset=["grupo_economico"])
+    if com_grupo.empty:
+        return pd.DataFrame(columns=RPC_COLUMNS["ranking_grupos"])
+    return (
+        com_grupo.groupby("grupo_economico", observed=True)
+        .agg(
+            volume=("valor_bruto_duplicata", "sum"),
+            duplicatas=("nfid", "count"),
+            propostas=("numero_proposta", "nunique"),
+            ultima_operacao=("data_operacao", "max"),
+        )
+        .reset_index()
+        .sort_values("volume", ascending=False)
+    )
+
+
+def _parceiros_metrics_local(df: pd.DataFrame) -> pd.DataFrame:
+    parceiros_com_dados = df.dropna(subset=["parceiro"])
+    if parceiros_com_dados.empty:
+        return pd.DataFrame(columns=RPC_COLUMNS["parceiros_metrics"])
+    df_parceiro_agg = parceiros_com_dados.groupby("parceiro", observed=True).agg(
+        volume_bruto=("valor_bruto_duplicata", "sum"),
+        n_compradores=("cnpj_comprador", "nunique"),
+        n_propostas=("numero_proposta", "nunique"),
+        n_duplicatas=("nfid", "count"),
+    )
+    df_parceiro_agg["prazo_medio_pond"] = grouped_weighted_average(
+        parceiros_com_dados, "parceiro", "prazo_medio_operacao", "valor_bruto_duplicata"
+    )
+    df_parceiro_agg["taxa_media_pond"] = grouped_weighted_average(
+        parceiros_com_dados, "parceiro", "taxa_efetiva_mes_percentual", "valor_bruto_duplicata"
+    )
+    return df_parceiro_agg.reset_index().sort_values("volume_bruto", ascending=False)
+
+
+def _funding_metrics_local(df: pd.DataFrame) -> pd.DataFrame:
+    com_financiador = df.dropna(subset=["razao_social_financiador"])
+    if com_financiador.empty:
+        return pd.DataFrame(columns=RPC_COLUMNS["funding_metrics"])
+    funding = com_financiador.groupby("razao_social_financiador", observed=True).agg(
+        volume=("valor_bruto_duplicata", "sum"),
+        duplicatas=("nfid", "count"),
+    )
+    for value_col, mean_col, weight_col in (
+        ("taxa_efetiva_mes_percentual", "taxa_media_ponderada", "peso_taxa"),
+        ("prazo_medio_operacao", "prazo_medio_ponderado", "peso_prazo"),
+    ):
+        sums = _weighted_sums(com_financiador, "razao_social_financiador", value_col, "valor_bruto_duplicata")
+        funding[mean_col] = sums["sum_vw"] / sums["sum_w"].replace(0, np.nan)
+        funding[weight_col] = sums["sum_w"]
+    return funding.reset_index().sort_values("volume", ascending=False)
+
+
+def funding_metrics_from_sums(df_summary: pd.DataFrame) -> pd.DataFrame:
+    """`funding_metrics` a partir de um consolidado com os componentes ponderados.
+
+    Soma volume, duplicatas e os componentes (`taxa_x_bruto`/`peso_taxa`,
+    `prazo_x_bruto`/`peso_prazo`) por financiador; a média exata sai da razão
+    das somas, sem voltar às operações.
+    """
+    com_financiador = df_summary[df_summary["razao_social_financiador"] != "Sem financiador"]
+    if com_financiador.empty:
+        return pd.DataFrame(columns=RPC_COLUMNS["funding_metrics"])
+    sums = com_financiador.groupby("razao_social_financiador", observed=True)[
+        ["total_bruto_duplicata", "quantidade_operacoes", "taxa_x_bruto", "peso_taxa", "prazo_x_bruto", "peso_prazo"]
+    ].sum()
+    funding = pd.DataFrame({"volume": sums["total_bruto_duplicata"], "duplicatas": sums["quantidade_operacoes"]})
+    for sum_col, mean_col, weight_col in (
+        ("taxa_x_bruto", "taxa_media_ponderada", "peso_taxa"),
+        ("prazo_x_bruto", "prazo_medio_ponderado", "peso_prazo"),
+    ):
+        weights = sums[weight_col].replace(0, np.nan)
+        funding[mean_col] = sums[sum_col] / weights
+        funding[weight_col] = weights
+    return funding.reset_index()[RPC_COLUMNS["funding_metrics"]].sort_values("volume", ascending=False)
+
+
+def _clientes_resumo_local(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "grupos": df["grupo_economico"].nunique(dropna=True),
+                "sacados": df["cnpj_comprador"].nunique(dropna=True),
+                "fornecedores": df["cnpj_fornecedor"].nunique(dropna=True),
+                "financiadores": df["razao_social_financiador"].nunique(dropna=True),
+            }
+        ]
+    )
+
+
+LOCAL_AGGREGATES = {
+    "ranking_grupos": _ranking_grupos_local,
+    "parceiros_metrics": _parceiros_metrics_local,
+    "funding_metrics": _funding_metrics_local,
+    "clientes_resumo": _clientes_resumo_local,
+}
+
+
+# --- 6.2 AGREGAÇÕES DAS ABAS (SOB DEMANDA) ---
+# Cada aba só calcula o que exibe, e o resultado fica em cache pela
+# assinatura do recorte (filtros globais + versão da base).
+def _top_volume(df: pd.DataFrame, column: str, n: int = 5) -> pd.DataFrame:
+    return (
+        df.groupby(column, dropna=True, observed=True)["valor_bruto_duplicata"]
+        .sum()
+        .nlargest(n)
+        .reset_index()
+    )
+
+
+def _novos_sacados_local(df: pd.DataFrame) -> pd.DataFrame:
+    """Quantidade de sacados por mês da primeira operação no recorte."""
+    sacados_first_seen = (
+        df.dropna(subset=["cnpj_comprador", "data_operacao"])
+        .groupby("cnpj_comprador", observed=True)["data_operacao"]
+        .min()
+    )
+    return (
+        sacados_first_seen.dt.to_period("M")
+        .value_counts()
+        .sort_index()
+        .rename_axis("competencia_period")
+        .to_frame("novos_sacados")
+    )
+
+
+def _ranking_fornecedores_local(df: pd.DataFrame) -> pd.DataFrame:
+    return (
+        df.dropna(subset=["cnpj_fornecedor"])
+        .groupby(["cnpj_fornecedor", "razao_social_fornecedor"], observed=True)
+        .agg(volume=("valor_bruto_duplicata", "sum"), duplicatas=("nfid", "count"))
+        .reset_index()
+        .sort_values("volume", ascending=False)
+        .head(10)
+    )
+
+
+def _fornecedores_por_grupo_local(df: pd.DataFrame) -> pd.DataFrame:
+    return (
+        df.dropna(subset=["grupo_economico"])
+        .groupby("grupo_economico", observed=True)["cnpj_fornecedor"]
+        .nunique()
+        .reset_index(name="fornecedores_ativos")
+        .sort_values("fornecedores_ativos", ascending=False)
+    )
+
+
+HEALTH_BUCKETS = ["🔴 Risco", "🟡 Atenção", "🟢 Saudável"]
+
+
+def health_buckets(dias_sem_operar: pd.Series) -> pd.Categorical:
+    """Faixa de saúde por dias sem operar: Risco (> 90), Atenção (> 30), Saudável."""
+    dias = dias_sem_operar.to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        codes = np.select([dias > 90, dias > 30, ~np.isnan(dias)], [0, 1, 2], default=-1)
+    return pd.Categorical.from_codes(codes, categories=HEALTH_BUCKETS, ordered=True)
+
+
+def _health_check_local(df: pd.DataFrame) -> pd.DataFrame:
+    """Última operação, dias sem operar e faixa de saúde por grupo econômico."""
+    health = (
+        df.dropna(subset=["grupo_economico"])
+        .groupby("grupo_economico", observed=True)["data_operacao"]
+        .max()
+        .reset_index(name="ultima_operacao")
+    )
+    health["dias_sem_operar"] = (pd.Timestamp(datetime.now().date()) - health["ultima_operacao"]).dt.days
+    health["saude"] = health_buckets(health["dias_sem_operar"])
+    return health.sort_values("ultima_operacao", ascending=False, ignore_index=True)
+
+
+TAB_AGGREGATES = {
+    **LOCAL_AGGREGATES,
+    "top_grupos": lambda df: _top_volume(df, "grupo_economico"),
+    "top_parceiros": lambda df: _top_volume(df, "parceiro"),
+    "top_financiadores": lambda df: _top_volume(df, "razao_social_financiador"),
+    "novos_sacados": _novos_sacados_local,
+    "ranking_fornecedores": _ranking_fornecedores_local,
+    "fornecedores_por_grupo": _fornecedores_por_grupo_local,
+    "health_check": _health_check_local,
+}
+
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def cached_tab_aggregate(function_name: str, signature: tuple, _df_base: pd.DataFrame) -> pd.DataFrame:
+    """Agregação local do recorte; `_df_base` fica fora do hash, identificado por `signature`."""
+    return TAB_AGGREGATES[function_name](_df_base)
+
+
+# --- 6.3 ÍNDICE DE BUSCA DO EXPLORADOR (TRIGRAMAS) ---
+# A busca por NFID/CNPJ consulta um índice invertido construído uma vez por
+# recorte, em vez de varrer as colunas a cada tecla. O índice trabalha sobre
+# as chaves distintas de cada coluna (em bytes UTF-8): trigramas apontam para
+# chaves, e as chaves apontam para as posições das linhas no recorte.
+SEARCH_COLUMNS = {
+    "nfid": "texto",
+    "cnpj_comprador": "cnpj",
+    "cnpj_fornecedor": "cnpj",
+}
+SEARCH_NGRAM = 3
+CNPJ_TERM_CHARS = set("0123456789./- ")
+
+
+def _normalize_search_keys(values: pd.Series, kind: str) -> pd.Series:
+    """Texto em minúsculas; CNPJ só com dígitos (com ou sem pontuação casam igual)."""
+    values = values.astype("string").fillna("")
+    if kind == "cnpj":
+        return values.str.replace(r"\D", "", regex=True)
+    return values.str.lower()
+
+
+def _normalize_search_term(term: str, kind: str) -> str:
+    term = term.strip()
+    if kind == "cnpj":
+        # Termos com letras não são CNPJ: evitar casar só os dígitos soltos
+        if not set(term) <= CNPJ_TERM_CHARS:
+            return ""
+        return "".join(ch for ch in term if ch.isdigit())
+    return term.lower()
+
+
+def _csr(groups: np.ndarray, members: np.ndarray, size: int) -> tuple[np.ndarray, np.ndarray]:
+    """Agrupa `members` por `groups` (0..size-1): offsets + membros ordenados por grupo."""
+    order = np.argsort(groups, kind="stable")
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups, minlength=size), out=offsets[1:])
+    return offsets, members[order]
+
+
+def _build_column_index(values: pd.Series, kind: str) -> dict:
+    # Normaliza só os valores distintos e reaproveita os códigos das linhas
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        raw_codes, raw_values = values.cat.codes.to_numpy(), values.cat.categories.to_series()
+    else:
+        raw_codes, raw_values = pd.factorize(values)
+        raw_values = pd.Series(raw_values, dtype=object)
+    key_codes, keys = pd.factorize(_normalize_search_keys(raw_values, kind).to_numpy())
+    keys = np.array([key.encode("utf-8") for key in keys], dtype=bytes)
+
+    # Chave -> linhas (posições no recorte)
+    valid = np.flatnonzero(raw_codes >= 0)
+    key_offsets, key_rows = _csr(key_codes[raw_codes[valid]], valid, len(keys))
+
+    # Trigrama -> chaves: cada janela de 3 bytes vira um inteiro de 24 bits
+    grams = np.empty(0, dtype=np.int64)
+    gram_offsets = np.zeros(1, dtype=np.int64)
+    gram_keys = np.empty(0, dtype=np.int64)
+    if len(keys) and keys.dtype.itemsize >= SEARCH_NGRAM:
+        matrix = keys.view(np.uint8).reshape(len(keys), keys.dtype.itemsize)
+        lengths = np.char.str_len(keys)
+        pairs = []
+        for start in range(keys.dtype.itemsize - SEARCH_NGRAM + 1):
+            fits = np.flatnonzero(lengths >= start + SEARCH_NGRAM)
+            window = matrix[fits, start:start + SEARCH_NGRAM].astype(np.int64)
+            code = (window[:, 0] << 16) | (window[:, 1] << 8) | window[:, 2]
+            # (trigrama, chave) num único int64 para deduplicar e ordenar de uma vez
+            pairs.append((code << 32) | fits)
+        pairs = np.sort(np.concatenate(pairs))
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        pair_grams = pairs >> 32
+        first = np.flatnonzero(np.concatenate(([True], pair_grams[1:] != pair_grams[:-1])))
+        grams = pair_grams[first]
+        gram_offsets = np.append(first, len(pairs)).astype(np.int64)
+        gram_keys = pairs & 0xFFFFFFFF
+
+    return {
+        "kind": kind,
+        "keys": keys,
+        "key_offsets": key_offsets,
+        "key_rows": key_rows,
+        "grams": grams,
+        "gram_offsets": gram_offsets,
+        "gram_keys": gram_keys,
+    }
+
+
+def build_search_index(df_base: pd.DataFrame) -> dict:
+    """Índice de trigramas das colunas de busca do Explorador para o recorte."""
+    return {
+        "rows": len(df_base),
+        "columns": {
+            col: _build_column_index(df_base[col], kind)
+            for col, kind in SEARCH_COLUMNS.items()
+            if col in df_base.columns
+        },
+    }
+
+
+def _matching_keys(index: dict, term: bytes) -> np.ndarray:
+    keys = index["keys"]
+    if len(term) < SEARCH_NGRAM:
+        # Termo curto demais para trigramas: varre só as chaves distintas
+        return np.flatnonzero(np.char.find(keys, term) >= 0)
+
+    candidates = None
+    for start in range(len(term) - SEARCH_NGRAM + 1):
+        code = (term[start] << 16) | (term[start + 1] << 8) | term[start + 2]
+        pos = np.searchsorted(index["grams"], code)
+        if pos == len(index["grams"]) or index["grams"][pos] != code:
+            return np.empty(0, dtype=np.int64)
+        postings = index["gram_keys"][index["gram_offsets"][pos]:index["gram_offsets"][pos + 1]]
+        candidates = postings if candidates is None else np.intersect1d(candidates, postings, assume_unique=True)
+        if not len(candidates):
+            return candidates
+    # Trigramas presentes não garantem a substring contígua: confirma nos candidatos
+    return candidates[np.char.find(keys[candidates], term) >= 0]
+
+
+def search_positions(search_index: dict, term: str) -> np.ndarray:
+    """Posições (ordenadas) das linhas cujo NFID ou CNPJ contém `term`."""
+    hits = []
+    for index in search_index["columns"].values():
+        normalized = _normalize_search_term(term, index["kind"])
+        if not normalized:
+            continue
+        keys = _matching_keys(index, normalized.encode("utf-8"))
+        # Concatena as faixas [início, fim) de cada chave em key_rows sem laço Python
+        starts = index["key_offsets"][keys]
+        counts = index["key_offsets"][keys + 1] - starts
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        hits.append(index["key_rows"][np.repeat(starts, counts) + steps])
+    if not hits:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(hits))
+
+
+@st.cache_resource(ttl=3600, max_entries=4, show_spinner=False)
+def load_search_index(signature: tuple, _df_base: pd.DataFrame) -> dict:
+    """Índice do recorte, construído uma vez por assinatura (filtros + versão da base)."""
+    return build_search_index(_df_base)
+
+
 # --- 7. CARGA DE DADOS INICIAL ---
-df_view = load_view_data()
-if df_view.empty:
+# Opções e limites de data vêm das tabelas de dimensão (poucas linhas);
+# a view mensal é lida depois, já restrita ao período selecionado.
+dim_parceiros, dim_financiadores = load_sidebar_dimensions()
+if dim_parceiros.empty:
     st.error("Nenhum dado disponível na view `propostas_resumo_mensal`.")
     st.stop()
 
 
-min_competencia = df_view["competencia"].min()
-max_competencia = df_view["competencia"].max()
+min_competencia = dim_parceiros["primeira_competencia"].min()
+max_competencia = dim_parceiros["ultima_competencia"].max()
 min_date = min_competencia.date() if not pd.isna(min_competencia) else datetime.now().date() - timedelta(days=365)
 max_date = (max_competencia + pd.offsets.MonthEnd(0)).date() if not pd.isna(max_competencia) else datetime.now().date()
 
@@ -449,14 +1427,14 @@ if end_date.date() > max_date:
 # Caption do período agora fica na sidebar
 st.sidebar.caption(f"Período selecionado: 📆 {start_date.strftime('%d/%m/%Y')} — {end_date.strftime('%d/%m/%Y')}")
 
-parceiros_options = sorted(df_view["parceiro"].dropna().unique().tolist())
+parceiros_options = dimension_options(dim_parceiros)
 selected_parceiros = st.sidebar.multiselect(
     "👥 Parceiros",
     options=parceiros_options,
     default=parceiros_options,
 )
 
-financiadores_options = sorted(df_view["razao_social_financiador"].dropna().unique().tolist())
+financiadores_options = dimension_options(dim_financiadores)
 selected_financiadores = st.sidebar.multiselect(
     "🏦 Financiadores",
     options=financiadores_options,
@@ -464,31 +1442,25 @@ selected_financiadores = st.sidebar.multiselect(
 )
 
 # --- 10. FILTRAGEM E CARGA DE DADOS SECUNDÁRIA ---
-df_filtered = df_view.copy()
 start_month = datetime(start_date.year, start_date.month, 1)
 end_month = datetime(end_date.year, end_date.month, 1)
-df_filtered = df_filtered[
-    (df_filtered["competencia"] >= pd.Timestamp(start_month))
-    & (df_filtered["competencia"] <= pd.Timestamp(end_month))
-]
+df_filtered = load_view_data(start_month, end_month)
 
-if selected_parceiros:
+if selected_parceiros and not df_filtered.empty:
     df_filtered = df_filtered[df_filtered["parceiro"].isin(selected_parceiros)]
-if selected_financiadores:
+if selected_financiadores and not df_filtered.empty:
     df_filtered = df_filtered[df_filtered["razao_social_financiador"].isin(selected_financiadores)]
 
 if df_filtered.empty:
-    scope_df = df_view.copy()
-    if selected_parceiros:
-        scope_df = scope_df[scope_df["parceiro"].isin(selected_parceiros)]
-    if selected_financiadores:
-        scope_df = scope_df[scope_df["razao_social_financiador"].isin(selected_financiadores)]
+    # Seleção completa equivale a "todos": evita enviar a lista inteira na URL.
+    scope_parceiros = () if set(selected_parceiros) >= set(parceiros_options) else tuple(selected_parceiros)
+    scope_financiadores = () if set(selected_financiadores) >= set(financiadores_options) else tuple(selected_financiadores)
+    scope_period = load_scope_period(scope_parceiros, scope_financiadores)
 
-    if scope_df.empty:
+    if scope_period is None:
         st.warning("Nenhum dado disponível para os parceiros/financiadores selecionados em qualquer período.")
     else:
-        min_scope = scope_df["competencia"].min()
-        max_scope = scope_df["competencia"].max()
+        min_scope, max_scope = scope_period
         periodo_disp = f"{min_scope.strftime('%m/%Y')} — {max_scope.strftime('%m/%Y')}" if not pd.isna(min_scope) and not pd.isna(max_scope) else "período desconhecido"
         st.warning(
             f"Sem dados no intervalo escolhido. Este recorte possui informações apenas entre {periodo_disp}."
@@ -501,649 +1473,762 @@ if df_base.empty:
     st.warning("Não foi possível carregar as operações detalhadas para análises de clientes e explorador.")
 
 df_base_filtered = df_base
+filtros_globais = (start_date, end_date, tuple(selected_parceiros), tuple(selected_financiadores))
+# Assinatura do recorte para o cache das abas: muda com os filtros ou quando
+# o cache local de operações ganha uma nova versão.
+assinatura_recorte = (*filtros_globais, sync_base_cache())
 
 
-# --- 11. LAYOUT DAS ABAS ---
-overview_tab, clients_tab, funding_tab, explorer_tab = st.tabs(
-    ["🚀 Overview Estratégico", "👥 Análise de Clientes", "🏦 Análise de Funding", "🔍 Explorador Operacional"]
-)
+def tab_aggregate(function_name: str) -> pd.DataFrame:
+    """Agregação local de uma aba, calculada uma vez por assinatura do recorte."""
+    return cached_tab_aggregate(function_name, assinatura_recorte, df_base_filtered)
 
 
-with overview_tab:
-    st.subheader("Visão Executiva · Performance no Período")
+def dashboard_aggregate(function_name: str) -> pd.DataFrame:
+    """Agregação do recorte atual: RPC no Supabase, ou pandas sobre df_base como fallback."""
+    df_aggregate = load_rpc_aggregate(function_name, *filtros_globais)
+    if df_aggregate is None:
+        df_aggregate = tab_aggregate(function_name)
+    return df_aggregate
 
-    kpi_data = load_kpi_data()
-    ritmo_projetado = kpi_data.get("ritmo_projetado", 0)
-    dias_restantes_text = kpi_data.get("dias_restantes_mes", "N/A")
-    updated_at_raw = kpi_data.get("updated_at")
-    if isinstance(updated_at_raw, str) and updated_at_raw.endswith("Z"):
-        updated_at_raw = updated_at_raw.replace("Z", "+00:00")
-    try:
-        updated_at_display = (
-            datetime.fromisoformat(updated_at_raw).strftime("%d/%m/%Y %H:%M")
-            if updated_at_raw
-            else "N/A"
-        )
-    except Exception:
-        updated_at_display = "N/A"
 
-    dias_restantes_help = (
-        f"{dias_restantes_text} dias restantes no mês (dados Google Sheets). Atualizado em {updated_at_display} UTC"
-    )
+def distinct_counts() -> pd.Series:
+    """Grupos, sacados, fornecedores, financiadores e propostas distintos do recorte.
 
-    # KPIs da View Agregada (Rápidos)
-    volume_total = df_filtered["total_bruto_duplicata"].sum()
-    total_propostas = (
-        df_base_filtered["numero_proposta"].dropna().nunique() if not df_base_filtered.empty else 0
-    )
-    total_nfids = (
-        df_base_filtered["nfid"].dropna().nunique() if not df_base_filtered.empty else 0
-    )
-    total_duplicatas = len(df_base_filtered) if not df_base_filtered.empty else 0
-    grupos_ativos = (
-        df_base_filtered["grupo_economico"].dropna().nunique() if not df_base_filtered.empty else 0
-    )
-    
-    # KPIs da Tabela Base (Processamento Ponderado)
-    sacados_ativos = (
-        df_base_filtered["cnpj_comprador"].dropna().nunique() if not df_base_filtered.empty else None
-    )
-    fornecedores_ativos = (
-        df_base_filtered["cnpj_fornecedor"].dropna().nunique() if not df_base_filtered.empty else None
-    )
+    Vêm da união dos sketches hll do consolidado diário (RPC
+    `resumo_diario_distintos`; sacados, fornecedores e propostas são
+    estimativas); sem ela, de `clientes_resumo` e das propostas de df_base.
+    """
+    distintos = load_rpc_aggregate("resumo_diario_distintos", *filtros_globais)
+    if distintos is not None and not distintos.empty:
+        return distintos.iloc[0]
+    resumo = dashboard_aggregate("clientes_resumo").iloc[0].copy()
+    resumo["propostas"] = df_base_filtered["numero_proposta"].dropna().nunique() if not df_base_filtered.empty else 0
+    return resumo
 
-    # Otimização: KPIs de média agora usam a view agregada (mais rápido)
-    prazo_medio = weighted_average(
-        df_filtered.get("prazo_medio", pd.Series(dtype=float)),
-        df_filtered.get("total_bruto_duplicata", pd.Series(dtype=float)),
-    )
-    taxa_media = weighted_average(
-        df_filtered.get("taxa_efetiva_media", pd.Series(dtype=float)),
-        df_filtered.get("total_bruto_duplicata", pd.Series(dtype=float)),
-    )
 
-    # Renderização dos KPIs
-    col1, col2, col3, col4, col5 = st.columns(5)
-    col1.metric("Projeção (Ritmo) Mês", format_currency(ritmo_projetado), help=dias_restantes_help)
-    col2.metric("Volume Operado (VOP)", format_currency(volume_total))
-    col3.metric("Total de Propostas (Negócios)", format_integer(total_propostas))
-    col4.metric("Total de Notas Fiscais (NFIDs)", format_integer(total_nfids))
-    col5.metric("Total de Duplicatas (Linhas)", format_integer(total_duplicatas))
-
-    if not ritmo_projetado:
-        st.caption("ℹ️ Ritmo ainda não atualizado. Execute o ETL para puxar os valores da planilha de Ritmo.")
-
-    col6, col7, col8, col9, col10, col11 = st.columns(6)
-    col6.metric("Grupos Econômicos Ativos", format_integer(grupos_ativos))
-    col7.metric("Sacados Ativos (CNPJs)", format_integer(sacados_ativos))
-    col8.metric("Fornecedores Ativos (CNPJs)", format_integer(fornecedores_ativos))
-    col9.metric("Prazo Médio Ponderado", format_duration(prazo_medio))
-    col10.metric("Taxa Efetiva Média", format_percent(taxa_media))
-    col11.metric(
-        "Dias Restantes no Mês",
-        dias_restantes_text,
-        help=f"Atualizado em {updated_at_display} UTC",
-    )
+def period_weighted_means(resumo_diario: pd.DataFrame | None) -> tuple[float | None, float | None]:
+    """Taxa efetiva e prazo médios do recorte, ponderados pelo valor bruto.
 
-    st.markdown("### Evolução do Volume Operado (VOP)")
-    volume_timeline = (
-        df_filtered.groupby("competencia", as_index=False)["total_bruto_duplicata"].sum().sort_values("competencia")
-    )
-    fig_volume = px.area(
-        volume_timeline,
-        x="competencia",
-        y="total_bruto_duplicata",
-        labels={"total_bruto_duplicata": "Volume Operado (R$)", "competencia": "Competência"},
-        color_discrete_sequence=[BRAND_COLOR_SCALE_PRIMARY[0]],
-    )
-    fig_volume.update_layout(showlegend=False, title_text="VOP Mensal", title_x=0.1)
-    st.plotly_chart(fig_volume, use_container_width=True)
-
-    # --- IMPLEMENTAÇÃO DA SOLUÇÃO (ABRIR A CAIXA-PRETA) ---
-    with st.expander("Ver dados absolutos da Série Histórica (Valores Absolutos por Mês)"):
-        st.caption("Estes são os 'valores absolutos' pré-calculados que alimentam o gráfico acima.")
-        dados_grafico = volume_timeline.copy()
-        dados_grafico["competencia"] = dados_grafico["competencia"].dt.strftime("%Y-%m (%b)")
-        dados_grafico["total_bruto_duplicata"] = dados_grafico["total_bruto_duplicata"].map(format_currency)
-        st.dataframe(
-            dados_grafico.rename(
-                columns={
-                    "competencia": "Competência",
-                    "total_bruto_duplicata": "Volume Absoluto (R$)",
-                }
-            ),
-            use_container_width=True,
-            hide_index=True,
+    Cobrem todas as operações do recorte, inclusive as sem financiador ou sem
+    parceiro. Vêm dos componentes do consolidado diário; sem ele, da view mensal.
+    """
+    if resumo_diario is not None:
+        return (
+            weighted_average_from_sums(resumo_diario["taxa_x_bruto"], resumo_diario["peso_taxa"]),
+            weighted_average_from_sums(resumo_diario["prazo_x_bruto"], resumo_diario["peso_prazo"]),
+        )
+    if "peso_taxa" in df_filtered.columns:
+        return (
+            weighted_average_from_sums(df_filtered["taxa_x_bruto"], df_filtered["peso_taxa"]),
+            weighted_average_from_sums(df_filtered["prazo_x_bruto"], df_filtered["peso_prazo"]),
         )
-    # --- FIM DA IMPLEMENTAÇÃO ---
+    # View mensal sem os componentes ponderados: repondera as médias de cada linha
+    volume = df_filtered.get("total_bruto_duplicata", pd.Series(dtype=float))
+    return (
+        weighted_average(df_filtered.get("taxa_efetiva_media", pd.Series(dtype=float)), volume),
+        weighted_average(df_filtered.get("prazo_medio", pd.Series(dtype=float)), volume),
+    )
 
-    st.markdown("### Visão Geral por Categoria")
-    col_a, col_b = st.columns(2)
 
-    if not df_base_filtered.empty:
-        top_grupos = (
-            df_base_filtered.groupby("grupo_economico", dropna=True)["valor_bruto_duplicata"]
-            .sum()
-            .nlargest(5)
-            .reset_index()
-        )
-        if not top_grupos.empty:
-            fig_grupos = px.bar(
-                top_grupos,
-                x="valor_bruto_duplicata",
-                y="grupo_economico",
-                orientation="h",
-                labels={"valor_bruto_duplicata": "Volume (R$)", "grupo_economico": "Grupo"},
-                title="Top 5 Grupos Econômicos por Volume",
-                color="valor_bruto_duplicata",
-                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
-            )
-            fig_grupos.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
-            col_a.plotly_chart(fig_grupos, use_container_width=True)
-        else:
-            col_a.info("Sem volume registrado para grupos econômicos no recorte atual.")
+# --- 10.1 EXPLORADOR OPERACIONAL (FRAGMENTO) ---
+EXPLORER_DISPLAY_COLUMNS = [col for col in EXPLORER_COLUMNS if col != "id"]
 
-        top_parceiros = (
-            df_base_filtered.groupby("parceiro", dropna=True)["valor_bruto_duplicata"]
-            .sum()
-            .nlargest(5)
-            .reset_index()
-        )
-        if not top_parceiros.empty:
-            fig_parceiros = px.bar(
-                top_parceiros,
-                x="valor_bruto_duplicata",
-                y="parceiro",
-                orientation="h",
-                labels={"valor_bruto_duplicata": "Volume (R$)", "parceiro": "Parceiro"},
-                title="Top 5 Parceiros por Volume",
-                color="valor_bruto_duplicata",
-                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
-            )
-            fig_parceiros.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
-            col_b.plotly_chart(fig_parceiros, use_container_width=True)
-        else:
-            col_b.info("Sem parceiros com volume no período selecionado.")
-    else:
-        col_a.info("Não foi possível carregar dados operacionais para consultar grupos.")
-        col_b.info("Não foi possível carregar dados operacionais para consultar parceiros.")
 
-    col_c, col_d = st.columns(2)
+def _explorer_local_page(df_base: pd.DataFrame, signature: tuple, filtros: tuple, cursor: int | None):
+    """Fallback sem as RPCs: mesma página e totais, filtrando o recorte em memória.
 
-    if not df_base_filtered.empty:
-        top_financiadores = (
-            df_base_filtered.groupby("razao_social_financiador", dropna=True)["valor_bruto_duplicata"]
-            .sum()
-            .nlargest(5)
-            .reset_index()
-        )
-        if not top_financiadores.empty:
-            fig_financiadores = px.bar(
-                top_financiadores,
-                x="valor_bruto_duplicata",
-                y="razao_social_financiador",
-                orientation="h",
-                labels={"valor_bruto_duplicata": "Volume (R$)", "razao_social_financiador": "Financiador"},
-                title="Top 5 Financiadores por Volume",
-                color="valor_bruto_duplicata",
-                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
-            )
-            fig_financiadores.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
-            col_c.plotly_chart(fig_financiadores, use_container_width=True)
-        else:
-            col_c.info("Sem financiadores com volume no recorte atual.")
+    O cursor é a posição na ordem decrescente de data (o recorte vem ordenado
+    por data crescente, então basta percorrer as posições de trás para frente).
+    """
+    op_start, op_end, _, _, pagamentos, propostas, busca = filtros
+    datas = df_base["data_operacao"]
+    mask = (datas >= pd.Timestamp(op_start)) & (datas < pd.Timestamp(op_end) + pd.Timedelta(days=1))
+    if pagamentos:
+        mask &= df_base["status_pagamento"].isin(pagamentos)
+    if propostas:
+        mask &= df_base["status_proposta"].isin(propostas)
+    if busca:
+        found = np.zeros(len(df_base), dtype=bool)
+        found[search_positions(load_search_index(signature, df_base), busca)] = True
+        mask &= found
+
+    matched = df_base[mask]
+    totals = {
+        "volume_bruto": matched["valor_bruto_duplicata"].sum(),
+        "linhas": len(matched),
+        "propostas": matched["numero_proposta"].nunique(),
+    }
+    offset = cursor or 0
+    page = matched.iloc[::-1].iloc[offset:offset + EXPLORER_PAGE_SIZE]
+    next_cursor = offset + EXPLORER_PAGE_SIZE if offset + EXPLORER_PAGE_SIZE < len(matched) else None
+    return totals, page, next_cursor
+
+
+def _explorer_move(pages: dict, cursor):
+    """Callback da navegação: `cursor` avança uma página; None volta uma."""
+    if cursor is None:
+        if len(pages["cursores"]) > 1:
+            pages["cursores"].pop()
     else:
-        col_c.info("Não foi possível carregar dados operacionais para consultar financiadores.")
+        pages["cursores"].append(cursor)
+
+
+EXPORT_MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+# O download do Streamlit guarda o arquivo inteiro em memória (media store);
+# acima deste limite a exportação fica com scripts/export_propostas.py
+EXPORT_MAX_ROWS = int(os.getenv("DASHBOARD_EXPORT_MAX_ROWS", "50000"))
+
+
+def _export_bytes(filtros: tuple, export_format: str) -> bytes:
+    """Exporta o recorte do Explorador, lote a lote, até EXPORT_MAX_ROWS linhas."""
+    with io.BytesIO() as buffer:
+        export_propostas(supabase, _explorer_params(filtros), buffer, export_format, max_rows=EXPORT_MAX_ROWS)
+        return buffer.getvalue()
+
+
+def _export_command(filtros: tuple, export_format: str) -> str:
+    """Linha de comando de scripts/export_propostas.py para o mesmo recorte."""
+    op_start, op_end, parceiros, financiadores, pagamentos, propostas, busca = filtros
+    args = ["python3", "scripts/export_propostas.py", "--inicio", op_start.isoformat(), "--fim", op_end.isoformat()]
+    for flag, values in (
+        ("--parceiro", parceiros),
+        ("--financiador", financiadores),
+        ("--status-pagamento", pagamentos),
+        ("--status-proposta", propostas),
+    ):
+        for value in values:
+            args += [flag, value]
+    if busca:
+        args += ["--busca", busca]
+    args += ["--formato", export_format]
+    return shlex.join(args)
+
+
+@st.fragment
+def render_explorer(df_base_filtered: pd.DataFrame, filtros_globais: tuple, signature: tuple, start_month, end_month):
+    """Filtros, totais e tabela paginada do Explorador.
+
+    Como fragmento, a busca, o período local, os status e a paginação
+    reexecutam só esta função; KPIs, gráficos e as demais abas não são
+    recalculados. Com as RPCs de `supabase/explorer_rpc.sql`, filtros, totais e
+    páginas são resolvidos no banco; sem elas, sobre o recorte em memória.
+    """
+    start_date, end_date, selected_parceiros, selected_financiadores = filtros_globais
+    st.subheader("Explorador Operacional · Pesquisa de Operações")
+    st.caption(
+        "Filtra diretamente a tabela base `propostas`. Os filtros globais (período, parceiro, financiador) já estão aplicados."
+    )
 
-    receita_series = (
-        df_filtered.groupby("competencia", as_index=False)["total_receita_cashforce"].sum().sort_values("competencia")
+    hoje = end_date
+    default_explorer_start = max(start_date, hoje - timedelta(days=30))
+
+    # --- FILTROS LOCAIS DA ABA ---
+    col1, col2 = st.columns([2, 1])
+    # Busca com debounce: aplica após 300ms sem digitação, sem precisar de Enter
+    search_term = col1.text_input(
+        "Pesquisa rápida (NFID, CNPJ Comprador/Fornecedor)",
+        placeholder="Busque por NFID, CNPJ...",
+        key="explorer_search",
+        type="search",
+        live="300ms",
     )
-    fig_receita = px.line(
-        receita_series,
-        x="competencia",
-        y="total_receita_cashforce",
-        labels={"total_receita_cashforce": "Receita (R$)", "competencia": "Competência"},
-        title="Receita Cashforce · Evolução Mensal",
-        markers=True,
-        color_discrete_sequence=[BRAND_COLOR_SCALE_PRIMARY[1]],
+    # Filtro de data local, limitado pelo filtro global
+    date_filter = col2.date_input(
+        "Refinar período (dentro do filtro global)",
+        value=(default_explorer_start, end_date),
+        min_value=start_date,
+        max_value=end_date,
+        key="explorer_date_range"
     )
-    col_d.plotly_chart(fig_receita, use_container_width=True)
 
-
-with clients_tab:
-    sacados_tab, fornecedores_tab, parceiros_tab = st.tabs(
-        ["🏢 Sacados (Compradores)", "🚚 Fornecedores (Cedentes)", "🤝 Parceiros (Canais)"]
+    if isinstance(date_filter, tuple) and len(date_filter) == 2:
+        op_start, op_end = date_filter
+    else:
+        # Seleção em andamento (só a data inicial escolhida)
+        op_start = date_filter[0] if isinstance(date_filter, tuple) and date_filter else date_filter  # type: ignore[assignment]
+        op_end = end_date.date()
+
+    dim_status = load_dimension("dim_status")
+    if dim_status is not None:
+        status_pagamento_opts = dimension_options(
+            dim_status[dim_status["campo"] == "status_pagamento"], start_month, end_month
+        )
+        status_proposta_opts = dimension_options(
+            dim_status[dim_status["campo"] == "status_proposta"], start_month, end_month
+        )
+    elif not df_base_filtered.empty:
+        status_pagamento_opts = sorted(df_base_filtered["status_pagamento"].dropna().unique().tolist())
+        status_proposta_opts = sorted(df_base_filtered["status_proposta"].dropna().unique().tolist())
+    else:
+        status_pagamento_opts = status_proposta_opts = []
+
+    col3, col4 = st.columns(2)
+    selected_pagamentos = col3.multiselect("Status de Pagamento", status_pagamento_opts, default=status_pagamento_opts)
+    selected_propostas = col4.multiselect("Status de Proposta", status_proposta_opts, default=status_proposta_opts)
+
+    filtros = (
+        op_start,
+        op_end,
+        selected_parceiros,
+        selected_financiadores,
+        tuple(selected_pagamentos),
+        tuple(selected_propostas),
+        (search_term or "").strip(),
     )
 
-    with sacados_tab:
-        st.subheader("Sacados · Engajamento dos Compradores")
+    # --- PAGINAÇÃO ---
+    # Pilha de cursores das páginas visitadas; filtros novos voltam à primeira página.
+    pages = st.session_state.setdefault("explorer_pages", {"filtros": None, "cursores": [None]})
+    if pages["filtros"] != filtros:
+        pages["filtros"] = filtros
+        pages["cursores"] = [None]
+    cursor = pages["cursores"][-1]
+
+    totals = load_explorer_totals(filtros)
+    page = load_explorer_page(filtros, cursor) if totals is not None else None
+    server_side = page is not None
+    if server_side:
+        next_cursor = None
+        if len(page) == EXPLORER_PAGE_SIZE:
+            next_cursor = (page["data_operacao"].iloc[-1].date().isoformat(), int(page["id"].iloc[-1]))
+    elif df_base_filtered.empty:
+        st.info("Não foi possível carregar dados operacionais. Ajuste os filtros principais.")
+        return
+    else:
+        totals, page, next_cursor = _explorer_local_page(df_base_filtered, signature, filtros, cursor)
 
-        grupos_total = df_base_filtered["grupo_economico"].nunique(dropna=True)
-        sacados_total = df_base_filtered["cnpj_comprador"].nunique(dropna=True)
+    # --- KPIS DE VALIDAÇÃO (PARA O CEO) ---
+    st.markdown("### Totais de Validação (Dados Brutos Filtrados)")
+    st.caption(
+        f"Estes são os totais brutos de todos os registros filtrados; a tabela abaixo mostra {EXPLORER_PAGE_SIZE} linhas por página."
+    )
 
-        col1, col2 = st.columns(2)
-        col1.metric("Grupos Econômicos Ativos", format_integer(grupos_total))
-        col2.metric("Sacados Ativos (CNPJs)", format_integer(sacados_total))
+    val_col1, val_col2, val_col3 = st.columns(3)
+    val_col1.metric("Volume Bruto (Filtrado)", format_currency(totals["volume_bruto"]))
+    val_col2.metric("Total de Linhas (Duplicatas)", format_integer(totals["linhas"]))
+    val_col3.metric("Total de Propostas Únicas", format_integer(totals["propostas"]))
+
+    st.markdown("---")
+
+    # --- EXIBIÇÃO DA TABELA ---
+    page_number = len(pages["cursores"])
+    first_row = (page_number - 1) * EXPLORER_PAGE_SIZE
+    nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+    nav_prev.button(
+        "◀ Anterior",
+        key="explorer_prev",
+        disabled=page_number == 1,
+        on_click=_explorer_move,
+        args=(pages, None),
+        use_container_width=True,
+    )
+    nav_info.caption(
+        f"Página {page_number} · linhas {format_integer(first_row + min(len(page), 1))}–"
+        f"{format_integer(first_row + len(page))} de {format_integer(totals['linhas'])}"
+    )
+    nav_next.button(
+        "Próxima ▶",
+        key="explorer_next",
+        disabled=next_cursor is None,
+        on_click=_explorer_move,
+        args=(pages, next_cursor),
+        use_container_width=True,
+    )
 
-        st.markdown("### Crescimento de Novos Sacados (Primeira Operação)")
-        if not df_base_filtered.empty:
-            sacados_first_seen = (
-                df_base_filtered.dropna(subset=["cnpj_comprador", "data_operacao"])
-                .sort_values("data_operacao")
-                .groupby("cnpj_comprador")["data_operacao"]
-                .min()
-            )
+    display_cols_exist = [col for col in EXPLORER_DISPLAY_COLUMNS if col in page.columns]
+    explorer_df_display = page[display_cols_exist].copy()
+
+    st.dataframe(
+        explorer_df_display,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "data_operacao": date_column("data_operacao"),
+            "valor_bruto_duplicata": currency_column("valor_bruto_duplicata (R$)"),
+        },
+    )
 
-            if sacados_first_seen.empty:
-                st.info("Nenhum sacado novo identificado no período selecionado.")
+    # --- EXPORTAÇÃO ---
+    with st.expander("⬇️ Exportar todas as linhas filtradas"):
+        if not server_side:
+            st.caption("A exportação usa a consulta server-side do Explorador (`supabase/explorer_rpc.sql`).")
+        else:
+            formats = list(EXPORT_MIME_TYPES) if pq is not None else ["csv"]
+            export_format = st.radio("Formato", formats, horizontal=True, key="explorer_export_format")
+            if totals["linhas"] > EXPORT_MAX_ROWS:
+                st.caption(
+                    f"O recorte tem {format_integer(totals['linhas'])} linhas, acima do limite de "
+                    f"{format_integer(EXPORT_MAX_ROWS)} do download pelo navegador. Exporte pela linha de comando:"
+                )
+                st.code(_export_command(filtros, export_format), language="bash")
             else:
-                novos_sacados = (
-                    sacados_first_seen.dt.to_period("M")
-                    .value_counts()
-                    .sort_index()
-                    .rename_axis("competencia_period")
-                    .to_frame("novos_sacados")
+                st.download_button(
+                    f"Baixar {format_integer(totals['linhas'])} linhas ({export_format.upper()})",
+                    # Gerado só no clique, em outra thread, lote a lote
+                    data=lambda: _export_bytes(filtros, export_format),
+                    file_name=f"propostas_{op_start.isoformat()}_{op_end.isoformat()}.{export_format}",
+                    mime=EXPORT_MIME_TYPES[export_format],
+                    on_click="ignore",
+                    key="explorer_export",
                 )
 
-                period_range = pd.period_range(
-                    start=pd.Period(start_date, freq="M"),
-                    end=pd.Period(end_date, freq="M"),
-                )
 
-                novos_sacados = (
-                    novos_sacados.reindex(period_range, fill_value=0)
-                    .reset_index()
-                    .rename(columns={"index": "competencia_period"})
-                )
-                novos_sacados["competencia"] = novos_sacados["competencia_period"].dt.to_timestamp()
+# --- 11. LAYOUT DAS ABAS ---
+# Abas com estado (`on_change="rerun"`): só o bloco da aba aberta executa,
+# então cada interação paga apenas pelos gráficos e agregações visíveis.
+overview_tab, clients_tab, funding_tab, explorer_tab = st.tabs(
+    ["🚀 Overview Estratégico", "👥 Análise de Clientes", "🏦 Análise de Funding", "🔍 Explorador Operacional"],
+    key="aba_principal",
+    on_change="rerun",
+)
 
-                if novos_sacados["novos_sacados"].sum() == 0:
-                    st.info("Nenhum sacado novo identificado no período selecionado.")
-                else:
-                    fig_novos = px.bar(
-                        novos_sacados,
-                        x="competencia",
-                        y="novos_sacados",
-                        labels={"novos_sacados": "Novos Sacados", "competencia": "Competência"},
-                        color="novos_sacados",
-                        color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
-                    )
-                    fig_novos.update_layout(coloraxis_showscale=False)
-                    st.plotly_chart(fig_novos, use_container_width=True)
-        else:
-            st.info("Sem dados operacionais para calcular novos sacados.")
-
-        st.markdown("### Ranking de Grupos Econômicos")
-        ranking_grupos = (
-            df_base_filtered.dropna(subset=["grupo_economico"])
-            .groupby("grupo_economico")
-            .agg(
-                volume=("valor_bruto_duplicata", "sum"),
-                duplicatas=("nfid", "count"),
-                propostas=("numero_proposta", "nunique"),
+
+if overview_tab.open:
+    with overview_tab:
+        st.subheader("Visão Executiva · Performance no Período")
+
+        kpi_data = load_kpi_data()
+        ritmo_projetado = kpi_data.get("ritmo_projetado", 0)
+        dias_restantes_text = kpi_data.get("dias_restantes_mes", "N/A")
+        updated_at_raw = kpi_data.get("updated_at")
+        if isinstance(updated_at_raw, str) and updated_at_raw.endswith("Z"):
+            updated_at_raw = updated_at_raw.replace("Z", "+00:00")
+        try:
+            updated_at_display = (
+                datetime.fromisoformat(updated_at_raw).strftime("%d/%m/%Y %H:%M")
+                if updated_at_raw
+                else "N/A"
             )
-            .reset_index()
+        except Exception:
+            updated_at_display = "N/A"
+
+        dias_restantes_help = (
+            f"{dias_restantes_text} dias restantes no mês (dados Google Sheets). Atualizado em {updated_at_display} UTC"
         )
-        if not ranking_grupos.empty:
-            ranking_grupos["ticket_medio"] = ranking_grupos["volume"] / ranking_grupos["propostas"].replace(0, np.nan)
-            ranking_grupos = ranking_grupos.sort_values("volume", ascending=False)
-            st.dataframe(
-                ranking_grupos.assign(
-                    volume=ranking_grupos["volume"].map(format_currency),
-                    ticket_medio=ranking_grupos["ticket_medio"].map(format_currency),
-                ).rename(columns={"duplicatas": "Duplicatas", "propostas": "Propostas"}),
-                use_container_width=True,
-            )
+
+        # KPIs do consolidado diário (intervalo exato de datas); sem a
+        # tabela, volume e médias vêm da view mensal (componentes ponderados)
+        resumo_diario = load_daily_summary(*filtros_globais)
+        total_nfids = (
+            df_base_filtered["nfid"].dropna().nunique() if not df_base_filtered.empty else 0
+        )
+        # Contagens distintas do consolidado diário (ou de clientes_resumo)
+        resumo_clientes = distinct_counts()
+        total_propostas = resumo_clientes["propostas"]
+        grupos_ativos = resumo_clientes["grupos"]
+        sacados_ativos = resumo_clientes["sacados"]
+        fornecedores_ativos = resumo_clientes["fornecedores"]
+
+        if resumo_diario is not None:
+            volume_total = resumo_diario["total_bruto_duplicata"].sum()
+            total_duplicatas = int(resumo_diario["quantidade_operacoes"].sum())
         else:
-            st.info("Nenhum grupo econômico encontrado.")
-
-        st.markdown("### Health Check · Última Operação por Grupo")
-        health_check = (
-            df_base_filtered.dropna(subset=["grupo_economico"])
-            .groupby("grupo_economico")["data_operacao"]
-            .max()
-            .reset_index()
-            .rename(columns={"data_operacao": "ultima_operacao"})
+            volume_total = df_filtered["total_bruto_duplicata"].sum()
+            total_duplicatas = len(df_base_filtered) if not df_base_filtered.empty else 0
+        taxa_media, prazo_medio = period_weighted_means(resumo_diario)
+
+        # Renderização dos KPIs
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("Projeção (Ritmo) Mês", format_currency(ritmo_projetado), help=dias_restantes_help)
+        col2.metric("Volume Operado (VOP)", format_currency(volume_total))
+        col3.metric("Total de Propostas (Negócios)", format_integer(total_propostas))
+        col4.metric("Total de Notas Fiscais (NFIDs)", format_integer(total_nfids))
+        col5.metric("Total de Duplicatas (Linhas)", format_integer(total_duplicatas))
+
+        if not ritmo_projetado:
+            st.caption("ℹ️ Ritmo ainda não atualizado. Execute o ETL para puxar os valores da planilha de Ritmo.")
+
+        col6, col7, col8, col9, col10, col11 = st.columns(6)
+        col6.metric("Grupos Econômicos Ativos", format_integer(grupos_ativos))
+        col7.metric("Sacados Ativos (CNPJs)", format_integer(sacados_ativos))
+        col8.metric("Fornecedores Ativos (CNPJs)", format_integer(fornecedores_ativos))
+        col9.metric("Prazo Médio Ponderado", format_duration(prazo_medio))
+        col10.metric("Taxa Efetiva Média", format_percent(taxa_media))
+        col11.metric(
+            "Dias Restantes no Mês",
+            dias_restantes_text,
+            help=f"Atualizado em {updated_at_display} UTC",
         )
-        if not health_check.empty:
-            health_check["dias_sem_operar"] = (
-                pd.Timestamp(datetime.now().date()) - health_check["ultima_operacao"]
-            ).dt.days
-            health_display = health_check.sort_values("ultima_operacao", ascending=False).copy()
-            health_display["ultima_operacao"] = health_display["ultima_operacao"].dt.strftime("%d/%m/%Y")
-
-            def color_health(dias: float):
-                if pd.isna(dias):
-                    return ""
-                if dias > 90:
-                    return "background-color: rgba(255, 100, 100, 0.25)"  # Risco
-                if dias > 30:
-                    return "background-color: rgba(255, 240, 100, 0.25)"  # Atenção
-                return "background-color: rgba(100, 255, 100, 0.2)"  # Saudável
 
+        st.markdown("### Evolução do Volume Operado (VOP)")
+        volume_timeline = (
+            df_filtered.groupby("competencia", as_index=False)["total_bruto_duplicata"].sum().sort_values("competencia")
+        )
+        fig_volume = px.area(
+            volume_timeline,
+            x="competencia",
+            y="total_bruto_duplicata",
+            labels={"total_bruto_duplicata": "Volume Operado (R$)", "competencia": "Competência"},
+            color_discrete_sequence=[BRAND_COLOR_SCALE_PRIMARY[0]],
+        )
+        fig_volume.update_layout(showlegend=False, title_text="VOP Mensal", title_x=0.1)
+        st.plotly_chart(fig_volume, use_container_width=True)
+
+        # --- IMPLEMENTAÇÃO DA SOLUÇÃO (ABRIR A CAIXA-PRETA) ---
+        with st.expander("Ver dados absolutos da Série Histórica (Valores Absolutos por Mês)"):
+            st.caption("Estes são os 'valores absolutos' pré-calculados que alimentam o gráfico acima.")
+            dados_grafico = volume_timeline.copy()
+            dados_grafico["competencia"] = dados_grafico["competencia"].dt.strftime("%Y-%m (%b)")
             st.dataframe(
-                health_display.style.applymap(color_health, subset=["dias_sem_operar"]),
+                dados_grafico.rename(
+                    columns={
+                        "competencia": "Competência",
+                        "total_bruto_duplicata": "Volume Absoluto (R$)",
+                    }
+                ),
                 use_container_width=True,
+                hide_index=True,
+                column_config={"Volume Absoluto (R$)": currency_column("Volume Absoluto (R$)")},
             )
-        else:
-            st.info("Ainda não há histórico para calcular último engajamento.")
-
-    with fornecedores_tab:
-        st.subheader("Fornecedores · Cobertura da Base Cedente")
-
-        fornecedores_total = df_base_filtered["cnpj_fornecedor"].nunique(dropna=True)
-        st.metric("Fornecedores Ativos (CNPJs)", format_integer(fornecedores_total))
-
-        st.markdown("### Top 10 Fornecedores por Volume")
-        ranking_fornecedores = (
-            df_base_filtered.dropna(subset=["cnpj_fornecedor"])
-            .groupby(["cnpj_fornecedor", "razao_social_fornecedor"])
-            .agg(volume=("valor_bruto_duplicata", "sum"), duplicatas=("nfid", "count"))
-            .reset_index()
-            .sort_values("volume", ascending=False)
-            .head(10)
-        )
-        if not ranking_fornecedores.empty:
-            fig_fornecedores = px.bar(
-                ranking_fornecedores,
-                x="volume",
-                y="razao_social_fornecedor",
-                orientation="h",
-                labels={"volume": "Volume (R$)", "razao_social_fornecedor": "Fornecedor"},
-                color="volume",
-                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
-            )
-            fig_fornecedores.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig_fornecedores, use_container_width=True)
-        else:
-            st.info("Sem fornecedores cadastrados para o recorte atual.")
-
-        st.markdown("### Fornecedores por Grupo Econômico")
-        fornecedores_por_grupo = (
-            df_base_filtered.dropna(subset=["grupo_economico"])
-            .groupby("grupo_economico")["cnpj_fornecedor"]
-            .nunique()
-            .reset_index(name="fornecedores_ativos")
-            .sort_values("fornecedores_ativos", ascending=False)
-        )
-        if not fornecedores_por_grupo.empty:
-            st.dataframe(fornecedores_por_grupo, use_container_width=True)
-        else:
-            st.info("Não há combinação de fornecedor por grupo para exibir.")
-
-    with parceiros_tab:
-        st.subheader("Performance por Parceiro (Canal)")
+        # --- FIM DA IMPLEMENTAÇÃO ---
 
-        if df_base_filtered.empty:
-            st.info("Não foi possível carregar dados operacionais. Ajuste os filtros principais.")
-        else:
-            st.markdown("### Tabela de Performance por Parceiro")
-            st.caption("Visão agregada por Parceiro, recriando a tabela principal do relatório anterior.")
+        st.markdown("### Visão Geral por Categoria")
+        col_a, col_b = st.columns(2)
 
-            parceiros_com_dados = df_base_filtered.dropna(subset=["parceiro"])
-            if parceiros_com_dados.empty:
-                st.info("Nenhum parceiro com operações no recorte selecionado.")
+        if not df_base_filtered.empty:
+            top_grupos = tab_aggregate("top_grupos")
+            if not top_grupos.empty:
+                fig_grupos = px.bar(
+                    top_grupos,
+                    x="valor_bruto_duplicata",
+                    y="grupo_economico",
+                    orientation="h",
+                    labels={"valor_bruto_duplicata": "Volume (R$)", "grupo_economico": "Grupo"},
+                    title="Top 5 Grupos Econômicos por Volume",
+                    color="valor_bruto_duplicata",
+                    color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+                )
+                fig_grupos.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
+                col_a.plotly_chart(fig_grupos, use_container_width=True)
             else:
-                df_parceiro_agg = (
-                    parceiros_com_dados.groupby("parceiro")
-                    .agg(
-                        volume_bruto=("valor_bruto_duplicata", "sum"),
-                        n_compradores=("cnpj_comprador", "nunique"),
-                        n_propostas=("numero_proposta", "nunique"),
-                        n_duplicatas=("nfid", "count"),
-                        prazo_medio_pond=(
-                            "prazo_medio_operacao",
-                            lambda x: weighted_average(
-                                x,
-                                df_base_filtered.loc[x.index, "valor_bruto_duplicata"],
-                            ),
-                        ),
-                        taxa_media_pond=(
-                            "taxa_efetiva_mes_percentual",
-                            lambda x: weighted_average(
-                                x,
-                                df_base_filtered.loc[x.index, "valor_bruto_duplicata"],
-                            ),
-                        ),
-                    )
-                    .reset_index()
+                col_a.info("Sem volume registrado para grupos econômicos no recorte atual.")
+
+            top_parceiros = tab_aggregate("top_parceiros")
+            if not top_parceiros.empty:
+                fig_parceiros = px.bar(
+                    top_parceiros,
+                    x="valor_bruto_duplicata",
+                    y="parceiro",
+                    orientation="h",
+                    labels={"valor_bruto_duplicata": "Volume (R$)", "parceiro": "Parceiro"},
+                    title="Top 5 Parceiros por Volume",
+                    color="valor_bruto_duplicata",
+                    color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
                 )
+                fig_parceiros.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
+                col_b.plotly_chart(fig_parceiros, use_container_width=True)
+            else:
+                col_b.info("Sem parceiros com volume no período selecionado.")
+        else:
+            col_a.info("Não foi possível carregar dados operacionais para consultar grupos.")
+            col_b.info("Não foi possível carregar dados operacionais para consultar parceiros.")
 
-                df_parceiro_agg["ticket_medio"] = df_parceiro_agg["volume_bruto"] / df_parceiro_agg["n_propostas"].replace(0, np.nan)
-                df_parceiro_agg = df_parceiro_agg.sort_values("volume_bruto", ascending=False)
-
-                df_parceiro_agg_display = df_parceiro_agg.rename(
-                    columns={
-                        "parceiro": "Parceiro",
-                        "volume_bruto": "Volume (VOP)",
-                        "n_compradores": "Nº Sacados",
-                        "n_propostas": "Nº Propostas",
-                        "n_duplicatas": "Nº Duplicatas",
-                        "ticket_medio": "Ticket Médio",
-                        "prazo_medio_pond": "Prazo Médio",
-                        "taxa_media_pond": "Taxa Média %",
-                    }
-                )
+        col_c, col_d = st.columns(2)
 
-                st.dataframe(
-                    df_parceiro_agg_display.assign(
-                        **{
-                            "Volume (VOP)": df_parceiro_agg_display["Volume (VOP)"].map(format_currency),
-                            "Ticket Médio": df_parceiro_agg_display["Ticket Médio"].map(format_currency),
-                            "Prazo Médio": df_parceiro_agg_display["Prazo Médio"].map(format_duration),
-                            "Taxa Média %": df_parceiro_agg_display["Taxa Média %"].map(format_percent),
-                        }
-                    ),
-                    use_container_width=True,
-                    hide_index=True,
+        if not df_base_filtered.empty:
+            top_financiadores = tab_aggregate("top_financiadores")
+            if not top_financiadores.empty:
+                fig_financiadores = px.bar(
+                    top_financiadores,
+                    x="valor_bruto_duplicata",
+                    y="razao_social_financiador",
+                    orientation="h",
+                    labels={"valor_bruto_duplicata": "Volume (R$)", "razao_social_financiador": "Financiador"},
+                    title="Top 5 Financiadores por Volume",
+                    color="valor_bruto_duplicata",
+                    color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
                 )
+                fig_financiadores.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
+                col_c.plotly_chart(fig_financiadores, use_container_width=True)
+            else:
+                col_c.info("Sem financiadores com volume no recorte atual.")
+        else:
+            col_c.info("Não foi possível carregar dados operacionais para consultar financiadores.")
 
-
-with funding_tab:
-    st.subheader("Funding · Performance dos Parceiros Financeiros")
-
-    financiadores_total = df_base_filtered["razao_social_financiador"].nunique(dropna=True)
-    taxa_media_fin = weighted_average(
-        df_base_filtered.get("taxa_efetiva_mes_percentual"),
-        df_base_filtered.get("valor_bruto_duplicata"),
-    )
-    prazo_ponderado = weighted_average(
-        df_base_filtered.get("prazo_medio_operacao"),
-        df_base_filtered.get("valor_bruto_duplicata"),
-    )
-
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Financiadores Ativos", format_integer(financiadores_total))
-    col2.metric("Taxa Efetiva Média (ponderada)", format_percent(taxa_media_fin))
-    col3.metric("Prazo Médio Ponderado", format_duration(prazo_ponderado))
-
-    st.markdown("### Volume por Financiador")
-    volume_financiador = (
-        df_base_filtered.groupby("razao_social_financiador", dropna=True)["valor_bruto_duplicata"]
-        .sum()
-        .sort_values(ascending=False)
-        .reset_index()
-    )
-    if not volume_financiador.empty:
-        fig_volume_fin = px.bar(
-            volume_financiador,
-            x="valor_bruto_duplicata",
-            y="razao_social_financiador",
-            orientation="h",
-            labels={"valor_bruto_duplicata": "Volume (R$)", "razao_social_financiador": "Financiador"},
-            color="valor_bruto_duplicata",
-            color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+        receita_series = (
+            df_filtered.groupby("competencia", as_index=False)["total_receita_cashforce"].sum().sort_values("competencia")
         )
-        fig_volume_fin.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
-        st.plotly_chart(fig_volume_fin, use_container_width=True)
-    else:
-        st.info("Sem financiadores para exibir.")
-
-    st.markdown("### Taxa Efetiva por Financiador")
-    taxa_financiador = (
-        df_base_filtered.dropna(subset=["razao_social_financiador", "taxa_efetiva_mes_percentual"])
-        .groupby("razao_social_financiador")
-        .apply(lambda x: weighted_average(x["taxa_efetiva_mes_percentual"], x["valor_bruto_duplicata"]))
-        .reset_index(name="taxa_media_ponderada")
-        .sort_values("taxa_media_ponderada", ascending=False)
-    )
-    if not taxa_financiador.empty:
-        fig_taxa = px.bar(
-            taxa_financiador,
-            x="taxa_media_ponderada",
-            y="razao_social_financiador",
-            orientation="h",
-            labels={"taxa_media_ponderada": "Taxa Efetiva Ponderada (%)", "razao_social_financiador": "Financiador"},
-            color="taxa_media_ponderada",
-            color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+        fig_receita = px.line(
+            receita_series,
+            x="competencia",
+            y="total_receita_cashforce",
+            labels={"total_receita_cashforce": "Receita (R$)", "competencia": "Competência"},
+            title="Receita Cashforce · Evolução Mensal",
+            markers=True,
+            color_discrete_sequence=[BRAND_COLOR_SCALE_PRIMARY[1]],
         )
-        fig_taxa.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
-        st.plotly_chart(fig_taxa, use_container_width=True)
-    else:
-        st.info("Não há dados de taxa efetiva para o recorte atual.")
-
-    st.markdown("### Prazo Médio por Financiador")
-    prazo_financiador = (
-        df_base_filtered.dropna(subset=["razao_social_financiador", "prazo_medio_operacao"])
-        .groupby("razao_social_financiador")
-        .apply(lambda x: weighted_average(x["prazo_medio_operacao"], x["valor_bruto_duplicata"]))
-        .reset_index(name="prazo_medio_ponderado")
-        .sort_values("prazo_medio_ponderado", ascending=False)
-    )
-    if not prazo_financiador.empty:
-        fig_prazo = px.bar(
-            prazo_financiador,
-            x="prazo_medio_ponderado",
-            y="razao_social_financiador",
-            orientation="h",
-            labels={"prazo_medio_ponderado": "Prazo Médio Ponderado (dias)", "razao_social_financiador": "Financiador"},
-            color="prazo_medio_ponderado",
-            color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+        col_d.plotly_chart(fig_receita, use_container_width=True)
+
+
+if clients_tab.open:
+    with clients_tab:
+        sacados_tab, fornecedores_tab, parceiros_tab = st.tabs(
+            ["🏢 Sacados (Compradores)", "🚚 Fornecedores (Cedentes)", "🤝 Parceiros (Canais)"],
+            key="aba_clientes",
+            on_change="rerun",
         )
-        fig_prazo.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
-        st.plotly_chart(fig_prazo, use_container_width=True)
-    else:
-        st.info("Sem dados de prazo médio para os financiadores selecionados.")
 
-    st.markdown("### Receita Cashforce · Evolução")
-    receita_funding = (
-        df_filtered.groupby("competencia", as_index=False)["total_receita_cashforce"]
-        .sum()
-        .sort_values("competencia")
-    )
-    fig_receita_fin = px.line(
-        receita_funding,
-        x="competencia",
-        y="total_receita_cashforce",
-        labels={"total_receita_cashforce": "Receita (R$)", "competencia": "Competência"},
-        markers=True,
-        color_discrete_sequence=[BRAND_COLOR_SCALE_PRIMARY[1]],
-    )
-    st.plotly_chart(fig_receita_fin, use_container_width=True)
+        if sacados_tab.open:
+            with sacados_tab:
+                st.subheader("Sacados · Engajamento dos Compradores")
+
+                resumo_clientes = distinct_counts()
+                grupos_total = resumo_clientes["grupos"]
+                sacados_total = resumo_clientes["sacados"]
+
+                col1, col2 = st.columns(2)
+                col1.metric("Grupos Econômicos Ativos", format_integer(grupos_total))
+                col2.metric("Sacados Ativos (CNPJs)", format_integer(sacados_total))
+
+                st.markdown("### Crescimento de Novos Sacados (Primeira Operação)")
+                if not df_base_filtered.empty:
+                    novos_sacados = tab_aggregate("novos_sacados")
+
+                    if novos_sacados.empty:
+                        st.info("Nenhum sacado novo identificado no período selecionado.")
+                    else:
+                        period_range = pd.period_range(
+                            start=pd.Period(start_date, freq="M"),
+                            end=pd.Period(end_date, freq="M"),
+                        )
+
+                        novos_sacados = (
+                            novos_sacados.reindex(period_range, fill_value=0)
+                            .reset_index()
+                            .rename(columns={"index": "competencia_period"})
+                        )
+                        novos_sacados["competencia"] = novos_sacados["competencia_period"].dt.to_timestamp()
+
+                        if novos_sacados["novos_sacados"].sum() == 0:
+                            st.info("Nenhum sacado novo identificado no período selecionado.")
+                        else:
+                            fig_novos = px.bar(
+                                novos_sacados,
+                                x="competencia",
+                                y="novos_sacados",
+                                labels={"novos_sacados": "Novos Sacados", "competencia": "Competência"},
+                                color="novos_sacados",
+                                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+                            )
+                            fig_novos.update_layout(coloraxis_showscale=False)
+                            st.plotly_chart(fig_novos, use_container_width=True)
+                else:
+                    st.info("Sem dados operacionais para calcular novos sacados.")
+
+                st.markdown("### Ranking de Grupos Econômicos")
+                ranking_grupos = dashboard_aggregate("ranking_grupos").drop(columns=["ultima_operacao"])
+                if not ranking_grupos.empty:
+                    ranking_grupos["ticket_medio"] = ranking_grupos["volume"] / ranking_grupos["propostas"].replace(0, np.nan)
+                    ranking_grupos = ranking_grupos.sort_values("volume", ascending=False)
+                    st.dataframe(
+                        ranking_grupos.rename(columns={"duplicatas": "Duplicatas", "propostas": "Propostas"}),
+                        use_container_width=True,
+                        column_config={
+                            "volume": currency_column("volume (R$)"),
+                            "ticket_medio": currency_column("ticket_medio (R$)"),
+                            "Duplicatas": integer_column("Duplicatas"),
+                            "Propostas": integer_column("Propostas"),
+                        },
+                    )
+                else:
+                    st.info("Nenhum grupo econômico encontrado.")
+
+                st.markdown("### Health Check · Última Operação por Grupo")
+                health_check = tab_aggregate("health_check")
+                if not health_check.empty:
+                    st.dataframe(
+                        health_check,
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={
+                            "ultima_operacao": date_column("ultima_operacao"),
+                            "dias_sem_operar": integer_column("dias_sem_operar"),
+                            "saude": st.column_config.TextColumn("saúde"),
+                        },
+                    )
+                else:
+                    st.info("Ainda não há histórico para calcular último engajamento.")
+
+        if fornecedores_tab.open:
+            with fornecedores_tab:
+                st.subheader("Fornecedores · Cobertura da Base Cedente")
+
+                fornecedores_total = distinct_counts()["fornecedores"]
+                st.metric("Fornecedores Ativos (CNPJs)", format_integer(fornecedores_total))
+
+                st.markdown("### Top 10 Fornecedores por Volume")
+                ranking_fornecedores = tab_aggregate("ranking_fornecedores")
+                if not ranking_fornecedores.empty:
+                    fig_fornecedores = px.bar(
+                        ranking_fornecedores,
+                        x="volume",
+                        y="razao_social_fornecedor",
+                        orientation="h",
+                        labels={"volume": "Volume (R$)", "razao_social_fornecedor": "Fornecedor"},
+                        color="volume",
+                        color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+                    )
+                    fig_fornecedores.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
+                    st.plotly_chart(fig_fornecedores, use_container_width=True)
+                else:
+                    st.info("Sem fornecedores cadastrados para o recorte atual.")
 
+                st.markdown("### Fornecedores por Grupo Econômico")
+                fornecedores_por_grupo = tab_aggregate("fornecedores_por_grupo")
+                if not fornecedores_por_grupo.empty:
+                    st.dataframe(fornecedores_por_grupo, use_container_width=True)
+                else:
+                    st.info("Não há combinação de fornecedor por grupo para exibir.")
 
-with explorer_tab:
-    st.subheader("Explorador Operacional · Pesquisa de Operações")
-    st.caption(
-        "Filtra diretamente a tabela base `propostas`. Os filtros globais (período, parceiro, financiador) já estão aplicados."
-    )
+        if parceiros_tab.open:
+            with parceiros_tab:
+                st.subheader("Performance por Parceiro (Canal)")
 
-    if df_base_filtered.empty:
-        st.info("Não foi possível carregar dados operacionais. Ajuste os filtros principais.")
-    else:
-        hoje = end_date
-        default_explorer_start = max(start_date, hoje - timedelta(days=30))
-        
-        # --- FILTROS LOCAIS DA ABA ---
-        col1, col2 = st.columns([2, 1])
-        search_term = col1.text_input(
-            "Pesquisa rápida (NFID, CNPJ Comprador/Fornecedor)",
-            placeholder="Busque por NFID, CNPJ...",
+                if df_base_filtered.empty:
+                    st.info("Não foi possível carregar dados operacionais. Ajuste os filtros principais.")
+                else:
+                    st.markdown("### Tabela de Performance por Parceiro")
+                    st.caption("Visão agregada por Parceiro, recriando a tabela principal do relatório anterior.")
+
+                    df_parceiro_agg = dashboard_aggregate("parceiros_metrics")
+                    if df_parceiro_agg.empty:
+                        st.info("Nenhum parceiro com operações no recorte selecionado.")
+                    else:
+                        df_parceiro_agg["ticket_medio"] = df_parceiro_agg["volume_bruto"] / df_parceiro_agg["n_propostas"].replace(0, np.nan)
+                        df_parceiro_agg = df_parceiro_agg.sort_values("volume_bruto", ascending=False)
+
+                        df_parceiro_agg_display = df_parceiro_agg.rename(
+                            columns={
+                                "parceiro": "Parceiro",
+                                "volume_bruto": "Volume (VOP)",
+                                "n_compradores": "Nº Sacados",
+                                "n_propostas": "Nº Propostas",
+                                "n_duplicatas": "Nº Duplicatas",
+                                "ticket_medio": "Ticket Médio",
+                                "prazo_medio_pond": "Prazo Médio",
+                                "taxa_media_pond": "Taxa Média %",
+                            }
+                        )
+
+                        st.dataframe(
+                            df_parceiro_agg_display,
+                            use_container_width=True,
+                            hide_index=True,
+                            column_config={
+                                "Volume (VOP)": currency_column("Volume VOP (R$)"),
+                                "Nº Sacados": integer_column("Nº Sacados"),
+                                "Nº Propostas": integer_column("Nº Propostas"),
+                                "Nº Duplicatas": integer_column("Nº Duplicatas"),
+                                "Ticket Médio": currency_column("Ticket Médio (R$)"),
+                                "Prazo Médio": duration_column("Prazo Médio"),
+                                "Taxa Média %": percent_column("Taxa Média %"),
+                            },
+                        )
+
+
+if funding_tab.open:
+    with funding_tab:
+        st.subheader("Funding · Performance dos Parceiros Financeiros")
+
+        # Consolidado diário (componentes ponderados por financiador); sem ele, RPC ou df_base
+        resumo_diario = load_daily_summary(*filtros_globais)
+        funding_metrics = (
+            funding_metrics_from_sums(resumo_diario)
+            if resumo_diario is not None
+            else dashboard_aggregate("funding_metrics")
         )
-        # Filtro de data local, limitado pelo filtro global
-        date_filter = col2.date_input(
-            "Refinar período (dentro do filtro global)",
-            value=(default_explorer_start, end_date),
-            min_value=start_date,
-            max_value=end_date,
-            key="explorer_date_range"
+        financiadores_total = distinct_counts()["financiadores"]
+        # Média geral sobre todas as operações do recorte (inclusive sem
+        # financiador), a mesma da Visão Geral; os gráficos abaixo são por financiador
+        taxa_media_fin, prazo_ponderado = period_weighted_means(resumo_diario)
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Financiadores Ativos", format_integer(financiadores_total))
+        col2.metric("Taxa Efetiva Média (ponderada)", format_percent(taxa_media_fin))
+        col3.metric("Prazo Médio Ponderado", format_duration(prazo_ponderado))
+
+        st.markdown("### Volume por Financiador")
+        volume_financiador = (
+            funding_metrics[["razao_social_financiador", "volume"]]
+            .rename(columns={"volume": "valor_bruto_duplicata"})
+            .sort_values("valor_bruto_duplicata", ascending=False)
         )
-
-        if isinstance(date_filter, tuple) and len(date_filter) == 2:
-            op_start, op_end = date_filter
+        if not volume_financiador.empty:
+            fig_volume_fin = px.bar(
+                volume_financiador,
+                x="valor_bruto_duplicata",
+                y="razao_social_financiador",
+                orientation="h",
+                labels={"valor_bruto_duplicata": "Volume (R$)", "razao_social_financiador": "Financiador"},
+                color="valor_bruto_duplicata",
+                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+            )
+            fig_volume_fin.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
+            st.plotly_chart(fig_volume_fin, use_container_width=True)
         else:
-            op_start = date_filter  # type: ignore[assignment]
-            op_end = end_date
+            st.info("Sem financiadores para exibir.")
 
-        status_pagamento_opts = sorted(df_base_filtered["status_pagamento"].dropna().unique().tolist())
-        status_proposta_opts = sorted(df_base_filtered["status_proposta"].dropna().unique().tolist())
+        st.markdown("### Taxa Efetiva por Financiador")
+        taxa_financiador = (
+            funding_metrics.dropna(subset=["peso_taxa"])[["razao_social_financiador", "taxa_media_ponderada"]]
+            .sort_values("taxa_media_ponderada", ascending=False)
+        )
+        if not taxa_financiador.empty:
+            fig_taxa = px.bar(
+                taxa_financiador,
+                x="taxa_media_ponderada",
+                y="razao_social_financiador",
+                orientation="h",
+                labels={"taxa_media_ponderada": "Taxa Efetiva Ponderada (%)", "razao_social_financiador": "Financiador"},
+                color="taxa_media_ponderada",
+                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+            )
+            fig_taxa.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
+            st.plotly_chart(fig_taxa, use_container_width=True)
+        else:
+            st.info("Não há dados de taxa efetiva para o recorte atual.")
 
-        col3, col4 = st.columns(2)
-        selected_pagamentos = col3.multiselect("Status de Pagamento", status_pagamento_opts, default=status_pagamento_opts)
-        selected_propostas = col4.multiselect("Status de Proposta", status_proposta_opts, default=status_proposta_opts)
-
-        # --- APLICAÇÃO DOS FILTROS LOCAIS ---
-        explorer_df = df_base_filtered.copy()
-        
-        # Filtro de data local
-        explorer_df = explorer_df[
-            (explorer_df["data_operacao"].dt.date >= op_start)
-            & (explorer_df["data_operacao"].dt.date <= op_end)
-        ]
+        st.markdown("### Prazo Médio por Financiador")
+        prazo_financiador = (
+            funding_metrics.dropna(subset=["peso_prazo"])[["razao_social_financiador", "prazo_medio_ponderado"]]
+            .sort_values("prazo_medio_ponderado", ascending=False)
+        )
+        if not prazo_financiador.empty:
+            fig_prazo = px.bar(
+                prazo_financiador,
+                x="prazo_medio_ponderado",
+                y="razao_social_financiador",
+                orientation="h",
+                labels={"prazo_medio_ponderado": "Prazo Médio Ponderado (dias)", "razao_social_financiador": "Financiador"},
+                color="prazo_medio_ponderado",
+                color_continuous_scale=BRAND_COLOR_SCALE_CONTINUOUS,
+            )
+            fig_prazo.update_layout(coloraxis_showscale=False, yaxis={'categoryorder':'total ascending'})
+            st.plotly_chart(fig_prazo, use_container_width=True)
+        else:
+            st.info("Sem dados de prazo médio para os financiadores selecionados.")
 
-        if selected_pagamentos:
-            explorer_df = explorer_df[explorer_df["status_pagamento"].isin(selected_pagamentos)]
-        if selected_propostas:
-            explorer_df = explorer_df[explorer_df["status_proposta"].isin(selected_propostas)]
-
-        if search_term:
-            search_lower = search_term.lower()
-            explorer_df = explorer_df[
-                explorer_df["nfid"].fillna("").str.lower().str.contains(search_lower)
-                | explorer_df["cnpj_comprador"].fillna("").str.lower().str.contains(search_lower)
-                | explorer_df["cnpj_fornecedor"].fillna("").str.lower().str.contains(search_lower)
-            ]
-
-        # --- KPIS DE VALIDAÇÃO (PARA O CEO) ---
-        st.markdown("### Totais de Validação (Dados Brutos Filtrados)")
-        st.caption("Estes são os totais brutos dos registros filtrados abaixo (limitado a 500 linhas para exibição).")
-
-        total_bruto_explorador = explorer_df['valor_bruto_duplicata'].sum()
-        total_linhas_explorador = len(explorer_df)
-        total_propostas_explorador = explorer_df['numero_proposta'].nunique()
-
-        val_col1, val_col2, val_col3 = st.columns(3)
-        val_col1.metric("Volume Bruto (Filtrado)", format_currency(total_bruto_explorador))
-        val_col2.metric("Total de Linhas (Duplicatas)", format_integer(total_linhas_explorador))
-        val_col3.metric("Total de Propostas Únicas", format_integer(total_propostas_explorador))
-        
-        st.markdown("---")
-        
-        # --- EXIBIÇÃO DA TABELA ---
-        explorer_df = explorer_df.sort_values("data_operacao", ascending=False)
-        display_cols = [
-            "data_operacao",
-            "nfid",
-            "numero_proposta",
-            "grupo_economico",
-            "razao_social_comprador",
-            "cnpj_comprador",
-            "razao_social_fornecedor",
-            "cnpj_fornecedor",
-            "parceiro",
-            "razao_social_financiador",
-            "valor_bruto_duplicata",
-            "status_pagamento",
-            "status_proposta",
-        ]
-        # Garantir que colunas existem antes de selecionar
-        display_cols_exist = [col for col in display_cols if col in explorer_df.columns]
-        explorer_df_display = explorer_df[display_cols_exist].head(500).copy()
+        st.markdown("### Receita Cashforce · Evolução")
+        receita_funding = (
+            df_filtered.groupby("competencia", as_index=False)["total_receita_cashforce"]
+            .sum()
+            .sort_values("competencia")
+        )
+        fig_receita_fin = px.line(
+            receita_funding,
+            x="competencia",
+            y="total_receita_cashforce",
+            labels={"total_receita_cashforce": "Receita (R$)", "competencia": "Competência"},
+            markers=True,
+            color_discrete_sequence=[BRAND_COLOR_SCALE_PRIMARY[1]],
+        )
+        st.plotly_chart(fig_receita_fin, use_container_width=True)
 
-        explorer_df_display["data_operacao"] = explorer_df_display["data_operacao"].dt.strftime("%d/%m/%Y")
-        explorer_df_display["valor_bruto_duplicata"] = explorer_df_display["valor_bruto_duplicata"].map(format_currency)
 
-        st.dataframe(explorer_df_display, use_container_width=True, hide_index=True)
+if explorer_tab.open:
+    with explorer_tab:
+        render_explorer(df_base_filtered, filtros_globais, assinatura_recorte, start_month, end_month)
 
 # --- 12. RODAPÉ DA SIDEBAR ---
 st.sidebar.markdown("---")
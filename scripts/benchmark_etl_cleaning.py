@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Benchmark do ETL (api/etl_sync.py) contra a transformação original.
+
+"Antes" é a transformação do handler original (commit 0b1a584): aba inteira
+via get_all_records, sort, drop_duplicates, quatro replace na base toda,
+Series.apply por célula e a limpeza final registro a registro.
+"Depois" é o caminho atual do handler: linhas vencedoras, leitura em blocos
+(`_iter_sheet_chunks`), `_transform_records` e `_iter_record_batches`.
+
+Os dois leem a mesma planilha sintética, servida por uma aba em memória.
+O script confere que geram os mesmos registros e que o hash de detecção de
+mudanças de cada linha não depende do tamanho do bloco.
+
+Uso:
+    python3 scripts/benchmark_etl_cleaning.py [linhas]   # padrão: 100000
+"""
+
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from gspread.utils import a1_to_rowcol, numericise_all
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from api import etl_sync  # noqa: E402
+
+
+class MemoryWorksheet:
+    """Aba em memória com a parte da API do gspread que o ETL usa."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.row_count = len(rows)
+
+    def row_values(self, row: int) -> list:
+        return list(self.rows[row - 1])
+
+    def get_values(self, range_name: str) -> list:
+        first, last = (int(part) for part in range_name.split(':'))
+        return [list(row) for row in self.rows[first - 1:last]]
+
+    def batch_get(self, ranges: list) -> list:
+        result = []
+        for range_name in ranges:
+            start, end = (a1_to_rowcol(part) for part in range_name.split(':'))
+            result.append([row[start[1] - 1:end[1]] for row in self.rows[start[0] - 1:end[0]]])
+        return result
+
+    def get_all_records(self, head: int) -> list:
+        keys = self.rows[head - 1]
+        return [dict(zip(keys, numericise_all(row))) for row in self.rows[head:]]
+
+
+def _brl(value: float) -> str:
+    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def build_sheet(rows: int, seed: int = 42) -> MemoryWorksheet:
+    """Gera uma aba com o cabeçalho na linha 4 e células como o Sheets devolve.
+
+    Valores de duplicata são quase únicos; tarifas, taxas, prazos, status e
+    anexos se repetem muito. Números vêm como texto formatado (R$ 1.234,56,
+    1.234,56, 1,25%) ou como texto que o gspread converte (1234.56, 30), além
+    de vazios e '---'. Cerca de 5% dos NFIDs se repetem com outra data de
+    operação e 1% das linhas vem sem NFID. Os dias das datas vão de 13 a 28:
+    a inferência de formato da transformação original não erra dd/mm/aaaa.
+    """
+    rng = np.random.default_rng(seed)
+    shape = rng.random(size=rows)
+
+    def choice(values):
+        return [values[i] for i in rng.integers(0, len(values), size=rows)]
+
+    def dates(blank_share):
+        days = rng.integers(13, 29, size=rows)
+        months = rng.integers(1, 13, size=rows)
+        blank = rng.random(size=rows) < blank_share
+        return ['' if blank[i] else f"{days[i]:02d}/{months[i]:02d}/2024" for i in range(rows)]
+
+    def money(values):
+        cells = []
+        for i, value in enumerate(values):
+            if shape[i] < 0.45:
+                cells.append(f"R$ {_brl(value)}")
+            elif shape[i] < 0.75:
+                cells.append(_brl(value))
+            elif shape[i] < 0.90:
+                cells.append(f"{value:.2f}")
+            elif shape[i] < 0.95:
+                cells.append(str(int(value)))
+            else:
+                cells.append(['', '---', 'None'][i % 3])
+        return cells
+
+    def percent(values):
+        cells = []
+        for i, value in enumerate(values):
+            if shape[i] < 0.5:
+                cells.append(f"{value:.2f}%".replace(".", ","))
+            elif shape[i] < 0.9:
+                cells.append(f"{value:.2f}")
+            else:
+                cells.append(['', '---', 'n/d'][i % 3])
+        return cells
+
+    def integer(values):
+        cells = []
+        for i, value in enumerate(values):
+            if shape[i] < 0.6:
+                cells.append(str(value))
+            elif shape[i] < 0.8:
+                cells.append(f"{value}.5")
+            elif shape[i] < 0.95:
+                cells.append(f" {value} ")
+            else:
+                cells.append(['', '---', 'abc'][i % 3])
+        return cells
+
+    # NFID repetido fica na linha seguinte, com data de operação diferente
+    operation_days = 13 + np.arange(rows) % 16
+    operation_months = rng.integers(1, 13, size=rows)
+    repeated = rng.random(size=rows) < 0.05
+    nfids = []
+    for i in range(rows):
+        if shape[i] > 0.99:
+            nfids.append('')
+        elif repeated[i] and i and nfids[-1]:
+            nfids.append(nfids[-1])
+        else:
+            nfids.append(f"NF{i:08d}")
+
+    bruto = rng.gamma(2.0, 25000.0, size=rows).round(2)
+    fees = rng.choice([0.0, 9.9, 15.0, 25.0, 49.9, 99.0], size=rows)
+    rates = rng.choice(np.arange(0.8, 4.5, 0.01).round(2), size=rows)
+    days = rng.integers(1, 180, size=rows)
+
+    status = ['Pago', 'pago ', 'PENDENTE', 'Pendente', 'Cancelado', '', 'None']
+    companies = [f"Empresa {n} Ltda" for n in range(300)] + [f"empresa {n} ltda " for n in range(30)]
+    columns = {
+        "Numero da Proposta": [str(100000 + i // 3) for i in range(rows)],
+        "Status da Proposta": choice(status),
+        "Data da operação": [
+            f"{operation_days[i]:02d}/{operation_months[i]:02d}/2024" for i in range(rows)
+        ],
+        "Data do Aceite da Proposta": dates(0.05),
+        "Grupo Econômico": choice([f"Grupo {n}" for n in range(50)] + ['', '---']),
+        "Razão Social Comprador": choice(companies),
+        "CNPJ do Comprador": choice([f"{n:02d}.345.678/0001-{n % 97:02d}" for n in range(300)]),
+        "Status comprador": choice(['Ativo', 'ativo', 'Inativo', '']),
+        "NFID": nfids,
+        "Nº da Nota Fiscal": [str(500000 + i) for i in range(rows)],
+        "Tipo da nota": choice(['Produto', 'Serviço', 'produto ']),
+        "Nº da Duplicata": [f"{500000 + i}-1" for i in range(rows)],
+        "Data de Inclusão da NF": dates(0.02),
+        "Data de Emissão da NF": dates(0.02),
+        "Descrição": choice(['Mercadorias', 'Serviços prestados', '', 'nan']),
+        "Razão Social do Fornecedor": choice(companies),
+        "CNPJ do Fornecedor": choice([f"{n:02d}.111.222/0001-{n % 89:02d}" for n in range(300)]),
+        "Status fornecedor": choice(['Ativo', 'Inativo', 'ATIVO']),
+        "Razão Social do Financiador": choice(['Banco A', 'banco a', 'FIDC B', 'Fundo C', '']),
+        "CNPJ Financiador": choice(['11.111.111/0001-11', '22.222.222/0001-22', '']),
+        "Parceiro": choice(['Parceiro 1', 'parceiro 2', 'PARCEIRO 3', '', '---']),
+        "Valor Bruto da Duplicata": money(bruto),
+        "Valor Líquido da Duplicata": money((bruto * 0.97).round(2)),
+        "Desconto contrato": money(np.zeros(rows)),
+        "Abatimento": money(np.zeros(rows)),
+        "Deságio R$": money((bruto * rates / 100).round(2)),
+        "Tarifa R$": money(fees),
+        "Ad Valorem R$": money(np.zeros(rows)),
+        "IOF R$": money((bruto * 0.0038).round(2)),
+        "Total de taxas R$": money((bruto * rates / 100 + fees).round(2)),
+        "Liquido da Operação": money((bruto * (1 - rates / 100) - fees).round(2)),
+        "Taxa ao mês %": percent(rates),
+        "Ad Valorem &": percent(rates / 10),
+        "Taxa efetiva ao mês %": percent(rates * 1.1),
+        "Faixa de Taxa Cashforce": choice(['Até 1%', '1% a 2%', 'Acima de 2%']),
+        "Forma de pagamento": choice(['Boleto', 'TED', 'pix']),
+        "Vencimento": dates(0.05),
+        "Data de pagamento": dates(0.3),
+        "Status de Pagamento": choice(status),
+        "Data do Pagamento da Operação": dates(0.3),
+        "Data da Confirmação do Pagamento da Operação": dates(0.4),
+        "Status da Antecipação": choice(['Antecipada', 'Não antecipada', '']),
+        "Prazo": integer(days),
+        "Prazo Médio da operação": integer(days),
+        "Receita Cashforce": money((bruto * 0.002).round(2)),
+        "Termo anexado?": choice(['Sim', 'Não', 'TRUE', 'FALSE', '1', '0', '', 'None']),
+        "Boleto anexado?": choice(['Sim', 'Não', 'sim', '']),
+        "Comprovante de depósito?": choice(['TRUE', 'FALSE', '---']),
+        "Dia atual": ['18/10/2026'] * rows,
+    }
+
+    keys = list(columns)
+    title_rows = [[''] * len(keys) for _ in range(etl_sync.SHEET_HEADER_ROW - 1)]
+    title_rows[0][0] = 'Base de propostas'
+    return MemoryWorksheet(title_rows + [keys] + [list(row) for row in zip(*columns.values())])
+
+
+def run_baseline(worksheet: MemoryWorksheet) -> list:
+    """Passos 2 a 4 do handler original (0b1a584), sem os prints."""
+    records = worksheet.get_all_records(head=etl_sync.SHEET_HEADER_ROW)
+    df = pd.DataFrame(records)
+
+    if 'Data da operação' in df.columns:
+        df['Data da operação'] = pd.to_datetime(df['Data da operação'], errors='coerce')
+        df = df.sort_values('Data da operação', ascending=False)
+
+    df = df.rename(columns={**etl_sync.COLUMN_MAPPING, "Dia atual": "dia_atual"})
+
+    for col in etl_sync.TEXT_COLUMNS_TO_SANITIZE:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip().str.title()
+            df[col] = df[col].replace({'': None, 'None': None, 'Nan': None})
+
+    df = df[df['nfid'].notna() & (df['nfid'] != '')]
+    df = df.drop_duplicates(subset=['nfid'], keep='first')
+
+    df = df.replace('', None)
+    df = df.replace('nan', None)
+    df = df.replace('NaN', None)
+    df = df.replace('---', None)
+    df = df.where(pd.notna(df), None)
+
+    for col in etl_sync.MONEY_COLUMNS:
+        df[col] = df[col].apply(etl_sync.clean_currency)
+    for col in etl_sync.PERCENTAGE_COLUMNS:
+        df[col] = df[col].apply(etl_sync.clean_percentage)
+    for col in etl_sync.DATE_COLUMNS + ['dia_atual']:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+        df[col] = df[col].dt.strftime('%Y-%m-%d').replace('NaT', None)
+    for col in etl_sync.BOOLEAN_COLUMNS:
+        df[col] = df[col].apply(etl_sync.clean_boolean)
+    for col in etl_sync.INTEGER_COLUMNS:
+        df[col] = df[col].apply(etl_sync.clean_integer)
+
+    data_to_upsert = []
+    for record in df.to_dict('records'):
+        clean_record = {}
+        for key, value in record.items():
+            if value in ['NaN', 'nan', 'None', '---', '']:
+                clean_record[key] = None
+            elif isinstance(value, float) and pd.isna(value):
+                clean_record[key] = None
+            else:
+                clean_record[key] = value
+        data_to_upsert.append(clean_record)
+    return data_to_upsert
+
+
+def run_current(worksheet: MemoryWorksheet, chunk_rows: int = etl_sync.SHEET_CHUNK_ROWS) -> list:
+    """Caminho do handler atual até os lotes prontos para o upsert."""
+    head = etl_sync.SHEET_HEADER_ROW
+    keys = etl_sync._sheet_header(worksheet, head)
+    winners = etl_sync._winning_rows(worksheet, keys, head)
+    upserted = []
+    for first, records in etl_sync._iter_sheet_chunks(worksheet, keys, head, chunk_rows):
+        records = [
+            record for offset, record in enumerate(records)
+            if winners.get(record.get('NFID')) == first + offset
+        ]
+        if records:
+            for batch in etl_sync._iter_record_batches(etl_sync._transform_records(records), chunk_rows):
+                upserted.extend(batch)
+    return upserted
+
+
+def _canonical(records: list) -> dict:
+    return {
+        record['nfid']: {key: etl_sync._hash_value(value) for key, value in record.items()}
+        for record in records
+    }
+
+
+def assert_same_records(expected: list, actual: list):
+    """Mesmos registros; `dia_atual` não é mais enviada pelo ETL."""
+    for record in expected:
+        record.pop('dia_atual', None)
+    left, right = _canonical(expected), _canonical(actual)
+    if len(actual) != len(right):
+        raise AssertionError(f"{len(actual) - len(right)} NFIDs enviados mais de uma vez")
+    if left.keys() != right.keys():
+        raise AssertionError(f"NFIDs divergentes: {len(left.keys() ^ right.keys())}")
+    for nfid, record in left.items():
+        for key, value in record.items():
+            other = right[nfid].get(key)
+            if value != other or type(value) is not type(other):
+                raise AssertionError(f"NFID {nfid}, coluna {key}: {other!r} != {value!r}")
+
+
+def assert_same_hashes(worksheet: MemoryWorksheet, chunk_rows: int = 16):
+    """O hash de cada linha não depende do bloco em que ela foi convertida.
+
+    Em blocos pequenos algumas colunas saem sem ausentes (int64) e outras com
+    NaN (float64); os hashes têm de bater com os da leitura em blocos grandes.
+    """
+    def hashes(records):
+        return {record['nfid']: etl_sync._record_hash(record) for record in records}
+
+    whole = hashes(run_current(worksheet))
+    chunked = hashes(run_current(worksheet, chunk_rows))
+    mismatches = sum(whole[nfid] != digest for nfid, digest in chunked.items())
+    if mismatches or whole.keys() != chunked.keys():
+        raise AssertionError(f"{mismatches} linhas mudam de hash conforme o bloco")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"Gerando planilha sintética com {rows} linhas...")
+    worksheet = build_sheet(rows)
+
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        # A transformação original deixa o pandas inferir o formato das datas
+        warnings.simplefilter('ignore', UserWarning)
+        expected = run_baseline(worksheet)
+    baseline_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = run_current(worksheet)
+    current_seconds = time.perf_counter() - start
+
+    assert_same_records(expected, actual)
+    assert_same_hashes(build_sheet(5000, seed=7))
+
+    print(f"Registros enviados: {len(actual)}")
+    print(f"Antes  (handler original): {baseline_seconds:8.3f}s  {rows / baseline_seconds:12,.0f} linhas/s")
+    print(f"Depois (blocos atuais):    {current_seconds:8.3f}s  {rows / current_seconds:12,.0f} linhas/s")
+    print(f"Ganho: {baseline_seconds / current_seconds:.1f}x · mesmos registros")
+
+
+if __name__ == "__main__":
+    main()
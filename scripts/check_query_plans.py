@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Confere os planos das consultas do dashboard sobre `propostas`.
+
+Executa cada forma de consulta do dashboard (operações do período e
+sincronização incremental, que o PostgREST monta a partir da tabela; RPCs
+das abas e do Explorador; recálculo do consolidado mensal) com o
+`auto_explain` ligado e falha se algum comando fizer Seq Scan em `propostas`.
+As RPCs são chamadas de verdade: o `auto_explain` registra também os
+comandos de dentro das funções (`log_nested_statements`), com o plano que o
+Postgres usa ao executá-las, e não uma cópia do SQL feita à mão.
+
+Com `--seed N`, cria a tabela `propostas` (colunas usadas pelo dashboard e
+índices da instalação padrão) num Postgres local vazio, gera N operações
+sintéticas, aplica os scripts de supabase/ (índices, RPCs do dashboard e do
+Explorador, consolidado mensal) e roda VACUUM ANALYZE. O seed se recusa a
+rodar se a tabela já tiver linhas.
+
+Uso:
+    python3 scripts/check_query_plans.py --dsn postgresql://localhost/bi --seed 300000
+    python3 scripts/check_query_plans.py [--dsn DSN] [--verbose]
+
+Requer psycopg 3 (`pip install "psycopg[binary]"`) e permissão para
+`LOAD 'auto_explain'` (superusuário, ou a biblioteca em $libdir/plugins).
+O DSN também pode vir de CHECK_PLANS_DSN ou DATABASE_URL.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Scripts aplicados pelo seed, na ordem da instalação
+SEED_SCRIPTS = [
+    os.path.join(ROOT, "supabase", name)
+    for name in ("propostas_indices.sql", "dashboard_rpc.sql", "explorer_rpc.sql", "propostas_resumo_mensal.sql")
+]
+
+# Mesmas colunas de BASE_COLUMNS em dashboard.py
+BASE_COLUMNS = (
+    "nfid, numero_proposta, data_operacao, grupo_economico, razao_social_comprador, cnpj_comprador, "
+    "razao_social_fornecedor, cnpj_fornecedor, parceiro, razao_social_financiador, valor_bruto_duplicata, "
+    "valor_liquido_duplicata, status_pagamento, status_proposta, receita_cashforce, prazo_medio_operacao, "
+    "taxa_efetiva_mes_percentual"
+)
+
+# Recorte padrão das RPCs (período; sem parceiros/financiadores = todos)
+SCOPE_ARGS = "p_start => %(start)s, p_end => %(end)s"
+
+# (nome, SQL)
+QUERIES = [
+    (
+        "operacoes_periodo (primeira página)",
+        f"""
+        select {BASE_COLUMNS}
+        from public.propostas
+        where data_operacao >= %(start)s and data_operacao <= %(end)s
+          and data_operacao is not null and id is not null
+        order by data_operacao, id
+        limit 1000
+        """,
+    ),
+    (
+        "operacoes_periodo (página seguinte)",
+        f"""
+        select {BASE_COLUMNS}
+        from public.propostas
+        where data_operacao >= %(start)s and data_operacao <= %(end)s
+          and data_operacao is not null and id is not null
+          and data_operacao >= %(seek_data)s
+          and (data_operacao > %(seek_data)s or (data_operacao = %(seek_data)s and id > %(seek_id)s))
+        order by data_operacao, id
+        limit 1000
+        """,
+    ),
+    (
+        "sincronizacao_incremental",
+        f"""
+        select {BASE_COLUMNS}, updated_at
+        from public.propostas
+        where updated_at >= %(since)s and id is not null
+        order by id
+        limit 1000
+        """,
+    ),
+    ("ranking_grupos", f"select * from public.ranking_grupos({SCOPE_ARGS})"),
+    (
+        "parceiros_metrics (parceiro selecionado)",
+        f"select * from public.parceiros_metrics({SCOPE_ARGS}, p_parceiros => array[%(parceiro)s])",
+    ),
+    (
+        "funding_metrics (financiador selecionado)",
+        f"select * from public.funding_metrics({SCOPE_ARGS}, p_financiadores => array[%(financiador)s])",
+    ),
+    ("clientes_resumo", f"select * from public.clientes_resumo({SCOPE_ARGS})"),
+    ("explorer_operacoes (primeira página)", f"select * from public.explorer_operacoes({SCOPE_ARGS})"),
+    (
+        "explorer_operacoes (página seguinte)",
+        f"""
+        select * from public.explorer_operacoes(
+            {SCOPE_ARGS}, p_apos_data => %(seek_data)s, p_apos_id => %(seek_id)s
+        )
+        """,
+    ),
+    (
+        "explorer_operacoes (busca por NFID)",
+        f"select * from public.explorer_operacoes({SCOPE_ARGS}, p_busca => %(busca_nfid)s)",
+    ),
+    (
+        "explorer_operacoes (busca por CNPJ)",
+        f"select * from public.explorer_operacoes({SCOPE_ARGS}, p_busca => %(busca_cnpj)s)",
+    ),
+    (
+        "explorer_operacoes (status)",
+        f"""
+        select * from public.explorer_operacoes(
+            {SCOPE_ARGS},
+            p_status_pagamento => array[%(status_pagamento)s],
+            p_status_proposta => array[%(status_proposta)s]
+        )
+        """,
+    ),
+    (
+        "explorer_totais (busca e status)",
+        f"""
+        select * from public.explorer_totais(
+            {SCOPE_ARGS},
+            p_status_pagamento => array[%(status_pagamento)s],
+            p_busca => %(busca_nfid)s
+        )
+        """,
+    ),
+    (
+        "refresh_propostas_resumo_mensal (uma competência)",
+        "select public.refresh_propostas_resumo_mensal(array[%(month)s::date])",
+    ),
+]
+
+SEED_TABLE_SQL = """
+-- Papéis do Supabase citados nos grants dos scripts
+do $$
+declare
+    papel text;
+begin
+    foreach papel in array array['anon', 'authenticated', 'service_role'] loop
+        if not exists (select 1 from pg_roles where rolname = papel) then
+            execute format('create role %I nologin', papel);
+        end if;
+    end loop;
+end
+$$;
+
+create table if not exists public.propostas (
+    id serial primary key,
+    numero_proposta text,
+    status_proposta text,
+    data_operacao date,
+    grupo_economico text,
+    razao_social_comprador text,
+    cnpj_comprador text,
+    nfid text unique not null,
+    razao_social_fornecedor text,
+    cnpj_fornecedor text,
+    razao_social_financiador text,
+    parceiro text,
+    valor_bruto_duplicata numeric(15,2),
+    valor_liquido_duplicata numeric(15,2),
+    taxa_efetiva_mes_percentual numeric(8,4),
+    status_pagamento text,
+    prazo_medio_operacao integer,
+    receita_cashforce numeric(15,2),
+    created_at timestamp default now(),
+    updated_at timestamp default now()
+);
+create index if not exists idx_propostas_nfid on public.propostas (nfid);
+create index if not exists idx_propostas_numero_proposta on public.propostas (numero_proposta);
+create index if not exists idx_propostas_cnpj_comprador on public.propostas (cnpj_comprador);
+create index if not exists idx_propostas_data_operacao on public.propostas (data_operacao);
+"""
+
+# Três anos de operações; cardinalidades próximas das da base real
+SEED_ROWS_SQL = """
+insert into public.propostas (
+    numero_proposta, status_proposta, data_operacao, grupo_economico, razao_social_comprador,
+    cnpj_comprador, nfid, razao_social_fornecedor, cnpj_fornecedor, razao_social_financiador,
+    parceiro, valor_bruto_duplicata, valor_liquido_duplicata, taxa_efetiva_mes_percentual,
+    status_pagamento, prazo_medio_operacao, receita_cashforce, updated_at
+)
+select
+    'P' || (g / 3),
+    (array['Aprovada', 'Cancelada', 'Em análise'])[1 + g %% 3],
+    current_date - (g %% 1095),
+    case when g %% 17 = 0 then null else 'Grupo ' || (g %% 120) end,
+    'Comprador ' || (g %% 900),
+    lpad((g %% 900)::text, 14, '0'),
+    'NF' || lpad(g::text, 9, '0'),
+    'Fornecedor ' || (g %% 2500),
+    lpad((100000 + g %% 2500)::text, 14, '0'),
+    'Financiador ' || (g %% 12),
+    'Parceiro ' || (g %% 8),
+    round((random() * 90000 + 500)::numeric, 2),
+    round((random() * 85000 + 400)::numeric, 2),
+    case when g %% 10 = 0 then null else round((random() * 3 + 0.8)::numeric, 4) end,
+    (array['Pago', 'Aberto', 'Atrasado'])[1 + g %% 3],
+    15 + g %% 120,
+    round((random() * 900)::numeric, 2),
+    now() - ((g %% 365) || ' days')::interval
+from generate_series(1, %(rows)s) as g
+"""
+
+
+def seed(conn, rows: int):
+    """Cria e popula `propostas` num banco local vazio e aplica os scripts do repositório."""
+    with conn.cursor() as cur:
+        cur.execute(SEED_TABLE_SQL)
+        cur.execute("select exists (select 1 from public.propostas)")
+        if cur.fetchone()[0]:
+            raise SystemExit("❌ `propostas` já tem linhas; o seed só roda num banco vazio.")
+        cur.execute(SEED_ROWS_SQL, {"rows": rows})
+        for script in SEED_SCRIPTS:
+            with open(script, encoding="utf-8") as handle:
+                cur.execute(handle.read())
+    conn.commit()
+    conn.autocommit = True
+    conn.execute("vacuum analyze public.propostas")
+    conn.autocommit = False
+
+
+def query_params(conn) -> dict:
+    """Recorte de um mês (o último completo com dados), como o dashboard abre por padrão.
+
+    Parceiro, financiador, status e termos de busca saem de uma operação real
+    do mês, para que os filtros e a busca encontrem linhas.
+    """
+    with conn.cursor() as cur:
+        cur.execute("select max(data_operacao) from public.propostas")
+        last_day = cur.fetchone()[0]
+        if last_day is None:
+            raise SystemExit("❌ `propostas` está vazia; use --seed num banco local.")
+        month = (last_day.replace(day=1) - timedelta(days=1)).replace(day=1)
+        end = (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        cur.execute(
+            """
+            select parceiro, razao_social_financiador, status_pagamento, status_proposta,
+                   nfid, regexp_replace(cnpj_comprador, '\\D', '', 'g')
+            from public.propostas
+            where data_operacao between %s and %s
+              and parceiro is not null and razao_social_financiador is not null
+              and status_pagamento is not null and status_proposta is not null
+              and nfid is not null and length(regexp_replace(cnpj_comprador, '\\D', '', 'g')) >= 8
+            limit 1
+            """,
+            (month, end),
+        )
+        row = cur.fetchone()
+    if row is None:
+        raise SystemExit("❌ Nenhuma operação completa no mês de referência.")
+    parceiro, financiador, status_pagamento, status_proposta, nfid, cnpj = row
+    return {
+        "start": month,
+        "end": end,
+        "month": month,
+        "seek_data": month + timedelta(days=14),
+        "seek_id": 0,
+        "since": datetime.now() - timedelta(minutes=10),
+        "parceiro": parceiro,
+        "financiador": financiador,
+        "status_pagamento": status_pagamento,
+        "status_proposta": status_proposta,
+        # Trecho do meio do NFID (busca por substring) e raiz do CNPJ pontuada
+        "busca_nfid": nfid[len(nfid) // 4:len(nfid) // 4 + max(len(nfid) // 2, 3)].lower(),
+        "busca_cnpj": f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}",
+    }
+
+
+# Configuração de sessão: cada comando executado (inclusive os de dentro das
+# funções) tem o plano enviado ao cliente como mensagem de LOG
+AUTO_EXPLAIN_SETTINGS = (
+    "load 'auto_explain'",
+    "set auto_explain.log_min_duration = 0",
+    "set auto_explain.log_analyze = on",
+    "set auto_explain.log_buffers = on",
+    "set auto_explain.log_nested_statements = on",
+    "set auto_explain.log_format = 'json'",
+    "set client_min_messages = 'log'",
+)
+
+AUTO_EXPLAIN_MESSAGE = re.compile(r"duration: ([0-9.]+) ms\s+plan:\s*(\{.*\})\s*$", re.DOTALL)
+
+
+def enable_auto_explain(conn):
+    with conn.cursor() as cur:
+        for statement in AUTO_EXPLAIN_SETTINGS:
+            cur.execute(statement)
+    conn.commit()
+
+
+def _walk(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def run_logged(conn, sql: str, params: dict) -> list[tuple[float, dict]]:
+    """Executa a consulta e devolve (duração em ms, plano JSON) de cada comando registrado.
+
+    Parâmetros entram como literais na chamada; dentro das funções, o plano é
+    o que o Postgres escolhe para o corpo delas. O comando de fora termina
+    por último, então o último plano é o da consulta chamada.
+    """
+    import psycopg
+
+    plans = []
+
+    def on_notice(diagnostic):
+        match = AUTO_EXPLAIN_MESSAGE.match(diagnostic.message_primary or "")
+        if match:
+            plans.append((float(match.group(1)), json.loads(match.group(2))))
+
+    conn.add_notice_handler(on_notice)
+    try:
+        with psycopg.ClientCursor(conn) as cur:
+            cur.execute(sql, params)
+    finally:
+        conn.remove_notice_handler(on_notice)
+    if not plans:
+        raise SystemExit("❌ O auto_explain não enviou planos; confira client_min_messages e o LOAD.")
+    return plans
+
+
+def check(conn, verbose: bool = False) -> list[str]:
+    """Roda todas as formas de consulta; retorna os nomes das que fizeram Seq Scan em `propostas`."""
+    params = query_params(conn)
+    enable_auto_explain(conn)
+    failures = []
+    for name, sql in QUERIES:
+        plans = run_logged(conn, sql, params)
+        nodes = [node for _, plan in plans for node in _walk(plan["Plan"])]
+        seq_scans = [n for n in nodes if n["Node Type"] == "Seq Scan" and n.get("Relation Name") == "propostas"]
+        indexes = sorted({n["Index Name"] for n in nodes if n.get("Index Name")})
+        duration, outer = plans[-1]
+        buffers = outer["Plan"].get("Shared Hit Blocks", 0) + outer["Plan"].get("Shared Read Blocks", 0)
+        status = "❌ SEQ SCAN" if seq_scans else "✅"
+        print(
+            f"{status} {name}: {duration:.1f} ms, {buffers} buffers, {len(plans)} comando(s), "
+            f"índices: {', '.join(indexes) or '—'}"
+        )
+        if verbose:
+            for _, plan in plans:
+                print(plan.get("Query Text", "").strip())
+                print(json.dumps(plan["Plan"], indent=2, ensure_ascii=False, default=str))
+        if seq_scans:
+            failures.append(name)
+        conn.rollback()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Falha se alguma consulta do dashboard fizer Seq Scan em propostas.")
+    parser.add_argument("--dsn", default=os.getenv("CHECK_PLANS_DSN") or os.getenv("DATABASE_URL"))
+    parser.add_argument("--seed", type=int, metavar="LINHAS", help="Cria e popula `propostas` num banco vazio")
+    parser.add_argument("--verbose", action="store_true", help="Imprime o plano completo de cada consulta")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print("❌ Informe --dsn (ou CHECK_PLANS_DSN / DATABASE_URL).")
+        sys.exit(2)
+    try:
+        import psycopg
+    except ImportError:
+        print('❌ Instale o psycopg 3: pip install "psycopg[binary]"')
+        sys.exit(2)
+
+    with psycopg.connect(args.dsn) as conn:
+        if args.seed:
+            print(f"🌱 Gerando {args.seed} operações sintéticas...")
+            seed(conn, args.seed)
+        failures = check(conn, args.verbose)
+
+    if failures:
+        print(f"❌ {len(failures)} consulta(s) com Seq Scan em propostas: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"✅ {len(QUERIES)} consultas sem Seq Scan em propostas")
+
+
+if __name__ == "__main__":
+    main()
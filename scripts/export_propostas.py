@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Exportação de operações (`propostas`) para CSV ou Parquet, em lotes.
+
+Usa a mesma consulta do Explorador do dashboard (RPC `explorer_operacoes`,
+em supabase/explorer_rpc.sql): os filtros vão para o banco e as linhas vêm
+em lotes paginados por chave (data_operacao, id). Cada lote é gravado no
+arquivo assim que chega, então a memória usada não cresce com o período
+exportado.
+
+Uso:
+    python3 scripts/export_propostas.py --inicio 2024-01-01 --fim 2025-12-31 \\
+        [--parceiro NOME ...] [--financiador NOME ...] \\
+        [--status-pagamento STATUS ...] [--status-proposta STATUS ...] \\
+        [--busca TERMO] [--formato csv|parquet] [--saida ARQUIVO] [--lote 1000]
+
+Requer SUPABASE_URL e SUPABASE_ANON_KEY (ou SUPABASE_KEY) no ambiente/.env.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+EXPORT_COLUMNS = [
+    "id",
+    "data_operacao",
+    "nfid",
+    "numero_proposta",
+    "grupo_economico",
+    "razao_social_comprador",
+    "cnpj_comprador",
+    "razao_social_fornecedor",
+    "cnpj_fornecedor",
+    "parceiro",
+    "razao_social_financiador",
+    "valor_bruto_duplicata",
+    "status_pagamento",
+    "status_proposta",
+]
+
+# Lotes acima do max-rows do PostgREST (1000 no Supabase) voltam truncados;
+# o laço só para num lote vazio, então um limite menor no servidor não perde linhas.
+EXPORT_CHUNK_ROWS = 1000
+
+
+def export_params(
+    start: date,
+    end: date,
+    parceiros=(),
+    financiadores=(),
+    status_pagamento=(),
+    status_proposta=(),
+    busca: str = "",
+) -> dict:
+    """Parâmetros de `explorer_operacoes` (listas vazias = sem filtro)."""
+    return {
+        "p_start": start.isoformat(),
+        "p_end": end.isoformat(),
+        "p_parceiros": list(parceiros) or None,
+        "p_financiadores": list(financiadores) or None,
+        "p_status_pagamento": list(status_pagamento) or None,
+        "p_status_proposta": list(status_proposta) or None,
+        "p_busca": busca or None,
+    }
+
+
+def iter_export_chunks(client, params: dict, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Lotes de linhas do recorte, continuando após a última (data_operacao, id) recebida."""
+    cursor = (None, None)
+    while True:
+        response = client.rpc(
+            "explorer_operacoes",
+            {**params, "p_apos_data": cursor[0], "p_apos_id": cursor[1], "p_limite": chunk_rows},
+        ).execute()
+        batch = response.data or []
+        if not batch:
+            return
+        yield batch
+        cursor = (batch[-1]["data_operacao"], batch[-1]["id"])
+
+
+def _chunk_frame(batch: list[dict]) -> pd.DataFrame:
+    df_chunk = pd.DataFrame(batch, columns=EXPORT_COLUMNS)
+    df_chunk["id"] = pd.to_numeric(df_chunk["id"], errors="coerce").astype("Int64")
+    df_chunk["data_operacao"] = pd.to_datetime(df_chunk["data_operacao"], errors="coerce").dt.date
+    df_chunk["valor_bruto_duplicata"] = pd.to_numeric(df_chunk["valor_bruto_duplicata"], errors="coerce")
+    return df_chunk
+
+
+def write_csv(chunks, out) -> int:
+    """Grava os lotes em `out` (caminho ou arquivo binário aberto); retorna o total de linhas."""
+    handle = open(out, "wb") if isinstance(out, (str, os.PathLike)) else out
+    rows = 0
+    try:
+        for batch in chunks:
+            # UTF-8 com BOM no cabeçalho para o Excel reconhecer acentos
+            text = _chunk_frame(batch).to_csv(index=False, header=rows == 0)
+            handle.write(text.encode("utf-8-sig" if rows == 0 else "utf-8"))
+            rows += len(batch)
+    finally:
+        if handle is not out:
+            handle.close()
+    return rows
+
+
+def write_parquet(chunks, out) -> int:
+    """Grava cada lote como um row group do Parquet; retorna o total de linhas."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("data_operacao", pa.date32()),
+            *[(col, pa.string()) for col in EXPORT_COLUMNS[2:11]],
+            ("valor_bruto_duplicata", pa.float64()),
+            ("status_pagamento", pa.string()),
+            ("status_proposta", pa.string()),
+        ]
+    )
+    rows = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for batch in chunks:
+            writer.write_table(pa.Table.from_pandas(_chunk_frame(batch), schema=schema, preserve_index=False))
+            rows += len(batch)
+    return rows
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+def _limit_rows(chunks, max_rows: int):
+    """Corta os lotes em `max_rows` linhas no total."""
+    remaining = max_rows
+    if remaining <= 0:
+        return
+    for batch in chunks:
+        yield batch[:remaining]
+        remaining -= len(batch)
+        if remaining <= 0:
+            # Sem pedir o próximo lote: evita uma chamada extra à RPC
+            return
+
+
+def export_propostas(
+    client,
+    params: dict,
+    out,
+    fmt: str = "csv",
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    max_rows: int | None = None,
+) -> int:
+    """Exporta o recorte de `params` para `out` no formato `fmt`; retorna o total de linhas.
+
+    `max_rows` limita as linhas gravadas (sem limite por padrão).
+    """
+    chunks = iter_export_chunks(client, params, chunk_rows)
+    if max_rows is not None:
+        chunks = _limit_rows(chunks, max_rows)
+    return WRITERS[fmt](chunks, out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta operações filtradas para CSV ou Parquet, em lotes.")
+    parser.add_argument("--inicio", required=True, type=date.fromisoformat, help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--fim", required=True, type=date.fromisoformat, help="Data final (AAAA-MM-DD)")
+    parser.add_argument("--parceiro", action="append", default=[], help="Parceiro (repita para vários)")
+    parser.add_argument("--financiador", action="append", default=[], help="Financiador (repita para vários)")
+    parser.add_argument("--status-pagamento", action="append", default=[], help="Status de pagamento")
+    parser.add_argument("--status-proposta", action="append", default=[], help="Status de proposta")
+    parser.add_argument("--busca", default="", help="Trecho de NFID ou CNPJ")
+    parser.add_argument("--formato", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--saida", help="Arquivo de saída (padrão: propostas_<inicio>_<fim>.<formato>)")
+    parser.add_argument("--lote", type=int, default=EXPORT_CHUNK_ROWS, help="Linhas por requisição")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        print("❌ Defina SUPABASE_URL e SUPABASE_ANON_KEY (ou SUPABASE_KEY).")
+        sys.exit(1)
+
+    out = args.saida or f"propostas_{args.inicio}_{args.fim}.{args.formato}"
+    params = export_params(
+        args.inicio,
+        args.fim,
+        args.parceiro,
+        args.financiador,
+        args.status_pagamento,
+        args.status_proposta,
+        args.busca,
+    )
+
+    print(f"📤 Exportando {args.inicio} — {args.fim} para {out}...")
+    start = time.perf_counter()
+    rows = export_propostas(create_client(url, key), params, out, args.formato, args.lote)
+    print(f"✅ {rows} linhas em {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
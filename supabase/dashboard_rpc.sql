@@ -0,0 +1,188 @@
+-- Agregações server-side para as abas Clientes, Parceiros e Funding do dashboard
+-- Execute este script no Supabase SQL Editor
+--
+-- Todas as funções recebem o mesmo recorte do dashboard:
+--   p_start / p_end        intervalo de data_operacao (inclusivo)
+--   p_parceiros            lista de parceiros (null ou vazia = todos)
+--   p_financiadores        lista de financiadores (null ou vazia = todos)
+-- Parceiro ou financiador nulo aparece nos consolidados e nas opções da
+-- sidebar como "Sem parceiro" / "Sem financiador"; selecionar esse rótulo
+-- inclui as operações com o campo nulo, como nos consolidados.
+-- As funções devolvem apenas as linhas agregadas. São `security invoker`:
+-- a RLS de `propostas` continua valendo para quem chama (anon key do dashboard).
+-- Médias ponderadas usam o valor bruto como peso e ignoram linhas em que o
+-- valor ou o peso são nulos, como `weighted_average` no dashboard.
+
+-- 1. Ranking de grupos econômicos (inclui a última operação para o Health Check)
+create or replace function public.ranking_grupos(
+    p_start date,
+    p_end date,
+    p_parceiros text[] default null,
+    p_financiadores text[] default null
+)
+returns table (
+    grupo_economico text,
+    volume numeric,
+    duplicatas bigint,
+    propostas bigint,
+    ultima_operacao date
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    select
+        p.grupo_economico,
+        coalesce(sum(p.valor_bruto_duplicata), 0) as volume,
+        count(p.nfid) as duplicatas,
+        count(distinct p.numero_proposta) as propostas,
+        max(p.data_operacao)::date as ultima_operacao
+    from public.propostas p
+    where p.data_operacao between p_start and p_end
+      and (coalesce(cardinality(p_parceiros), 0) = 0 or p.parceiro = any(p_parceiros)
+           or (p.parceiro is null and 'Sem parceiro' = any(p_parceiros)))
+      and (coalesce(cardinality(p_financiadores), 0) = 0 or p.razao_social_financiador = any(p_financiadores)
+           or (p.razao_social_financiador is null and 'Sem financiador' = any(p_financiadores)))
+      and p.grupo_economico is not null
+    group by p.grupo_economico
+    order by volume desc;
+$$;
+
+-- 2. Performance por parceiro (canal)
+create or replace function public.parceiros_metrics(
+    p_start date,
+    p_end date,
+    p_parceiros text[] default null,
+    p_financiadores text[] default null
+)
+returns table (
+    parceiro text,
+    volume_bruto numeric,
+    n_compradores bigint,
+    n_propostas bigint,
+    n_duplicatas bigint,
+    prazo_medio_pond numeric,
+    taxa_media_pond numeric
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    select
+        p.parceiro,
+        coalesce(sum(p.valor_bruto_duplicata), 0) as volume_bruto,
+        count(distinct p.cnpj_comprador) as n_compradores,
+        count(distinct p.numero_proposta) as n_propostas,
+        count(p.nfid) as n_duplicatas,
+        sum(p.prazo_medio_operacao * p.valor_bruto_duplicata)
+            / nullif(sum(p.valor_bruto_duplicata) filter (where p.prazo_medio_operacao is not null), 0)
+            as prazo_medio_pond,
+        sum(p.taxa_efetiva_mes_percentual * p.valor_bruto_duplicata)
+            / nullif(sum(p.valor_bruto_duplicata) filter (where p.taxa_efetiva_mes_percentual is not null), 0)
+            as taxa_media_pond
+    from public.propostas p
+    where p.data_operacao between p_start and p_end
+      and (coalesce(cardinality(p_parceiros), 0) = 0 or p.parceiro = any(p_parceiros)
+           or (p.parceiro is null and 'Sem parceiro' = any(p_parceiros)))
+      and (coalesce(cardinality(p_financiadores), 0) = 0 or p.razao_social_financiador = any(p_financiadores)
+           or (p.razao_social_financiador is null and 'Sem financiador' = any(p_financiadores)))
+      and p.parceiro is not null
+    group by p.parceiro
+    order by volume_bruto desc;
+$$;
+
+-- 3. Métricas de funding por financiador
+-- Os pesos (`peso_taxa`, `peso_prazo`) permitem recompor a média geral no cliente.
+create or replace function public.funding_metrics(
+    p_start date,
+    p_end date,
+    p_parceiros text[] default null,
+    p_financiadores text[] default null
+)
+returns table (
+    razao_social_financiador text,
+    volume numeric,
+    duplicatas bigint,
+    taxa_media_ponderada numeric,
+    peso_taxa numeric,
+    prazo_medio_ponderado numeric,
+    peso_prazo numeric
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    select
+        p.razao_social_financiador,
+        coalesce(sum(p.valor_bruto_duplicata), 0) as volume,
+        count(p.nfid) as duplicatas,
+        sum(p.taxa_efetiva_mes_percentual * p.valor_bruto_duplicata)
+            / nullif(sum(p.valor_bruto_duplicata) filter (where p.taxa_efetiva_mes_percentual is not null), 0)
+            as taxa_media_ponderada,
+        sum(p.valor_bruto_duplicata) filter (where p.taxa_efetiva_mes_percentual is not null) as peso_taxa,
+        sum(p.prazo_medio_operacao * p.valor_bruto_duplicata)
+            / nullif(sum(p.valor_bruto_duplicata) filter (where p.prazo_medio_operacao is not null), 0)
+            as prazo_medio_ponderado,
+        sum(p.valor_bruto_duplicata) filter (where p.prazo_medio_operacao is not null) as peso_prazo
+    from public.propostas p
+    where p.data_operacao between p_start and p_end
+      and (coalesce(cardinality(p_parceiros), 0) = 0 or p.parceiro = any(p_parceiros)
+           or (p.parceiro is null and 'Sem parceiro' = any(p_parceiros)))
+      and (coalesce(cardinality(p_financiadores), 0) = 0 or p.razao_social_financiador = any(p_financiadores)
+           or (p.razao_social_financiador is null and 'Sem financiador' = any(p_financiadores)))
+      and p.razao_social_financiador is not null
+    group by p.razao_social_financiador
+    order by volume desc;
+$$;
+
+-- 4. Contagens distintas do recorte (KPIs de sacados, fornecedores e grupos)
+create or replace function public.clientes_resumo(
+    p_start date,
+    p_end date,
+    p_parceiros text[] default null,
+    p_financiadores text[] default null
+)
+returns table (
+    grupos bigint,
+    sacados bigint,
+    fornecedores bigint,
+    financiadores bigint
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    select
+        count(distinct p.grupo_economico) as grupos,
+        count(distinct p.cnpj_comprador) as sacados,
+        count(distinct p.cnpj_fornecedor) as fornecedores,
+        count(distinct p.razao_social_financiador) as financiadores
+    from public.propostas p
+    where p.data_operacao between p_start and p_end
+      and (coalesce(cardinality(p_parceiros), 0) = 0 or p.parceiro = any(p_parceiros)
+           or (p.parceiro is null and 'Sem parceiro' = any(p_parceiros)))
+      and (coalesce(cardinality(p_financiadores), 0) = 0 or p.razao_social_financiador = any(p_financiadores)
+           or (p.razao_social_financiador is null and 'Sem financiador' = any(p_financiadores)));
+$$;
+
+-- 5. Permissões (dashboard usa a anon key; RLS da tabela continua aplicada)
+grant execute on function public.ranking_grupos(date, date, text[], text[]) to anon, authenticated, service_role;
+grant execute on function public.parceiros_metrics(date, date, text[], text[]) to anon, authenticated, service_role;
+grant execute on function public.funding_metrics(date, date, text[], text[]) to anon, authenticated, service_role;
+grant execute on function public.clientes_resumo(date, date, text[], text[]) to anon, authenticated, service_role;
+
+comment on function public.ranking_grupos(date, date, text[], text[]) is
+    'Volume, duplicatas, propostas e última operação por grupo econômico no recorte do dashboard';
+
+comment on function public.parceiros_metrics(date, date, text[], text[]) is
+    'Volume, sacados, propostas, duplicatas e médias ponderadas (prazo, taxa) por parceiro';
+
+comment on function public.funding_metrics(date, date, text[], text[]) is
+    'Volume e médias ponderadas de taxa efetiva e prazo por financiador, com os pesos de cada média';
+
+comment on function public.clientes_resumo(date, date, text[], text[]) is
+    'Contagens distintas de grupos, sacados, fornecedores e financiadores no recorte do dashboard';
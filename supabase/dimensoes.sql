@@ -0,0 +1,119 @@
+-- Tabelas de dimensão para as opções da sidebar do dashboard
+-- Execute este script no Supabase SQL Editor (depois de propostas_resumo_mensal.sql)
+--
+-- Cada tabela guarda os valores distintos de uma dimensão com a primeira e a
+-- última competência em que aparecem. O ETL chama `refresh_dimensoes()` após
+-- atualizar o consolidado mensal; o dashboard lê cada tabela com uma única
+-- requisição, sem baixar a view mensal inteira na abertura.
+
+-- 1. Tabelas
+create table if not exists public.dim_parceiros (
+    nome text primary key,
+    primeira_competencia date not null,
+    ultima_competencia date not null
+);
+
+create table if not exists public.dim_financiadores (
+    nome text primary key,
+    primeira_competencia date not null,
+    ultima_competencia date not null
+);
+
+create table if not exists public.dim_grupos_economicos (
+    nome text primary key,
+    primeira_competencia date not null,
+    ultima_competencia date not null
+);
+
+-- campo: 'status_pagamento' ou 'status_proposta'
+create table if not exists public.dim_status (
+    campo text not null,
+    nome text not null,
+    primeira_competencia date not null,
+    ultima_competencia date not null,
+    primary key (campo, nome)
+);
+
+-- 2. Leitura pública (mesma política de `propostas`); escrita só via service_role
+alter table public.dim_parceiros enable row level security;
+alter table public.dim_financiadores enable row level security;
+alter table public.dim_grupos_economicos enable row level security;
+alter table public.dim_status enable row level security;
+
+drop policy if exists "Permitir leitura pública" on public.dim_parceiros;
+create policy "Permitir leitura pública" on public.dim_parceiros for select using (true);
+drop policy if exists "Permitir leitura pública" on public.dim_financiadores;
+create policy "Permitir leitura pública" on public.dim_financiadores for select using (true);
+drop policy if exists "Permitir leitura pública" on public.dim_grupos_economicos;
+create policy "Permitir leitura pública" on public.dim_grupos_economicos for select using (true);
+drop policy if exists "Permitir leitura pública" on public.dim_status;
+create policy "Permitir leitura pública" on public.dim_status for select using (true);
+
+grant select on public.dim_parceiros, public.dim_financiadores,
+    public.dim_grupos_economicos, public.dim_status to anon, authenticated, service_role;
+
+-- 3. Recalcula as dimensões
+-- Parceiros, financiadores e grupos vêm do consolidado mensal (já agregado e com
+-- os mesmos rótulos "Sem ..." usados nos filtros); status vêm de `propostas`.
+create or replace function public.refresh_dimensoes()
+returns json
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    delete from public.dim_parceiros;
+    insert into public.dim_parceiros (nome, primeira_competencia, ultima_competencia)
+    select parceiro, min(competencia)::date, max(competencia)::date
+    from public.propostas_resumo_mensal_agg
+    group by parceiro;
+
+    delete from public.dim_financiadores;
+    insert into public.dim_financiadores (nome, primeira_competencia, ultima_competencia)
+    select razao_social_financiador, min(competencia)::date, max(competencia)::date
+    from public.propostas_resumo_mensal_agg
+    group by razao_social_financiador;
+
+    delete from public.dim_grupos_economicos;
+    insert into public.dim_grupos_economicos (nome, primeira_competencia, ultima_competencia)
+    select grupo_economico, min(competencia)::date, max(competencia)::date
+    from public.propostas_resumo_mensal_agg
+    group by grupo_economico;
+
+    delete from public.dim_status;
+    insert into public.dim_status (campo, nome, primeira_competencia, ultima_competencia)
+    select 'status_pagamento', status_pagamento,
+           min(date_trunc('month', data_operacao))::date, max(date_trunc('month', data_operacao))::date
+    from public.propostas
+    where status_pagamento is not null and data_operacao is not null
+    group by status_pagamento
+    union all
+    select 'status_proposta', status_proposta,
+           min(date_trunc('month', data_operacao))::date, max(date_trunc('month', data_operacao))::date
+    from public.propostas
+    where status_proposta is not null and data_operacao is not null
+    group by status_proposta;
+
+    return json_build_object(
+        'status', 'ok',
+        'refreshed_at', now()
+    );
+end;
+$$;
+
+revoke execute on function public.refresh_dimensoes() from public, anon, authenticated;
+grant execute on function public.refresh_dimensoes() to service_role;
+
+-- 4. Carga inicial
+select public.refresh_dimensoes();
+
+comment on table public.dim_parceiros is
+    'Parceiros distintos com primeira/última competência; mantida por refresh_dimensoes()';
+comment on table public.dim_financiadores is
+    'Financiadores distintos com primeira/última competência; mantida por refresh_dimensoes()';
+comment on table public.dim_grupos_economicos is
+    'Grupos econômicos distintos com primeira/última competência; mantida por refresh_dimensoes()';
+comment on table public.dim_status is
+    'Valores distintos de status_pagamento e status_proposta com primeira/última competência';
+comment on function public.refresh_dimensoes() is
+    'Recalcula as tabelas de dimensão do dashboard; chamada pelo ETL após refresh_propostas_resumo_mensal()';
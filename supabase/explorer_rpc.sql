@@ -0,0 +1,168 @@
+-- Consulta server-side do Explorador Operacional do dashboard
+-- Execute este script no Supabase SQL Editor
+--
+-- Os filtros do Explorador (período local, parceiros/financiadores globais,
+-- status e busca por NFID/CNPJ) são aplicados no banco. O dashboard recebe
+-- uma página de linhas e os totais do recorte, em vez de carregar a janela
+-- inteira e descartar tudo além das 500 primeiras linhas.
+--
+-- Paginação por chave: as linhas saem em ordem (data_operacao desc, id desc);
+-- a próxima página começa depois da última linha recebida
+-- (p_apos_data, p_apos_id), sem OFFSET.
+--
+-- Busca (p_busca): NFID contém o termo (sem diferenciar caixa); CNPJ contém
+-- os dígitos do termo, com ou sem pontuação. Termos com letras não são
+-- comparados aos CNPJs, como na busca local do dashboard.
+
+-- 1. Índices de trigramas para a busca por substring
+create extension if not exists pg_trgm;
+
+create index if not exists idx_propostas_nfid_trgm
+    on public.propostas using gin (nfid gin_trgm_ops);
+create index if not exists idx_propostas_cnpj_comprador_digitos_trgm
+    on public.propostas using gin ((regexp_replace(cnpj_comprador, '\D', '', 'g')) gin_trgm_ops);
+create index if not exists idx_propostas_cnpj_fornecedor_digitos_trgm
+    on public.propostas using gin ((regexp_replace(cnpj_fornecedor, '\D', '', 'g')) gin_trgm_ops);
+
+-- Ordem da paginação
+create index if not exists idx_propostas_data_operacao_id
+    on public.propostas (data_operacao desc, id desc);
+
+-- 2. Página de operações
+create or replace function public.explorer_operacoes(
+    p_start date,
+    p_end date,
+    p_parceiros text[] default null,
+    p_financiadores text[] default null,
+    p_status_pagamento text[] default null,
+    p_status_proposta text[] default null,
+    p_busca text default null,
+    p_apos_data date default null,
+    p_apos_id bigint default null,
+    p_limite integer default 500
+)
+returns table (
+    id bigint,
+    data_operacao date,
+    nfid text,
+    numero_proposta text,
+    grupo_economico text,
+    razao_social_comprador text,
+    cnpj_comprador text,
+    razao_social_fornecedor text,
+    cnpj_fornecedor text,
+    parceiro text,
+    razao_social_financiador text,
+    valor_bruto_duplicata numeric,
+    status_pagamento text,
+    status_proposta text
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    with termo as (
+        select
+            '%' || replace(replace(replace(btrim(p_busca), '\', '\\'), '%', '\%'), '_', '\_') || '%' as nfid_like,
+            case
+                when btrim(p_busca) ~ '^[0-9./ -]+$' and regexp_replace(p_busca, '\D', '', 'g') <> ''
+                then '%' || regexp_replace(p_busca, '\D', '', 'g') || '%'
+            end as cnpj_like
+    )
+    select
+        p.id::bigint,
+        p.data_operacao::date,
+        p.nfid,
+        p.numero_proposta,
+        p.grupo_economico,
+        p.razao_social_comprador,
+        p.cnpj_comprador,
+        p.razao_social_fornecedor,
+        p.cnpj_fornecedor,
+        p.parceiro,
+        p.razao_social_financiador,
+        p.valor_bruto_duplicata,
+        p.status_pagamento,
+        p.status_proposta
+    from public.propostas p, termo t
+    where p.data_operacao between p_start and p_end
+      and (coalesce(cardinality(p_parceiros), 0) = 0 or p.parceiro = any(p_parceiros)
+           or (p.parceiro is null and 'Sem parceiro' = any(p_parceiros)))
+      and (coalesce(cardinality(p_financiadores), 0) = 0 or p.razao_social_financiador = any(p_financiadores)
+           or (p.razao_social_financiador is null and 'Sem financiador' = any(p_financiadores)))
+      and (coalesce(cardinality(p_status_pagamento), 0) = 0 or p.status_pagamento = any(p_status_pagamento))
+      and (coalesce(cardinality(p_status_proposta), 0) = 0 or p.status_proposta = any(p_status_proposta))
+      and (
+          coalesce(btrim(p_busca), '') = ''
+          or p.nfid ilike t.nfid_like
+          or regexp_replace(p.cnpj_comprador, '\D', '', 'g') like t.cnpj_like
+          or regexp_replace(p.cnpj_fornecedor, '\D', '', 'g') like t.cnpj_like
+      )
+      and (
+          p_apos_data is null
+          or (p.data_operacao, p.id) < (p_apos_data, p_apos_id)
+      )
+    order by p.data_operacao desc, p.id desc
+    limit greatest(least(p_limite, 5000), 1);
+$$;
+
+-- 3. Totais do recorte (independentes da página)
+create or replace function public.explorer_totais(
+    p_start date,
+    p_end date,
+    p_parceiros text[] default null,
+    p_financiadores text[] default null,
+    p_status_pagamento text[] default null,
+    p_status_proposta text[] default null,
+    p_busca text default null
+)
+returns table (
+    volume_bruto numeric,
+    linhas bigint,
+    propostas bigint
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    with termo as (
+        select
+            '%' || replace(replace(replace(btrim(p_busca), '\', '\\'), '%', '\%'), '_', '\_') || '%' as nfid_like,
+            case
+                when btrim(p_busca) ~ '^[0-9./ -]+$' and regexp_replace(p_busca, '\D', '', 'g') <> ''
+                then '%' || regexp_replace(p_busca, '\D', '', 'g') || '%'
+            end as cnpj_like
+    )
+    select
+        coalesce(sum(p.valor_bruto_duplicata), 0) as volume_bruto,
+        count(*) as linhas,
+        count(distinct p.numero_proposta) as propostas
+    from public.propostas p, termo t
+    where p.data_operacao between p_start and p_end
+      and (coalesce(cardinality(p_parceiros), 0) = 0 or p.parceiro = any(p_parceiros)
+           or (p.parceiro is null and 'Sem parceiro' = any(p_parceiros)))
+      and (coalesce(cardinality(p_financiadores), 0) = 0 or p.razao_social_financiador = any(p_financiadores)
+           or (p.razao_social_financiador is null and 'Sem financiador' = any(p_financiadores)))
+      and (coalesce(cardinality(p_status_pagamento), 0) = 0 or p.status_pagamento = any(p_status_pagamento))
+      and (coalesce(cardinality(p_status_proposta), 0) = 0 or p.status_proposta = any(p_status_proposta))
+      and (
+          coalesce(btrim(p_busca), '') = ''
+          or p.nfid ilike t.nfid_like
+          or regexp_replace(p.cnpj_comprador, '\D', '', 'g') like t.cnpj_like
+          or regexp_replace(p.cnpj_fornecedor, '\D', '', 'g') like t.cnpj_like
+      );
+$$;
+
+-- 4. Permissões (dashboard usa a anon key; RLS da tabela continua aplicada)
+grant execute on function public.explorer_operacoes(date, date, text[], text[], text[], text[], text, date, bigint, integer)
+    to anon, authenticated, service_role;
+grant execute on function public.explorer_totais(date, date, text[], text[], text[], text[], text)
+    to anon, authenticated, service_role;
+
+comment on function public.explorer_operacoes(date, date, text[], text[], text[], text[], text, date, bigint, integer) is
+    'Página de operações do Explorador (ordem data_operacao desc, id desc), continuando após (p_apos_data, p_apos_id)';
+
+comment on function public.explorer_totais(date, date, text[], text[], text[], text[], text) is
+    'Volume bruto, linhas e propostas distintas do recorte do Explorador';
@@ -0,0 +1,55 @@
+-- Índices de `propostas` para as consultas do dashboard
+-- Execute este script no Supabase SQL Editor
+--
+-- A tabela só tinha índices de uma coluna (nfid, numero_proposta,
+-- cnpj_comprador, data_operacao). As consultas do dashboard têm três formas:
+--   1. Operações do período (load_base_data sem o Parquet local): intervalo de
+--      data_operacao, projeção BASE_COLUMNS, paginação por (data_operacao, id).
+--   2. Sincronização incremental do Parquet local: updated_at >= marca d'água,
+--      paginação por id.
+--   3. Agregações (dashboard_rpc.sql), Explorador e consolidados: intervalo de
+--      data_operacao com parceiro / financiador = any(...).
+--
+-- Para conferir os planos num Postgres local com dados sintéticos:
+--   python3 scripts/check_query_plans.py --dsn postgresql://localhost/bi --seed 300000
+
+-- 1. Forma 1: a chave de paginação (data_operacao, id). Mesmo índice do
+-- Explorador (supabase/explorer_rpc.sql); a varredura para trás atende a ordem
+-- crescente do keyset. As demais colunas de BASE_COLUMNS vêm da tabela.
+--
+-- Não há INCLUDE com BASE_COLUMNS: um índice de cobertura repetiria quase a
+-- tabela inteira, e o ETL regrava essas colunas em todo upsert de linha
+-- alterada. Com elas no índice nenhum update seria HOT, e escrita e espaço
+-- em disco praticamente dobrariam. Os planos conferidos por
+-- scripts/check_query_plans.py só exigem que não haja Seq Scan em
+-- `propostas`; um Index Scan neste índice basta.
+create index if not exists idx_propostas_data_operacao_id
+    on public.propostas (data_operacao desc, id desc);
+
+-- Instalações anteriores: índice de cobertura substituído pelo de cima
+drop index if exists public.idx_propostas_data_operacao_cobertura;
+
+-- O índice simples de data fica contido no de paginação
+drop index if exists public.idx_propostas_data_operacao;
+
+-- 2. Forma 2: linhas alteradas desde a última sincronização
+create index if not exists idx_propostas_updated_at
+    on public.propostas (updated_at);
+
+-- 3. Forma 3: parceiro ou financiador selecionado na sidebar + intervalo de datas
+create index if not exists idx_propostas_parceiro_data
+    on public.propostas (parceiro, data_operacao);
+create index if not exists idx_propostas_financiador_data
+    on public.propostas (razao_social_financiador, data_operacao);
+
+-- 4. Estatísticas atualizadas para o planejador
+analyze public.propostas;
+
+comment on index public.idx_propostas_data_operacao_id is
+    'Período + paginação por chave (data_operacao, id) do dashboard e do Explorador';
+comment on index public.idx_propostas_updated_at is
+    'Sincronização incremental do cache local do dashboard (updated_at >= marca d''água)';
+comment on index public.idx_propostas_parceiro_data is
+    'Agregações do dashboard filtradas por parceiro no período';
+comment on index public.idx_propostas_financiador_data is
+    'Agregações do dashboard filtradas por financiador no período';
@@ -0,0 +1,228 @@
+-- Consolidado diário para os KPIs do dashboard em qualquer intervalo de datas
+-- Execute este script no Supabase SQL Editor (depois de propostas_resumo_mensal.sql)
+--
+-- Mesmas dimensões do consolidado mensal, com o dia da operação. O seletor de
+-- datas do dashboard aceita intervalos por dia; com esta tabela os KPIs da
+-- Visão Geral (VOP, receita, duplicatas, taxa e prazo ponderados) saem de
+-- linhas já agregadas em vez das operações brutas.
+--
+-- Médias ponderadas ficam como componentes aditivos: taxa_x_bruto / peso_taxa
+-- e prazo_x_bruto / peso_prazo. Somados em qualquer recorte (dias, parceiros,
+-- financiadores), dão a média exata ponderada pelo valor bruto, como em
+-- `weighted_average` no dashboard.
+--
+-- Contagens distintas não se somam entre linhas. Cada linha guarda um sketch
+-- HyperLogLog (extensão postgresql-hll) de sacados, fornecedores e propostas;
+-- a união dos sketches (`hll_union_agg`) em qualquer recorte estima a
+-- contagem distinta (`resumo_diario_distintos`). Conjuntos pequenos ficam na
+-- representação explícita do hll e saem exatos; nos grandes o erro típico é
+-- de ~2% (log2m = 11, o padrão). Os sketches ficam no consolidado diário, e
+-- não no mensal, porque o seletor de datas do dashboard é por dia: um sketch
+-- mensal contaria chaves de fora do intervalo nos meses parciais.
+--
+-- Os triggers de `propostas` (supabase/propostas_resumo_mensal.sql) anotam as
+-- competências tocadas em `propostas_resumo_diario_pendentes`, uma fila
+-- separada da do consolidado mensal; refresh_propostas_resumo_diario() retira
+-- da fila e recalcula esses meses na mesma transação. Se o refresh falhar, os
+-- meses continuam na fila para a próxima execução do ETL.
+
+-- 1. Tabela
+create extension if not exists hll;
+
+create table if not exists public.propostas_resumo_diario (
+    dia date not null,
+    competencia date not null,
+    grupo_economico text not null,
+    razao_social_comprador text not null,
+    parceiro text not null,
+    razao_social_financiador text not null,
+
+    quantidade_operacoes bigint not null,
+    total_bruto_duplicata numeric(18,2) not null,
+    total_liquido_duplicata numeric(18,2) not null,
+    total_receita_cashforce numeric(18,2) not null,
+
+    -- Componentes das médias ponderadas pelo valor bruto
+    taxa_x_bruto numeric not null,
+    peso_taxa numeric not null,
+    prazo_x_bruto numeric not null,
+    peso_prazo numeric not null,
+
+    -- Sketches das chaves distintas (mescláveis entre dias e dimensões)
+    sacados_hll hll not null default hll_empty(),
+    fornecedores_hll hll not null default hll_empty(),
+    propostas_hll hll not null default hll_empty(),
+
+    primary key (dia, grupo_economico, razao_social_comprador, parceiro, razao_social_financiador)
+);
+
+-- Instalações anteriores: troca as listas exatas de chaves (text[]) pelos
+-- sketches (a carga do passo 5 preenche os valores)
+alter table public.propostas_resumo_diario
+    drop column if exists sacados,
+    drop column if exists fornecedores,
+    drop column if exists propostas,
+    add column if not exists sacados_hll hll not null default hll_empty(),
+    add column if not exists fornecedores_hll hll not null default hll_empty(),
+    add column if not exists propostas_hll hll not null default hll_empty();
+
+create index if not exists propostas_resumo_diario_competencia_idx
+    on public.propostas_resumo_diario (competencia);
+
+-- 2. Leitura pública; escrita só via service_role
+alter table public.propostas_resumo_diario enable row level security;
+
+drop policy if exists "Permitir leitura pública" on public.propostas_resumo_diario;
+create policy "Permitir leitura pública" on public.propostas_resumo_diario for select using (true);
+
+grant select on public.propostas_resumo_diario to anon, authenticated, service_role;
+
+-- 3. Recalcula as competências pendentes (e as informadas em p_competencias)
+create or replace function public.refresh_propostas_resumo_diario(p_competencias date[] default null)
+returns json
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    meses date[];
+begin
+    insert into public.propostas_resumo_diario_pendentes (competencia)
+    select distinct date_trunc('month', c)::date
+    from unnest(p_competencias) as c
+    where c is not null
+    order by 1
+    on conflict (competencia) do nothing;
+
+    -- Mesma estratégia do consolidado mensal: a fila é esvaziada na
+    -- transação do recálculo, então uma falha devolve os meses à fila
+    with fila as (
+        delete from public.propostas_resumo_diario_pendentes
+        returning competencia
+    )
+    select coalesce(array_agg(competencia order by competencia), '{}')
+    into meses
+    from fila;
+
+    if cardinality(meses) > 0 then
+        delete from public.propostas_resumo_diario
+        where competencia = any(meses);
+
+        insert into public.propostas_resumo_diario (
+            dia, competencia, grupo_economico, razao_social_comprador, parceiro, razao_social_financiador,
+            quantidade_operacoes, total_bruto_duplicata, total_liquido_duplicata, total_receita_cashforce,
+            taxa_x_bruto, peso_taxa, prazo_x_bruto, peso_prazo,
+            sacados_hll, fornecedores_hll, propostas_hll
+        )
+        select
+            p.data_operacao::date as dia,
+            m.competencia,
+            coalesce(p.grupo_economico, 'Sem grupo') as grupo_economico,
+            coalesce(p.razao_social_comprador, 'Sem comprador') as razao_social_comprador,
+            coalesce(p.parceiro, 'Sem parceiro') as parceiro,
+            coalesce(p.razao_social_financiador, 'Sem financiador') as razao_social_financiador,
+
+            count(*) as quantidade_operacoes,
+            coalesce(sum(p.valor_bruto_duplicata), 0)::numeric(18,2) as total_bruto_duplicata,
+            coalesce(sum(p.valor_liquido_duplicata), 0)::numeric(18,2) as total_liquido_duplicata,
+            coalesce(sum(p.receita_cashforce), 0)::numeric(18,2) as total_receita_cashforce,
+
+            coalesce(sum(p.taxa_efetiva_mes_percentual * p.valor_bruto_duplicata), 0) as taxa_x_bruto,
+            coalesce(sum(p.valor_bruto_duplicata) filter (where p.taxa_efetiva_mes_percentual is not null), 0) as peso_taxa,
+            coalesce(sum(p.prazo_medio_operacao * p.valor_bruto_duplicata), 0) as prazo_x_bruto,
+            coalesce(sum(p.valor_bruto_duplicata) filter (where p.prazo_medio_operacao is not null), 0) as peso_prazo,
+
+            coalesce(hll_add_agg(hll_hash_text(p.cnpj_comprador)) filter (where p.cnpj_comprador is not null), hll_empty()) as sacados_hll,
+            coalesce(hll_add_agg(hll_hash_text(p.cnpj_fornecedor)) filter (where p.cnpj_fornecedor is not null), hll_empty()) as fornecedores_hll,
+            coalesce(hll_add_agg(hll_hash_text(p.numero_proposta)) filter (where p.numero_proposta is not null), hll_empty()) as propostas_hll
+        from unnest(meses) as m(competencia)
+        join public.propostas p
+          on p.data_operacao >= m.competencia
+         and p.data_operacao < m.competencia + interval '1 month'
+        group by 1, 2, 3, 4, 5, 6;
+    end if;
+
+    return json_build_object(
+        'status', 'ok',
+        'competencias', to_json(meses),
+        'refreshed_at', now()
+    );
+end;
+$$;
+
+-- Reconstrução completa (carga inicial ou correção manual)
+create or replace function public.rebuild_propostas_resumo_diario()
+returns json
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    delete from public.propostas_resumo_diario;
+
+    insert into public.propostas_resumo_diario_pendentes (competencia)
+    select distinct date_trunc('month', data_operacao::date)::date
+    from public.propostas
+    where data_operacao is not null
+    on conflict (competencia) do nothing;
+
+    return public.refresh_propostas_resumo_diario();
+end;
+$$;
+
+revoke execute on function public.refresh_propostas_resumo_diario(date[]) from public, anon, authenticated;
+grant execute on function public.refresh_propostas_resumo_diario(date[]) to service_role;
+revoke execute on function public.rebuild_propostas_resumo_diario() from public, anon, authenticated;
+grant execute on function public.rebuild_propostas_resumo_diario() to service_role;
+
+-- 4. Contagens distintas do recorte a partir dos sketches de cada linha
+-- Mesmas colunas de `clientes_resumo` (supabase/dashboard_rpc.sql), mais
+-- propostas; os rótulos "Sem ..." das dimensões não contam como valor.
+-- Grupos e financiadores são dimensões da tabela e saem exatos; sacados,
+-- fornecedores e propostas são estimativas da união dos sketches.
+create or replace function public.resumo_diario_distintos(
+    p_start date,
+    p_end date,
+    p_parceiros text[] default null,
+    p_financiadores text[] default null
+)
+returns table (
+    grupos bigint,
+    sacados bigint,
+    fornecedores bigint,
+    financiadores bigint,
+    propostas bigint
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    with recorte as (
+        select d.*
+        from public.propostas_resumo_diario d
+        where d.dia between p_start and p_end
+          and (coalesce(cardinality(p_parceiros), 0) = 0 or d.parceiro = any(p_parceiros))
+          and (coalesce(cardinality(p_financiadores), 0) = 0 or d.razao_social_financiador = any(p_financiadores))
+    )
+    select
+        (select count(distinct r.grupo_economico) from recorte r where r.grupo_economico <> 'Sem grupo'),
+        (select coalesce(round(hll_cardinality(hll_union_agg(r.sacados_hll))), 0)::bigint from recorte r),
+        (select coalesce(round(hll_cardinality(hll_union_agg(r.fornecedores_hll))), 0)::bigint from recorte r),
+        (select count(distinct r.razao_social_financiador) from recorte r where r.razao_social_financiador <> 'Sem financiador'),
+        (select coalesce(round(hll_cardinality(hll_union_agg(r.propostas_hll))), 0)::bigint from recorte r);
+$$;
+
+grant execute on function public.resumo_diario_distintos(date, date, text[], text[]) to anon, authenticated, service_role;
+
+-- 5. Carga inicial
+select public.rebuild_propostas_resumo_diario();
+
+comment on table public.propostas_resumo_diario is
+    'Consolidado diário por grupo, comprador, parceiro e financiador, com componentes aditivos das médias ponderadas';
+comment on function public.refresh_propostas_resumo_diario(date[]) is
+    'Recalcula em propostas_resumo_diario só as competências pendentes (e as informadas); chamada pelo ETL';
+comment on function public.rebuild_propostas_resumo_diario() is
+    'Recalcula todas as competências de propostas_resumo_diario';
+comment on function public.resumo_diario_distintos(date, date, text[], text[]) is
+    'Grupos, sacados, fornecedores, financiadores e propostas distintos no recorte; os três últimos estimados pela união dos sketches hll do consolidado diário';
@@ -1,93 +1,293 @@
--- Consolidated monthly view + materialized view + refresh helper
--- Execute this script no Supabase SQL Editor
+-- Consolidado mensal incremental + view + refresh helper
+-- Execute este script no Supabase SQL Editor
+--
+-- O consolidado fica numa tabela (`propostas_resumo_mensal_agg`) com a mesma
+-- chave da antiga materialized view. Triggers de statement em `propostas`
+-- anotam as competências tocadas por cada insert/update/delete numa fila
+-- (`propostas_resumo_mensal_pendentes`); `refresh_propostas_resumo_mensal()`
+-- recalcula só essas competências. O custo do refresh acompanha o tamanho do
+-- lote do ETL, não o tamanho do histórico.
+--
+-- `taxa_efetiva_media` e `prazo_medio` são médias simples de cada linha e não
+-- se combinam entre linhas. Para médias ponderadas pelo valor bruto em
+-- qualquer agrupamento (meses, parceiros, financiadores), use os componentes
+-- aditivos: sum(taxa_x_bruto) / sum(peso_taxa) e sum(prazo_x_bruto) / sum(peso_prazo).
 
 -- Garantir que a versão antiga seja removida (evita falta de colunas novas)
 drop view if exists public.propostas_resumo_mensal cascade;
 drop materialized view if exists public.propostas_resumo_mensal_mv cascade;
+drop function if exists public.refresh_propostas_resumo_mensal();
 
--- 1. Materialized view com agregações mensais
-create materialized view if not exists public.propostas_resumo_mensal_mv as
-select
-    date_trunc('month', data_operacao::date) as competencia,
-    to_char(date_trunc('month', data_operacao::date), 'YYYY-MM') as competencia_id,
-    extract(year from data_operacao::date)::int as ano,
-    extract(month from data_operacao::date)::int as mes,
-    coalesce(grupo_economico, 'Sem grupo') as grupo_economico,
-    coalesce(razao_social_comprador, 'Sem comprador') as razao_social_comprador,
-    coalesce(parceiro, 'Sem parceiro') as parceiro,
-    coalesce(razao_social_financiador, 'Sem financiador') as razao_social_financiador, -- NOVA COLUNA
+-- 1. Tabela com agregações mensais
+create table if not exists public.propostas_resumo_mensal_agg (
+    competencia date not null,
+    competencia_id text not null,
+    ano int not null,
+    mes int not null,
+    grupo_economico text not null,
+    razao_social_comprador text not null,
+    parceiro text not null,
+    razao_social_financiador text not null,
 
     -- Contagens e KPIs
-    count(*) as quantidade_operacoes, -- Equivale a "# Operações"
-    coalesce(count(distinct nfid), 0)::int as total_nf_transportadas, -- NOVO KPI
-    coalesce(count(distinct cnpj_comprador), 0)::int as total_sacados, -- NOVO KPI
-    coalesce(count(distinct cnpj_fornecedor), 0)::int as total_fornecedores, -- NOVO KPI
+    quantidade_operacoes bigint not null,
+    total_nf_transportadas int not null,
+    total_sacados int not null,
+    total_fornecedores int not null,
 
     -- Valores
-    coalesce(sum(valor_bruto_duplicata), 0)::numeric(18,2) as total_bruto_duplicata,
-    coalesce(sum(valor_liquido_duplicata), 0)::numeric(18,2) as total_liquido_duplicata,
-    coalesce(sum(receita_cashforce), 0)::numeric(18,2) as total_receita_cashforce,
-    coalesce(count(distinct numero_proposta), 0)::int as total_propostas,
+    total_bruto_duplicata numeric(18,2) not null,
+    total_liquido_duplicata numeric(18,2) not null,
+    total_receita_cashforce numeric(18,2) not null,
+    total_propostas int not null,
 
-    -- Médias (Novos KPIs)
-    coalesce(avg(taxa_efetiva_mes_percentual), 0)::numeric(8,4) as taxa_efetiva_media,
-    coalesce(avg(prazo_medio_operacao), 0)::numeric(10,2) as prazo_medio
+    -- Médias
+    taxa_efetiva_media numeric(8,4) not null,
+    prazo_medio numeric(10,2) not null,
 
-from public.propostas
-where data_operacao is not null
-group by 1,2,3,4,5,6,7,8 -- ADICIONADO CAMPO 8
-with no data;
+    -- Componentes das médias ponderadas pelo valor bruto
+    taxa_x_bruto numeric not null default 0,
+    peso_taxa numeric not null default 0,
+    prazo_x_bruto numeric not null default 0,
+    peso_prazo numeric not null default 0,
 
--- 2. Índices para suportar refresh concorrente e filtros
-create unique index if not exists propostas_resumo_mensal_mv_uq
-    on public.propostas_resumo_mensal_mv (competencia_id, grupo_economico, razao_social_comprador, parceiro, razao_social_financiador);
+    primary key (competencia_id, grupo_economico, razao_social_comprador, parceiro, razao_social_financiador)
+);
 
-create index if not exists propostas_resumo_mensal_mv_competencia_idx
-    on public.propostas_resumo_mensal_mv (competencia desc);
+-- Instalações anteriores à inclusão dos componentes ponderados
+-- (a reconstrução no passo 6 preenche os valores)
+alter table public.propostas_resumo_mensal_agg
+    add column if not exists taxa_x_bruto numeric not null default 0,
+    add column if not exists peso_taxa numeric not null default 0,
+    add column if not exists prazo_x_bruto numeric not null default 0,
+    add column if not exists peso_prazo numeric not null default 0;
 
--- 3. Atualiza dados iniciais (executado somente na primeira vez)
-refresh materialized view public.propostas_resumo_mensal_mv;
+create index if not exists propostas_resumo_mensal_agg_competencia_idx
+    on public.propostas_resumo_mensal_agg (competencia desc);
 
--- 4. View utilizada pelo PostgREST (security_invoker garante RLS da base)
-create or replace view public.propostas_resumo_mensal
-with (security_invoker = true) as
-select * from public.propostas_resumo_mensal_mv;
+-- 2. Fila de competências a recalcular (primeiro dia do mês)
+create table if not exists public.propostas_resumo_mensal_pendentes (
+    competencia date primary key,
+    marcada_em timestamptz not null default now()
+);
 
--- 5. Garantir RLS/autorizações (tabela já deve ter RLS habilitado)
-grant select on public.propostas_resumo_mensal_mv to anon, authenticated, service_role;
-grant select on public.propostas_resumo_mensal to anon, authenticated, service_role;
+-- Fila própria do consolidado diário (supabase/propostas_resumo_diario.sql),
+-- alimentada pelos mesmos triggers: cada consolidado retira da sua fila só
+-- os meses que recalculou, e uma falha em um não descarta os meses do outro.
+create table if not exists public.propostas_resumo_diario_pendentes (
+    competencia date primary key,
+    marcada_em timestamptz not null default now()
+);
+
+-- 3. Triggers de statement: cada comando em `propostas` anota, uma vez, as
+-- competências das linhas novas e antigas (transition tables). Os lotes do
+-- ETL rodam em paralelo; inserir os meses em ordem faz todos travarem as
+-- chaves da fila na mesma sequência e evita deadlock (40P01) entre lotes
+-- com competências em comum.
+create or replace function public.marcar_competencias_pendentes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    meses date[];
+begin
+    if tg_op = 'INSERT' then
+        select array_agg(distinct date_trunc('month', data_operacao::date)::date)
+        into meses
+        from novas
+        where data_operacao is not null;
+    elsif tg_op = 'DELETE' then
+        select array_agg(distinct date_trunc('month', data_operacao::date)::date)
+        into meses
+        from antigas
+        where data_operacao is not null;
+    else
+        select array_agg(distinct date_trunc('month', t.data_operacao::date)::date)
+        into meses
+        from (
+            select data_operacao from novas
+            union all
+            select data_operacao from antigas
+        ) as t
+        where t.data_operacao is not null;
+    end if;
+
+    if coalesce(cardinality(meses), 0) = 0 then
+        return null;
+    end if;
+
+    insert into public.propostas_resumo_mensal_pendentes (competencia)
+    select m from unnest(meses) as m
+    order by 1
+    on conflict (competencia) do nothing;
 
--- 6. Função helper para refrescar a view após o ETL
-create or replace function public.refresh_propostas_resumo_mensal()
+    insert into public.propostas_resumo_diario_pendentes (competencia)
+    select m from unnest(meses) as m
+    order by 1
+    on conflict (competencia) do nothing;
+
+    return null;
+end;
+$$;
+
+-- Transition tables exigem um trigger por evento
+drop trigger if exists propostas_resumo_mensal_insert on public.propostas;
+create trigger propostas_resumo_mensal_insert
+    after insert on public.propostas
+    referencing new table as novas
+    for each statement execute function public.marcar_competencias_pendentes();
+
+drop trigger if exists propostas_resumo_mensal_update on public.propostas;
+create trigger propostas_resumo_mensal_update
+    after update on public.propostas
+    referencing old table as antigas new table as novas
+    for each statement execute function public.marcar_competencias_pendentes();
+
+drop trigger if exists propostas_resumo_mensal_delete on public.propostas;
+create trigger propostas_resumo_mensal_delete
+    after delete on public.propostas
+    referencing old table as antigas
+    for each statement execute function public.marcar_competencias_pendentes();
+
+-- 4. Recalcula as competências pendentes (e as informadas em p_competencias)
+create or replace function public.refresh_propostas_resumo_mensal(p_competencias date[] default null)
 returns json
 language plpgsql
 security definer
 set search_path = public
 as $$
 declare
-    result json;
+    meses date[];
 begin
-    begin
-        refresh materialized view concurrently public.propostas_resumo_mensal_mv;
-    exception
-        when feature_not_supported or object_not_in_prerequisite_state then
-            refresh materialized view public.propostas_resumo_mensal_mv;
-    end;
-
-    result := json_build_object(
+    insert into public.propostas_resumo_mensal_pendentes (competencia)
+    select distinct date_trunc('month', c)::date
+    from unnest(p_competencias) as c
+    where c is not null
+    on conflict (competencia) do nothing;
+
+    -- Retira os meses da fila na mesma transação do recálculo: marcações
+    -- feitas por lotes concorrentes continuam na fila para o próximo refresh
+    with fila as (
+        delete from public.propostas_resumo_mensal_pendentes
+        returning competencia
+    )
+    select coalesce(array_agg(competencia order by competencia), '{}')
+    into meses
+    from fila;
+
+    if cardinality(meses) > 0 then
+        delete from public.propostas_resumo_mensal_agg
+        where competencia = any(meses);
+
+        insert into public.propostas_resumo_mensal_agg (
+            competencia, competencia_id, ano, mes,
+            grupo_economico, razao_social_comprador, parceiro, razao_social_financiador,
+            quantidade_operacoes, total_nf_transportadas, total_sacados, total_fornecedores,
+            total_bruto_duplicata, total_liquido_duplicata, total_receita_cashforce, total_propostas,
+            taxa_efetiva_media, prazo_medio,
+            taxa_x_bruto, peso_taxa, prazo_x_bruto, peso_prazo
+        )
+        select
+            m.competencia,
+            to_char(m.competencia, 'YYYY-MM') as competencia_id,
+            extract(year from m.competencia)::int as ano,
+            extract(month from m.competencia)::int as mes,
+            coalesce(p.grupo_economico, 'Sem grupo') as grupo_economico,
+            coalesce(p.razao_social_comprador, 'Sem comprador') as razao_social_comprador,
+            coalesce(p.parceiro, 'Sem parceiro') as parceiro,
+            coalesce(p.razao_social_financiador, 'Sem financiador') as razao_social_financiador,
+
+            count(*) as quantidade_operacoes,
+            coalesce(count(distinct p.nfid), 0)::int as total_nf_transportadas,
+            coalesce(count(distinct p.cnpj_comprador), 0)::int as total_sacados,
+            coalesce(count(distinct p.cnpj_fornecedor), 0)::int as total_fornecedores,
+
+            coalesce(sum(p.valor_bruto_duplicata), 0)::numeric(18,2) as total_bruto_duplicata,
+            coalesce(sum(p.valor_liquido_duplicata), 0)::numeric(18,2) as total_liquido_duplicata,
+            coalesce(sum(p.receita_cashforce), 0)::numeric(18,2) as total_receita_cashforce,
+            coalesce(count(distinct p.numero_proposta), 0)::int as total_propostas,
+
+            coalesce(avg(p.taxa_efetiva_mes_percentual), 0)::numeric(8,4) as taxa_efetiva_media,
+            coalesce(avg(p.prazo_medio_operacao), 0)::numeric(10,2) as prazo_medio,
+
+            coalesce(sum(p.taxa_efetiva_mes_percentual * p.valor_bruto_duplicata), 0) as taxa_x_bruto,
+            coalesce(sum(p.valor_bruto_duplicata) filter (where p.taxa_efetiva_mes_percentual is not null), 0) as peso_taxa,
+            coalesce(sum(p.prazo_medio_operacao * p.valor_bruto_duplicata), 0) as prazo_x_bruto,
+            coalesce(sum(p.valor_bruto_duplicata) filter (where p.prazo_medio_operacao is not null), 0) as peso_prazo
+        from unnest(meses) as m(competencia)
+        join public.propostas p
+          on p.data_operacao >= m.competencia
+         and p.data_operacao < m.competencia + interval '1 month'
+        group by 1, 2, 3, 4, 5, 6, 7, 8;
+    end if;
+
+    return json_build_object(
         'status', 'ok',
+        'competencias', to_json(meses),
         'refreshed_at', now()
     );
+end;
+$$;
+
+-- 5. Reconstrução completa (carga inicial ou correção manual)
+create or replace function public.rebuild_propostas_resumo_mensal()
+returns json
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    delete from public.propostas_resumo_mensal_agg;
 
-    return result;
+    insert into public.propostas_resumo_mensal_pendentes (competencia)
+    select distinct date_trunc('month', data_operacao::date)::date
+    from public.propostas
+    where data_operacao is not null
+    on conflict (competencia) do nothing;
+
+    return public.refresh_propostas_resumo_mensal();
 end;
 $$;
 
-grant execute on function public.refresh_propostas_resumo_mensal() to service_role;
-grant execute on function public.refresh_propostas_resumo_mensal() to authenticated;
+-- 6. Carga inicial (executada somente na primeira vez)
+select public.rebuild_propostas_resumo_mensal();
+
+-- 7. View utilizada pelo PostgREST (security_invoker garante RLS da base)
+create or replace view public.propostas_resumo_mensal
+with (security_invoker = true) as
+select * from public.propostas_resumo_mensal_agg;
+
+-- 8. Leitura pública do consolidado; fila e escrita só via service_role
+alter table public.propostas_resumo_mensal_agg enable row level security;
+alter table public.propostas_resumo_mensal_pendentes enable row level security;
+alter table public.propostas_resumo_diario_pendentes enable row level security;
+
+drop policy if exists "Permitir leitura pública" on public.propostas_resumo_mensal_agg;
+create policy "Permitir leitura pública" on public.propostas_resumo_mensal_agg for select using (true);
+
+grant select on public.propostas_resumo_mensal_agg to anon, authenticated, service_role;
+grant select on public.propostas_resumo_mensal to anon, authenticated, service_role;
+
+revoke execute on function public.marcar_competencias_pendentes() from public, anon, authenticated;
+revoke execute on function public.refresh_propostas_resumo_mensal(date[]) from public, anon;
+grant execute on function public.refresh_propostas_resumo_mensal(date[]) to service_role;
+grant execute on function public.refresh_propostas_resumo_mensal(date[]) to authenticated;
+revoke execute on function public.rebuild_propostas_resumo_mensal() from public, anon, authenticated;
+grant execute on function public.rebuild_propostas_resumo_mensal() to service_role;
+
+comment on table public.propostas_resumo_mensal_agg is
+    'Consolidados mensais de propostas por grupo econômico, comprador, parceiro e financiador; mantida por competência';
+
+comment on table public.propostas_resumo_mensal_pendentes is
+    'Competências alteradas em propostas desde o último refresh_propostas_resumo_mensal()';
+
+comment on table public.propostas_resumo_diario_pendentes is
+    'Competências alteradas em propostas desde o último refresh_propostas_resumo_diario()';
 
-comment on materialized view public.propostas_resumo_mensal_mv is
-    'Consolidados mensais de propostas por grupo econômico, comprador, parceiro e financiador';
+comment on function public.refresh_propostas_resumo_mensal(date[]) is
+    'Recalcula em propostas_resumo_mensal_agg só as competências pendentes (e as informadas) após o ETL';
 
-comment on function public.refresh_propostas_resumo_mensal() is
-    'Atualiza a materialized view propostas_resumo_mensal_mv após o ETL';
+comment on function public.rebuild_propostas_resumo_mensal() is
+    'Recalcula todas as competências de propostas_resumo_mensal_agg';
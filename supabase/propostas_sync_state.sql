@@ -0,0 +1,37 @@
+-- Estado da sincronização incremental do ETL (api/etl_sync.py)
+-- Execute este script no Supabase SQL Editor
+
+-- 1. Hash do último registro enviado para cada NFID
+create table if not exists public.propostas_sync_state (
+    nfid text primary key,
+    row_hash text not null,
+    synced_at timestamptz not null default now()
+);
+
+-- 2. Apenas o ETL (service_role, que ignora RLS) lê e grava o estado
+alter table public.propostas_sync_state enable row level security;
+
+-- 3. Mapa nfid -> hash em uma única chamada (RPC não sofre o limite de linhas do PostgREST)
+create or replace function public.propostas_sync_hashes()
+returns json
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select coalesce(json_object_agg(nfid, row_hash), '{}'::json)
+    from public.propostas_sync_state;
+$$;
+
+revoke execute on function public.propostas_sync_hashes() from public, anon, authenticated;
+grant execute on function public.propostas_sync_hashes() to service_role;
+
+comment on table public.propostas_sync_state is
+    'Hash do conteúdo normalizado de cada NFID enviado pelo ETL; usado para enviar apenas linhas novas ou alteradas';
+
+comment on function public.propostas_sync_hashes() is
+    'Retorna o mapa nfid -> row_hash usado pela detecção de mudanças do ETL';
+
+-- 4. "Dia atual" não é mais enviada pelo ETL (era a data corrente da planilha,
+--    que mudaria todas as linhas a cada dia); a coluna antiga ficaria congelada
+alter table public.propostas drop column if exists dia_atual;